@@ -14,6 +14,606 @@ import base64
 import os
 import gzip
 import io
+import http.client
+import select
+import ssl
+import sys
+import threading
+import time
+import collections
+import concurrent.futures
+import email.utils
+import tempfile
+import contextlib
+import contextvars
+import functools
+import heapq
+import xml.etree.ElementTree as ET
+
+# ============================================================================
+# CRAWL TRACE SPANS - Per-site timing aggregated by phase
+# ============================================================================
+
+class CrawlTrace:
+    """Timing spans for one site crawl, aggregated per phase
+    
+    Each phase keeps count, total and max seconds. Spans recorded on worker
+    threads (document pipeline, block uploads) are added to the same trace, so a
+    phase's total_seconds is summed across threads and can exceed wall time.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._phases = {}  # phase -> [count, total_seconds, max_seconds]
+    
+    def add(self, phase, seconds):
+        with self._lock:
+            entry = self._phases.setdefault(phase, [0, 0.0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+    
+    @contextlib.contextmanager
+    def span(self, phase):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(phase, time.perf_counter() - start)
+    
+    def to_dict(self):
+        with self._lock:
+            return {
+                phase: {"count": count, "total_seconds": round(total, 4), "max_seconds": round(longest, 4)}
+                for phase, (count, total, longest) in sorted(self._phases.items())
+            }
+
+# Trace of the crawl running in the current context (None outside crawl_website_core)
+ACTIVE_TRACE = contextvars.ContextVar('ACTIVE_TRACE', default=None)
+
+def record_span(phase, seconds):
+    """Add a measured duration to the active crawl trace, if any"""
+    trace = ACTIVE_TRACE.get()
+    if trace is not None:
+        trace.add(phase, seconds)
+
+@contextlib.contextmanager
+def trace_span(phase):
+    """Time a block into the active crawl trace - a no-op outside a traced crawl"""
+    trace = ACTIVE_TRACE.get()
+    if trace is None:
+        yield
+        return
+    with trace.span(phase):
+        yield
+
+def traced(phase):
+    """Decorator timing every call of a function as a span of the given phase"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with trace_span(phase):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def submit_traced(executor, fn, *args, **kwargs):
+    """executor.submit() that carries the active crawl trace onto the worker thread"""
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+def merge_trace_phases(traces):
+    """Combine per-site trace dicts into per-phase totals across sites"""
+    merged = {}
+    for trace in traces:
+        for phase, span in (trace or {}).items():
+            entry = merged.setdefault(phase, {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+            entry["count"] += span.get("count", 0)
+            entry["total_seconds"] = round(entry["total_seconds"] + span.get("total_seconds", 0.0), 4)
+            entry["max_seconds"] = max(entry["max_seconds"], span.get("max_seconds", 0.0))
+    return dict(sorted(merged.items()))
+
+# ============================================================================
+# HTTP CONNECTION POOL - Shared keep-alive connections for all outbound requests
+# ============================================================================
+
+# Pool tuning - override via application settings
+HTTP_POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', '10'))  # Idle keep-alive connections retained per host
+HTTP_POOL_MAX_PER_HOST = int(os.environ.get('HTTP_POOL_MAX_PER_HOST', '10'))  # Concurrent open connections per host
+HTTP_POOL_IDLE_TIMEOUT = float(os.environ.get('HTTP_POOL_IDLE_TIMEOUT', '60'))  # Seconds before an idle connection is discarded
+HTTP_MAX_REDIRECTS = 5
+HTTP_DRAIN_LIMIT = 64 * 1024  # Unread bodies up to this size are drained so the socket can be reused
+HTTP_UPLOAD_BLOCKSIZE = 64 * 1024  # Read size when streaming file-like request bodies
+# Methods resent automatically when a reused keep-alive connection turns out to be closed.
+# Others (blob PUTs, token POSTs) are only resent if the request never left the client.
+HTTP_STALE_RETRY_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS'})
+
+def parse_host_overrides(value):
+    """Parse "host=scheme://address:port,..." into {host: (scheme, address, port)}
+    
+    Lets every request for a hostname be sent to another endpoint (like curl --resolve),
+    e.g. to run crawls against local stand-in servers. Host headers keep the original name.
+    """
+    overrides = {}
+    for entry in (value or '').split(','):
+        if '=' not in entry:
+            continue
+        host, target = (part.strip() for part in entry.split('=', 1))
+        parsed = urllib.parse.urlsplit(target if '://' in target else f"http://{target}")
+        scheme = parsed.scheme.lower()
+        overrides[host.lower()] = (scheme, parsed.hostname, parsed.port or (443 if scheme == 'https' else 80))
+    return overrides
+
+HTTP_HOST_OVERRIDES = parse_host_overrides(os.environ.get('HTTP_HOST_OVERRIDES'))
+HTTP_DEFAULT_USER_AGENT = f'Python-urllib/{sys.version_info.major}.{sys.version_info.minor}'
+
+# Politeness defaults - override per site with "requests_per_second" / "burst" in websites.json
+DEFAULT_REQUESTS_PER_SECOND = 2.0
+DEFAULT_REQUEST_BURST = 4
+MIN_REQUESTS_PER_SECOND = 0.1  # Floor when backing off after 429/503 responses
+HTTP_MAX_RETRY_AFTER = 60  # Longest Retry-After (seconds) honoured with an automatic retry
+
+def parse_retry_after(value):
+    """Parse a Retry-After header (delta seconds or HTTP date) into seconds, or None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError, IndexError):
+        return None
+
+class HostRateLimiter:
+    """Per-host token-bucket rate limiter replacing fixed sleeps between crawl requests
+    
+    Each configured host gets a bucket refilled at requests_per_second up to burst
+    tokens. Callers wait only for their own host, so fetches to different hosts
+    proceed concurrently. 429/503 responses halve the host's rate and honour
+    Retry-After; successful responses gradually restore the configured rate.
+    Hosts that were never configured (blob storage, identity endpoint) are not limited.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}  # host -> bucket state and counters
+    
+    def configure(self, url, requests_per_second=DEFAULT_REQUESTS_PER_SECOND, burst=DEFAULT_REQUEST_BURST):
+        """Register a host budget - when several sites share a host the stricter budget wins"""
+        host = self._host(url)
+        rate = max(MIN_REQUESTS_PER_SECOND, float(requests_per_second))
+        burst = max(1, int(burst))
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                self._buckets[host] = {
+                    "configured_rate": rate, "rate": rate, "burst": burst, "tokens": float(burst),
+                    "updated": time.monotonic(), "blocked_until": 0.0,
+                    "requests": 0, "waits": 0, "wait_seconds": 0.0, "throttled": 0
+                }
+            else:
+                bucket["configured_rate"] = min(bucket["configured_rate"], rate)
+                bucket["rate"] = min(bucket["rate"], rate)
+                bucket["burst"] = min(bucket["burst"], burst)
+    
+    def acquire(self, url):
+        """Block until the URL's host has budget for one more request
+        
+        Returns:
+            float: Seconds spent waiting
+        """
+        host = self._host(url)
+        waited = 0.0
+        while True:
+            with self._lock:
+                bucket = self._buckets.get(host)
+                if bucket is None:
+                    return waited
+                now = time.monotonic()
+                bucket["tokens"] = min(bucket["burst"], bucket["tokens"] + (now - bucket["updated"]) * bucket["rate"])
+                bucket["updated"] = now
+                
+                if now < bucket["blocked_until"]:
+                    delay = bucket["blocked_until"] - now
+                elif bucket["tokens"] >= 1:
+                    bucket["tokens"] -= 1
+                    bucket["requests"] += 1
+                    if waited:
+                        bucket["waits"] += 1
+                        bucket["wait_seconds"] += waited
+                    return waited
+                else:
+                    delay = (1 - bucket["tokens"]) / bucket["rate"]
+            time.sleep(delay)
+            waited += delay
+    
+    def record_response(self, url, status, retry_after=None):
+        """Adapt the host's rate to the server's response (back off on 429/503)
+        
+        Returns:
+            bool: True if the host has a budget, so its next acquire() honours any Retry-After block
+        """
+        host = self._host(url)
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                return False
+            if status in (429, 503):
+                bucket["throttled"] += 1
+                bucket["rate"] = max(MIN_REQUESTS_PER_SECOND, bucket["rate"] / 2)
+                bucket["tokens"] = 0.0
+                delay = parse_retry_after(retry_after)
+                if delay:
+                    bucket["blocked_until"] = max(bucket["blocked_until"], time.monotonic() + min(delay, HTTP_MAX_RETRY_AFTER))
+                logging.warning(f'Host {host} throttled (HTTP {status}) - slowing to {bucket["rate"]:.2f} req/s')
+            elif status < 400 and bucket["rate"] < bucket["configured_rate"]:
+                bucket["rate"] = min(bucket["configured_rate"], bucket["rate"] + bucket["configured_rate"] / 20)
+        return True
+    
+    def get_stats(self, url=None):
+        """Return per-host budget and wait counters, optionally for a single URL's host"""
+        with self._lock:
+            stats = {
+                host: {
+                    "requests_per_second": round(bucket["rate"], 3),
+                    "configured_requests_per_second": bucket["configured_rate"],
+                    "burst": bucket["burst"],
+                    "requests": bucket["requests"],
+                    "waits": bucket["waits"],
+                    "wait_seconds": round(bucket["wait_seconds"], 3),
+                    "throttled_responses": bucket["throttled"]
+                }
+                for host, bucket in self._buckets.items()
+            }
+        if url:
+            return stats.get(self._host(url), {})
+        return stats
+    
+    @staticmethod
+    def _host(url):
+        return (urllib.parse.urlsplit(url).hostname or '').lower()
+
+# Process-wide limiter shared by every crawl activity running in this worker
+HOST_RATE_LIMITER = HostRateLimiter()
+
+class PooledResponse:
+    """HTTP response that hands its connection back to the pool when closed
+    
+    Mirrors the subset of the urlopen() response API used by the crawler
+    (read, status, headers, info, getcode, geturl, context manager).
+    """
+    def __init__(self, pool, host_key, conn, response, url):
+        self._pool = pool
+        self._host_key = host_key
+        self._conn = conn
+        self._response = response
+        self._released = False
+        self._read_seconds = 0.0
+        self._trace = ACTIVE_TRACE.get()
+        self.url = url
+        self.status = response.status
+        self.reason = response.reason
+        self.headers = response.headers
+    
+    def read(self, amt=None):
+        if self._trace is None:
+            return self._response.read(amt)
+        start = time.perf_counter()
+        try:
+            return self._response.read(amt)
+        finally:
+            self._read_seconds += time.perf_counter() - start
+    
+    def info(self):
+        return self.headers
+    
+    def getcode(self):
+        return self.status
+    
+    def geturl(self):
+        return self.url
+    
+    def close(self):
+        """Release the connection - reusable only if the body was fully consumed"""
+        if self._released:
+            return
+        self._released = True
+        if self._trace is not None:
+            self._trace.add("http.body", self._read_seconds)
+        
+        # Drain small unread remainders (redirects, error pages, HEAD/304) so the socket stays usable
+        if not self._response.isclosed():
+            length = self._response.length
+            if length is not None and length <= HTTP_DRAIN_LIMIT:
+                try:
+                    self._response.read()
+                except Exception:
+                    pass
+        
+        reusable = self._response.isclosed() and self._conn.sock is not None
+        if not reusable:
+            self._response.close()
+        self._pool._release(self._host_key, self._conn, reusable)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+class HTTPConnectionPool:
+    """Per-host keep-alive connection pool shared by every outbound request
+    
+    urllib.request.urlopen() sends 'Connection: close' and opens a fresh socket
+    (and TLS handshake) per call. This pool keeps idle connections per
+    scheme/host/port, caps concurrent connections per host, discards connections
+    idle longer than idle_timeout, and counts how often sockets are reused.
+    
+    Args:
+        pool_size: Idle keep-alive connections retained per host
+        max_per_host: Maximum concurrent open connections per host (callers block beyond this)
+        idle_timeout: Seconds an idle connection may sit in the pool before being discarded
+        rate_limiter: Optional HostRateLimiter consulted before every request
+        host_overrides: Optional {host: (scheme, address, port)} - see parse_host_overrides
+    """
+    def __init__(self, pool_size=HTTP_POOL_SIZE, max_per_host=HTTP_POOL_MAX_PER_HOST, idle_timeout=HTTP_POOL_IDLE_TIMEOUT,
+                 rate_limiter=None, host_overrides=None):
+        self.rate_limiter = rate_limiter
+        self.host_overrides = dict(host_overrides or {})
+        self.pool_size = pool_size
+        self.max_per_host = max_per_host
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._idle = {}   # host_key -> list of (connection, released_at)
+        self._slots = {}  # host_key -> BoundedSemaphore limiting concurrent connections
+        self._stats = {}  # host_key -> counters
+        self._ssl_context = ssl.create_default_context()
+    
+    def urlopen(self, req, data=None, timeout=30):
+        """Send a request through the pool with urlopen() semantics
+        
+        Accepts a URL string or urllib.request.Request, follows redirects for
+        GET/HEAD (and POST on 301/302/303), and raises urllib.error.HTTPError for
+        4xx/5xx responses so existing error handling keeps working. When a rate
+        limiter is attached, each request waits for its host's budget. A
+        throttled GET/HEAD (429/503 with Retry-After) is retried once, after the
+        limiter's block for budgeted hosts or a plain sleep for all others.
+        """
+        if isinstance(req, str):
+            req = urllib.request.Request(req, data=data)
+        
+        method = req.get_method()
+        url = req.full_url
+        body = req.data
+        headers = dict(req.header_items())
+        if not any(name.lower() == 'user-agent' for name in headers):
+            headers['User-Agent'] = HTTP_DEFAULT_USER_AGENT
+        
+        redirects = 0
+        throttle_retried = False
+        while redirects <= HTTP_MAX_REDIRECTS:
+            if self.rate_limiter:
+                with trace_span("http.rate_limit_wait"):
+                    self.rate_limiter.acquire(url)
+            response = self._send(method, url, body, headers, timeout)
+            location = response.headers.get('Location')
+            retry_after = response.headers.get('Retry-After')
+            # Hosts without a budget are not blocked by acquire(), so their Retry-After is slept here
+            limiter_blocks = bool(self.rate_limiter) and self.rate_limiter.record_response(url, response.status, retry_after)
+            
+            if response.status in (429, 503) and method in ('GET', 'HEAD') and not throttle_retried:
+                delay = parse_retry_after(retry_after)
+                if delay is not None and delay <= HTTP_MAX_RETRY_AFTER:
+                    throttle_retried = True
+                    response.close()
+                    if not limiter_blocks:
+                        time.sleep(delay)
+                    continue
+            
+            if response.status in (301, 302, 303, 307, 308) and location:
+                redirects += 1
+                redirectable = method in ('GET', 'HEAD') or (method == 'POST' and response.status in (301, 302, 303))
+                if not redirectable:
+                    raise self._http_error(response)
+                response.close()
+                url = urllib.parse.urljoin(url, location)
+                if method == 'POST':
+                    # Match urllib: POST redirects become a bodiless GET
+                    method = 'GET'
+                    body = None
+                    headers = {k: v for k, v in headers.items() if k.lower() not in ('content-length', 'content-type')}
+                continue
+            
+            if response.status >= 400:
+                raise self._http_error(response)
+            
+            return response
+        
+        raise urllib.error.HTTPError(url, 310, f'Exceeded {HTTP_MAX_REDIRECTS} redirects', None, None)
+    
+    def get_stats(self, url=None):
+        """Return per-host request/connection counters, optionally for a single URL's host"""
+        with self._lock:
+            stats = {self._host_label(key): dict(counters) for key, counters in self._stats.items()}
+            for key, idle in self._idle.items():
+                stats.setdefault(self._host_label(key), {})["idle_connections"] = len(idle)
+        if url:
+            label = self._host_label(self._host_key(urllib.parse.urlsplit(url)))
+            return stats.get(label, {})
+        return stats
+    
+    def close_all(self):
+        """Close every idle connection and reset counters"""
+        with self._lock:
+            idle_lists = list(self._idle.values())
+            self._idle = {}
+            self._stats = {}
+        for idle in idle_lists:
+            for conn, _ in idle:
+                conn.close()
+    
+    def _send(self, method, url, body, headers, timeout):
+        parsed = urllib.parse.urlsplit(url)
+        host_key = self._host_key(parsed)
+        selector = urllib.parse.urlunsplit(('', '', parsed.path or '/', parsed.query, ''))
+        if host_key[1] in self.host_overrides and not any(name.lower() == 'host' for name in headers):
+            # Redirected endpoint - keep the original name for virtual hosting
+            headers = dict(headers, Host=parsed.netloc)
+        # File-like bodies (streamed uploads) can only be resent if we can rewind them
+        streamed_body = hasattr(body, 'read')
+        body_start = body.tell() if streamed_body and hasattr(body, 'seek') else None
+        slot = self._slot(host_key)
+        slot.acquire()
+        
+        try:
+            conn, reused = self._checkout(host_key, timeout)
+            try:
+                try:
+                    response = self._exchange(conn, method, selector, body, headers)
+                except (ConnectionError, http.client.HTTPException) as err:
+                    if not reused or (streamed_body and body_start is None):
+                        raise
+                    if method.upper() not in HTTP_STALE_RETRY_METHODS and getattr(err, "request_sent", True):
+                        raise  # The server may have acted on it - don't repeat a write
+                    # Server closed a pooled keep-alive socket - retry once on a fresh connection
+                    conn.close()
+                    self._count(host_key, "stale_retries")
+                    if body_start is not None:
+                        body.seek(body_start)
+                    conn, reused = self._new_connection(host_key, timeout), False
+                    response = self._exchange(conn, method, selector, body, headers)
+            except OSError as err:
+                conn.close()
+                raise urllib.error.URLError(err)
+            except BaseException:
+                conn.close()
+                raise
+        except BaseException:
+            slot.release()
+            raise
+        
+        self._count(host_key, "requests")
+        return PooledResponse(self, host_key, conn, response, url)
+    
+    @staticmethod
+    def _exchange(conn, method, selector, body, headers):
+        """Send one request and read the response headers, timing connect and time-to-first-byte"""
+        if conn.sock is None:
+            with trace_span("http.connect"):  # DNS + TCP (+ TLS) for a new connection
+                conn.connect()
+        with trace_span("http.ttfb"):  # Request sent (including any body) until response headers arrive
+            try:
+                conn.request(method, selector, body=body, headers=headers)
+            except (ConnectionError, http.client.HTTPException) as err:
+                err.request_sent = False  # Failed while sending - the server never got a complete request
+                raise
+            return conn.getresponse()
+    
+    def _checkout(self, host_key, timeout):
+        """Take the most recently used healthy idle connection, or open a new one"""
+        now = time.monotonic()
+        stale = []
+        conn = None
+        with self._lock:
+            idle = self._idle.get(host_key, [])
+            while idle:
+                candidate, released_at = idle.pop()
+                if now - released_at <= self.idle_timeout and not self._is_dropped(candidate):
+                    conn = candidate
+                    break
+                stale.append(candidate)
+            self._stats.setdefault(host_key, {}).setdefault("connections_discarded", 0)
+            self._stats[host_key]["connections_discarded"] += len(stale)
+        
+        for candidate in stale:
+            candidate.close()
+        
+        if conn is None:
+            return self._new_connection(host_key, timeout), False
+        
+        conn.timeout = timeout
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout)
+        self._count(host_key, "connections_reused")
+        return conn, True
+    
+    def _new_connection(self, host_key, timeout):
+        scheme, host, port = self.host_overrides.get(host_key[1], host_key)
+        self._count(host_key, "connections_opened")
+        if scheme == 'https':
+            return http.client.HTTPSConnection(host, port, timeout=timeout, context=self._ssl_context,
+                                               blocksize=HTTP_UPLOAD_BLOCKSIZE)
+        return http.client.HTTPConnection(host, port, timeout=timeout, blocksize=HTTP_UPLOAD_BLOCKSIZE)
+    
+    def _release(self, host_key, conn, reusable):
+        try:
+            if reusable:
+                with self._lock:
+                    idle = self._idle.setdefault(host_key, [])
+                    if len(idle) < self.pool_size:
+                        idle.append((conn, time.monotonic()))
+                        conn = None
+            if conn is not None:
+                conn.close()
+        finally:
+            self._slot(host_key).release()
+    
+    def _slot(self, host_key):
+        with self._lock:
+            if host_key not in self._slots:
+                self._slots[host_key] = threading.BoundedSemaphore(self.max_per_host)
+            return self._slots[host_key]
+    
+    def _count(self, host_key, counter):
+        with self._lock:
+            counters = self._stats.setdefault(host_key, {})
+            counters[counter] = counters.get(counter, 0) + 1
+    
+    def _http_error(self, response):
+        """Convert a 4xx/5xx (or unfollowable redirect) response into urllib.error.HTTPError"""
+        try:
+            error_body = response.read()
+        finally:
+            response.close()
+        return urllib.error.HTTPError(response.url, response.status, response.reason, response.headers, io.BytesIO(error_body))
+    
+    @staticmethod
+    def _is_dropped(conn):
+        """An idle socket that is readable has either been closed by the server or has stray data"""
+        if conn.sock is None:
+            return True
+        try:
+            readable, _, _ = select.select([conn.sock], [], [], 0)
+            return bool(readable)
+        except (OSError, ValueError):
+            return True
+    
+    @staticmethod
+    def _host_key(parsed):
+        scheme = (parsed.scheme or 'http').lower()
+        port = parsed.port or (443 if scheme == 'https' else 80)
+        return (scheme, (parsed.hostname or '').lower(), port)
+    
+    @staticmethod
+    def _host_label(host_key):
+        scheme, host, port = host_key
+        return f"{scheme}://{host}:{port}"
+
+# Process-wide pool shared by crawls, downloads, token requests and blob REST calls
+HTTP_POOL = HTTPConnectionPool(rate_limiter=HOST_RATE_LIMITER, host_overrides=HTTP_HOST_OVERRIDES)
+
+def pooled_urlopen(req, data=None, timeout=30):
+    """Drop-in replacement for urllib.request.urlopen() that reuses keep-alive connections"""
+    return HTTP_POOL.urlopen(req, data=data, timeout=timeout)
+
+def get_http_pool_stats(url=None):
+    """Get connection reuse counters for all hosts (or the host of a single URL)
+    
+    Returns:
+        dict: Per-host counters (requests, connections_opened, connections_reused, ...)
+    """
+    return HTTP_POOL.get_stats(url)
 
 class HTMLContentExtractor(HTMLParser):
     """Extract main content from HTML guidance pages for College of Policing"""
@@ -81,27 +681,257 @@ class HTMLContentExtractor(HTMLParser):
         total_chars = sum(len(text) for text in self.content_text)
         return total_chars > 200  # At least 200 chars of content (lowered from 500)
 
+# ============================================================================
+# URL CLASSIFICATION - Precompiled link rules (document / guidance / category / navigation)
+# ============================================================================
+
+# College of Policing APP guidance - /app/category/topic content pages
+APP_GUIDANCE_RULES = {
+    "guidance": [
+        {"pattern": r'/app/[^/]+/[^/]+', "min_segments": 3},  # /app/category/topic (and deeper)
+    ],
+    "category": [
+        {"pattern": r'/app/', "min_segments": 2, "max_segments": 2},  # /app/category
+    ],
+    "navigation": [
+        r'/app/search',
+        r'/app/categories',
+        r'/app/?$',  # Just /app or /app/
+        r'/app$',
+    ],
+}
+
+# CPS prosecution guidance - /prosecution-guidance/{topic} content pages
+CPS_GUIDANCE_RULES = {
+    "guidance": [
+        {"pattern": r'/prosecution-guidance/[a-z0-9-]+$'},
+    ],
+    "category": [],
+    "navigation": [
+        r'/prosecution-guidance/?$',       # Main page
+        r'/prosecution-guidance-search',   # Search/alphabetical pages
+        r'/prosecution-guidance-library',  # Library page
+        r'/node/',                         # Drupal node URLs
+    ],
+}
+
+# Default rules - override per site with "url_rules" in websites.json (each key replaces the default)
+DEFAULT_URL_RULES = {
+    # Extended document extensions including government common formats
+    "document_extensions": ['.pdf', '.doc', '.docx', '.txt', '.xls', '.xlsx', '.xml', '.csv', '.rtf'],
+    # Common government document URL patterns
+    "document_patterns": [
+        r'/data/',           # data.gov.uk pattern
+        r'/documents?/',     # common docs folder
+        r'/publications?/',  # publications folder
+        r'/files?/',         # files folder
+        r'\.pdf\?',         # PDF with parameters
+        r'download',         # download links
+        r'/pdfs/',          # legislation.gov.uk PDFs folder
+        r'/data\.xml',      # legislation.gov.uk XML data files
+        r'/data\.akn',      # legislation.gov.uk AKN format
+        r'/data\.htm',      # legislation.gov.uk HTML data format
+    ],
+    # Web-based guidance content pages, listing pages linking to them, and
+    # navigation pages never treated as guidance or categories
+    "guidance": APP_GUIDANCE_RULES["guidance"] + CPS_GUIDANCE_RULES["guidance"],
+    "category": APP_GUIDANCE_RULES["category"] + CPS_GUIDANCE_RULES["category"],
+    "navigation": APP_GUIDANCE_RULES["navigation"] + CPS_GUIDANCE_RULES["navigation"],
+}
+
+class URLClassifier:
+    """Classify links in one pass using rules compiled once per rule set
+    
+    Each kind's patterns are combined into a single alternation regex (grouped by
+    path-segment constraint), so a link costs a handful of precompiled searches
+    instead of a re.search per pattern. URLs are lowercased once; patterns are
+    matched case-insensitively against the whole URL as before.
+    """
+    _PATH = re.compile(r'^(?:[a-z][a-z0-9+.-]*:)?(?://[^/?#]*)?([^?#]*)')
+    
+    def __init__(self, rules):
+        self.rules = rules
+        extensions = '|'.join(re.escape(ext.lstrip('.').lower()) for ext in rules["document_extensions"])
+        self._extension = re.compile(rf'\.({extensions})$')
+        self._document = self._combine(rules["document_patterns"])
+        self._navigation = self._combine(rules["navigation"])
+        self._guidance = self._compile_rules(rules["guidance"])
+        self._category = self._compile_rules(rules["category"])
+    
+    @staticmethod
+    def _combine(patterns):
+        """One regex matching any of the patterns (never matches when empty)"""
+        if not patterns:
+            return re.compile(r'(?!)')
+        return re.compile('|'.join(f'(?:{pattern})' for pattern in patterns))
+    
+    @classmethod
+    def _compile_rules(cls, rules):
+        """Group rules by segment constraint and combine each group's patterns"""
+        groups = {}
+        for rule in rules:
+            if isinstance(rule, str):
+                rule = {"pattern": rule}
+            key = (rule.get("min_segments", 0), rule.get("max_segments"))
+            groups.setdefault(key, []).append(rule["pattern"].lower())
+        return [(cls._combine(patterns), min_segments, max_segments)
+                for (min_segments, max_segments), patterns in groups.items()]
+    
+    def _segment_count(self, lower_url):
+        path = self._PATH.match(lower_url).group(1)
+        return len([part for part in path.split('/') if part])
+    
+    def _matches_rules(self, compiled_rules, lower_url):
+        segments = None
+        for regex, min_segments, max_segments in compiled_rules:
+            if not regex.search(lower_url):
+                continue
+            if min_segments or max_segments is not None:
+                if segments is None:
+                    segments = self._segment_count(lower_url)
+                if segments < min_segments or (max_segments is not None and segments > max_segments):
+                    continue
+            return True
+        return False
+    
+    def document_extension(self, url):
+        """File extension (without dot) if the URL ends in a document extension, else None"""
+        match = self._extension.search(url.lower())
+        return match.group(1) if match else None
+    
+    def is_document(self, url):
+        """Document link by extension or document URL pattern"""
+        lower_url = url.lower()
+        return bool(self._extension.search(lower_url) or self._document.search(lower_url))
+    
+    def is_navigation(self, url):
+        """Explicit navigation/listing page"""
+        return bool(self._navigation.search(url.lower()))
+    
+    def is_guidance(self, url):
+        """Guidance content page (not excluded as navigation)"""
+        lower_url = url.lower()
+        return not self._navigation.search(lower_url) and self._matches_rules(self._guidance, lower_url)
+    
+    def is_category(self, url):
+        """Category listing page (not excluded as navigation)"""
+        lower_url = url.lower()
+        return not self._navigation.search(lower_url) and self._matches_rules(self._category, lower_url)
+    
+    def classify(self, url):
+        """Classify a URL as "document", "guidance", "category" or "navigation"
+        
+        Precedence: document extension, guidance, category, document URL pattern;
+        anything else (including explicit navigation pages) is "navigation".
+        """
+        lower_url = url.lower()
+        if self._extension.search(lower_url):
+            return "document"
+        if not self._navigation.search(lower_url):
+            if self._matches_rules(self._guidance, lower_url):
+                return "guidance"
+            if self._matches_rules(self._category, lower_url):
+                return "category"
+        if self._document.search(lower_url):
+            return "document"
+        return "navigation"
+
+_URL_CLASSIFIERS = {}
+
+def get_url_classifier(site_config=None):
+    """Compiled classifier for a site's rules (defaults merged with site "url_rules"), cached per rule set
+    
+    Args:
+        site_config: Website configuration - "url_rules" keys replace the defaults;
+                     "guidance_min_depth" below 2 drops guidance path-depth requirements
+    
+    Returns:
+        URLClassifier: Shared compiled classifier
+    """
+    site_config = site_config or {}
+    rules = dict(DEFAULT_URL_RULES, **site_config.get("url_rules", {}))
+    if site_config.get("guidance_min_depth", 2) < 2:
+        rules["guidance"] = [{"pattern": rule} if isinstance(rule, str) else {"pattern": rule["pattern"]}
+                             for rule in rules["guidance"]]
+    key = json.dumps(rules, sort_keys=True)
+    classifier = _URL_CLASSIFIERS.get(key)
+    if classifier is None:
+        classifier = _URL_CLASSIFIERS[key] = URLClassifier(rules)
+    return classifier
+
+_PERCENT_ESCAPE = re.compile(r'%[0-9a-fA-F]{2}')
+
+def canonicalize_url(url):
+    """Canonical form of an http(s) URL, used as the dedupe key wherever URLs enter the crawl
+    
+    Lowercases scheme and host, drops default ports and the fragment, resolves dot
+    segments, uppercases percent-escapes, drops a trailing slash (except the root)
+    and sorts query parameters. Other schemes and unparseable URLs are returned as-is.
+    """
+    try:
+        parts = urllib.parse.urlsplit(url.strip())
+        port = parts.port
+    except ValueError:
+        return url
+    scheme = parts.scheme.lower()
+    if scheme not in ('http', 'https'):
+        return url
+    
+    host = (parts.hostname or '').lower()
+    if port is not None and port != (443 if scheme == 'https' else 80):
+        host = f"{host}:{port}"
+    if parts.username is not None:
+        userinfo = parts.username + (f":{parts.password}" if parts.password is not None else '')
+        host = f"{userinfo}@{host}"
+    
+    segments = []
+    for segment in (parts.path or '/').split('/'):
+        if segment == '..':
+            if len(segments) > 1:
+                segments.pop()
+        elif segment != '.':
+            segments.append(segment)
+    path = _PERCENT_ESCAPE.sub(lambda match: match.group(0).upper(), '/'.join(segments) or '/')
+    if len(path) > 1 and path.endswith('/'):
+        path = path.rstrip('/') or '/'
+    
+    query = '&'.join(sorted(pair for pair in parts.query.split('&') if pair))
+    return urllib.parse.urlunsplit((scheme, host, path, query, ''))
+
+class URLSeenSet:
+    """Canonical URLs already seen during one site crawl, with duplicates counted
+    
+    Entries are namespaced ("page" for discovery fetches, "document" for collected
+    documents, "download" for pipeline downloads) so a URL can be both fetched as a
+    page and collected as a document.
+    """
+    def __init__(self):
+        self._seen = set()
+        self.duplicates = {}
+    
+    def add(self, url, namespace="document"):
+        """Record a URL - returns False (and counts a duplicate) if its canonical form was already seen"""
+        key = (namespace, canonicalize_url(url))
+        if key in self._seen:
+            self.duplicates[namespace] = self.duplicates.get(namespace, 0) + 1
+            return False
+        self._seen.add(key)
+        return True
+    
+    def get_stats(self):
+        """Duplicates avoided per namespace plus total"""
+        stats = {namespace: count for namespace, count in sorted(self.duplicates.items())}
+        stats["total"] = sum(self.duplicates.values())
+        return stats
+
 class EnhancedDocumentLinkParser(HTMLParser):
     """Enhanced HTML parser to find document links with debugging"""
-    def __init__(self):
+    def __init__(self, classifier=None):
         super().__init__()
         self.document_links = []
         self.all_links = []
-        # Extended document extensions including government common formats
-        self.document_extensions = {'.pdf', '.doc', '.docx', '.txt', '.xls', '.xlsx', '.xml', '.csv', '.rtf'}
-        # Common government document URL patterns
-        self.doc_patterns = [
-            r'/data/',           # data.gov.uk pattern
-            r'/documents?/',     # common docs folder
-            r'/publications?/',  # publications folder
-            r'/files?/',         # files folder
-            r'\.pdf\?',         # PDF with parameters
-            r'download',         # download links
-            r'/pdfs/',          # legislation.gov.uk PDFs folder
-            r'/data\.xml',      # legislation.gov.uk XML data files
-            r'/data\.akn',      # legislation.gov.uk AKN format
-            r'/data\.htm',      # legislation.gov.uk HTML data format
-        ]
+        # Document extensions and URL patterns come from the precompiled classifier
+        self.classifier = classifier or get_url_classifier()
     
     def handle_starttag(self, tag, attrs):
         if tag == 'a':
@@ -109,15 +939,15 @@ class EnhancedDocumentLinkParser(HTMLParser):
                 if attr_name == 'href' and attr_value:
                     self.all_links.append(attr_value)
                     
-                    # Check file extensions
-                    lower_url = attr_value.lower()
-                    if any(lower_url.endswith(ext) for ext in self.document_extensions):
-                        self.document_links.append(attr_value)
-                    
-                    # Check URL patterns that might indicate documents
-                    elif any(re.search(pattern, lower_url) for pattern in self.doc_patterns):
+                    # Check file extensions and URL patterns that might indicate documents
+                    if self.classifier.is_document(attr_value):
                         self.document_links.append(attr_value)
 
+def get_site_folder(site_name):
+    """Storage folder for a website (e.g., "Crown Prosecution Service" -> "crown-prosecution-service")"""
+    safe_site = re.sub(r'[^a-z0-9-]', '', site_name.lower().replace(' ', '-'))[:30]
+    return safe_site or "unknown"
+
 def generate_unique_filename(url, original_filename, site_name="unknown"):
     """Generate unique filename preventing collisions with folder organization
     
@@ -133,9 +963,7 @@ def generate_unique_filename(url, original_filename, site_name="unknown"):
     url_hash = hashlib.md5(url.encode()).hexdigest()[:8]
     
     # Sanitize site name for folder structure
-    safe_site = re.sub(r'[^a-z0-9-]', '', site_name.lower().replace(' ', '-'))[:30]
-    if not safe_site:
-        safe_site = "unknown"
+    safe_site = get_site_folder(site_name)
     
     # Extract and preserve extension
     if '.' in original_filename:
@@ -154,9 +982,16 @@ def generate_unique_filename(url, original_filename, site_name="unknown"):
     # Folder provides organization, hash ensures uniqueness, base provides readability
     return f"{safe_site}/{url_hash}_{safe_base}{ext}"
 
-def find_documents_in_html(html_content, base_url):
-    """Parse HTML and find document links with enhanced detection"""
-    parser = EnhancedDocumentLinkParser()
+def find_documents_in_html(html_content, base_url, classifier=None):
+    """Parse HTML and find document links with enhanced detection
+    
+    Args:
+        html_content: Page HTML
+        base_url: URL the page was fetched from (for resolving relative links)
+        classifier: URLClassifier for the site (defaults to the standard rules)
+    """
+    classifier = classifier or get_url_classifier()
+    parser = EnhancedDocumentLinkParser(classifier)
     try:
         parser.feed(html_content)
         
@@ -169,11 +1004,7 @@ def find_documents_in_html(html_content, base_url):
                 absolute_url = urllib.parse.urljoin(base_url, link)
             
             # Determine file type
-            lower_link = link.lower()
-            if any(lower_link.endswith(ext) for ext in {'.pdf', '.doc', '.docx', '.txt', '.xls', '.xlsx', '.xml', '.csv', '.rtf'}):
-                file_ext = lower_link.split('.')[-1]
-            else:
-                file_ext = 'unknown'
+            file_ext = classifier.document_extension(link) or 'unknown'
             
             # Original filename from URL (for reference)
             original_filename = link.split('/')[-1] if '/' in link else link
@@ -221,7 +1052,7 @@ def crawl_document_page_for_sub_documents(doc_url, base_url, max_depth=1, curren
         }
         
         req = urllib.request.Request(doc_url, headers=headers)
-        with urllib.request.urlopen(req, timeout=15) as response:
+        with pooled_urlopen(req, timeout=15) as response:
             # Handle gzipped responses properly
             raw_content = response.read()
             if response.info().get('Content-Encoding') == 'gzip':
@@ -252,8 +1083,113 @@ def crawl_document_page_for_sub_documents(doc_url, base_url, max_depth=1, curren
         logging.warning(f'Step 5a: Failed to crawl sub-page {doc_url}: {str(e)}')
         return []
 
-def get_managed_identity_token():
-    """Get access token using managed identity - FIXED for Azure Functions"""
+# Refresh tokens this many seconds before they expire - override via application settings
+MANAGED_IDENTITY_REFRESH_MARGIN = int(os.environ.get('MANAGED_IDENTITY_REFRESH_MARGIN', '300'))
+
+class ManagedIdentityTokenCache:
+    """Process-wide, thread-safe cache for managed identity access tokens
+    
+    Honours the token's expires_on, refreshes proactively once the token is inside
+    the refresh margin, and collapses concurrent refreshes into a single request:
+    while one thread refreshes, others keep using the still-valid token or wait
+    for the refresh to finish if the cached token has already expired.
+    """
+    def __init__(self, refresh_margin=MANAGED_IDENTITY_REFRESH_MARGIN):
+        self.refresh_margin = refresh_margin
+        self._lock = threading.Lock()
+        self._refresh_done = threading.Condition(self._lock)
+        self._token = None
+        self._expires_on = 0.0
+        self._refreshing = False
+        self._stats = {"hits": 0, "misses": 0, "refreshes": 0, "refresh_failures": 0, "waits": 0}
+    
+    def get_token(self, fetch_token):
+        """Return a cached token or call fetch_token() -> (token, expires_on epoch seconds)"""
+        with self._lock:
+            while True:
+                now = time.time()
+                if self._token and now < self._expires_on - self.refresh_margin:
+                    self._stats["hits"] += 1
+                    return self._token
+                if not self._refreshing:
+                    break
+                if self._token and now < self._expires_on:
+                    # Another thread is already refreshing - the current token is still usable
+                    self._stats["hits"] += 1
+                    return self._token
+                self._stats["waits"] += 1
+                self._refresh_done.wait(timeout=30)
+            self._refreshing = True
+            self._stats["misses"] += 1
+        
+        token, expires_on = None, 0.0
+        try:
+            token, expires_on = fetch_token()
+        finally:
+            with self._lock:
+                self._refreshing = False
+                if token:
+                    self._token = token
+                    self._expires_on = expires_on
+                    self._stats["refreshes"] += 1
+                else:
+                    self._stats["refresh_failures"] += 1
+                self._refresh_done.notify_all()
+                
+                # A failed proactive refresh can still fall back to the unexpired token
+                if not token and self._token and time.time() < self._expires_on:
+                    token = self._token
+        return token
+    
+    def get_stats(self):
+        """Return hit/miss counters and seconds until the cached token expires"""
+        with self._lock:
+            stats = dict(self._stats)
+            lookups = stats["hits"] + stats["misses"]
+            stats["hit_rate_percent"] = round(stats["hits"] / lookups * 100, 2) if lookups else 0
+            stats["expires_in_seconds"] = max(0, int(self._expires_on - time.time())) if self._token else 0
+            return stats
+    
+    def clear(self):
+        """Drop the cached token (next call fetches a new one)"""
+        with self._lock:
+            self._token = None
+            self._expires_on = 0.0
+
+# Single cache shared by every blob upload, folder placeholder, hash and listing call
+TOKEN_CACHE = ManagedIdentityTokenCache()
+
+def parse_token_expiry(token_data):
+    """Convert a managed identity token response into an absolute expiry (epoch seconds)
+    
+    The App Service endpoint and IMDS return expires_on as epoch seconds; older API
+    versions use a 'MM/DD/YYYY HH:MM:SS +00:00' string. Falls back to expires_in.
+    """
+    expires_on = token_data.get("expires_on")
+    if expires_on:
+        try:
+            return float(expires_on)
+        except (TypeError, ValueError):
+            try:
+                return datetime.strptime(str(expires_on), '%m/%d/%Y %H:%M:%S %z').timestamp()
+            except ValueError:
+                pass
+    expires_in = token_data.get("expires_in")
+    if expires_in:
+        try:
+            return time.time() + float(expires_in)
+        except (TypeError, ValueError):
+            pass
+    # Unknown lifetime - keep it just long enough to serve a burst of uploads
+    return time.time() + MANAGED_IDENTITY_REFRESH_MARGIN + 60
+
+@traced("token_request")
+def request_managed_identity_token():
+    """Request a new access token from the managed identity endpoint
+    
+    Returns:
+        tuple: (access_token, expires_on epoch seconds) or (None, 0) on failure
+    """
     try:
         # Check for Azure Functions environment variables first (FIXED AUTH)
         identity_endpoint = os.environ.get('IDENTITY_ENDPOINT')
@@ -272,14 +1208,22 @@ def get_managed_identity_token():
             req = urllib.request.Request(token_url)
             req.add_header('Metadata', 'true')
         
-        with urllib.request.urlopen(req, timeout=10) as response:
+        with pooled_urlopen(req, timeout=10) as response:
             token_data = json.loads(response.read().decode())
             logging.info('Successfully obtained access token')
-            return token_data.get("access_token")
+            return token_data.get("access_token"), parse_token_expiry(token_data)
             
     except Exception as e:
         logging.error(f'Failed to get managed identity token: {str(e)}')
-        return None
+        return None, 0.0
+
+def get_managed_identity_token():
+    """Get access token using managed identity - cached until shortly before expiry"""
+    return TOKEN_CACHE.get_token(request_managed_identity_token)
+
+def get_token_cache_stats():
+    """Get managed identity token cache hit/miss counters"""
+    return TOKEN_CACHE.get_stats()
 
 def get_folder_name_for_website(website_name):
     """Convert website name to folder name for blob storage organization
@@ -326,7 +1270,7 @@ def ensure_website_folder_exists(website_name, storage_account="stbtpuksprodcraw
             logging.warning('Failed to get access token for folder creation')
             return False
         
-        blob_url = f"https://{storage_account}.blob.core.windows.net/{container}/{placeholder_filename}"
+        blob_url = f"{blob_service_url(storage_account)}/{container}/{placeholder_filename}"
         
         req = urllib.request.Request(blob_url, data=placeholder_content, method='PUT')
         req.add_header('Authorization', f'Bearer {access_token}')
@@ -340,7 +1284,7 @@ def ensure_website_folder_exists(website_name, storage_account="stbtpuksprodcraw
         req.add_header('x-ms-meta-websitename', urllib.parse.quote(website_name))
         
         try:
-            with urllib.request.urlopen(req, timeout=30) as response:
+            with pooled_urlopen(req, timeout=30) as response:
                 if response.status in [200, 201]:
                     logging.info(f'✅ Created folder for website: {folder_name}')
                     return True
@@ -377,14 +1321,14 @@ def ensure_container_exists(container_name, storage_account="stbtpuksprodcrawler
         
         # Create container using REST API
         # PUT /{container}?restype=container
-        url = f"https://{storage_account}.blob.core.windows.net/{container_name}?restype=container"
+        url = f"{blob_service_url(storage_account)}/{container_name}?restype=container"
         
         req = urllib.request.Request(url, method='PUT')
         req.add_header('Authorization', f'Bearer {access_token}')
         req.add_header('x-ms-version', '2021-06-08')
         
         try:
-            with urllib.request.urlopen(req, timeout=30) as response:
+            with pooled_urlopen(req, timeout=30) as response:
                 status_code = response.status
                 if status_code == 201:
                     logging.info(f'✅ Created new container: {container_name}')
@@ -407,12 +1351,127 @@ def ensure_container_exists(container_name, storage_account="stbtpuksprodcrawler
         logging.error(f'Error ensuring container exists ({container_name}): {str(e)}')
         return False
 
+# Blob service endpoint - override with e.g. "http://127.0.0.1:10000/{account}" for a local emulator
+BLOB_ENDPOINT_URL = os.environ.get('BLOB_ENDPOINT_URL', 'https://{account}.blob.core.windows.net')
+
+# Block blob upload tuning - bodies above the threshold use Put Block / Put Block List
+BLOB_SINGLE_PUT_THRESHOLD = int(os.environ.get('BLOB_SINGLE_PUT_THRESHOLD_BYTES', str(8 * 1024 * 1024)))
+BLOB_BLOCK_SIZE = int(os.environ.get('BLOB_BLOCK_SIZE_BYTES', str(4 * 1024 * 1024)))
+BLOB_UPLOAD_CONCURRENCY = int(os.environ.get('BLOB_UPLOAD_CONCURRENCY', '4'))
+BLOB_BLOCK_RETRIES = 3
+BLOB_BLOCK_RETRY_BACKOFF = 0.5  # Seconds, doubled per attempt
+BLOB_BLOCK_TIMEOUT = 60
+BLOB_RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+def blob_service_url(storage_account):
+    """Base URL of the blob service for a storage account"""
+    return BLOB_ENDPOINT_URL.format(account=storage_account).rstrip('/')
+
+def make_block_id(index):
+    """Base64 block ID - Azure requires every ID in a blob to have the same length"""
+    return base64.b64encode(f"block-{index:08d}".encode('utf-8')).decode('ascii')
+
+def put_blob_block(blob_url, block_id, data, access_token, retries=BLOB_BLOCK_RETRIES):
+    """Upload one block with Put Block, retrying transient failures
+    
+    Args:
+        blob_url: Target blob URL
+        block_id: Base64 block ID from make_block_id
+        data: Block bytes
+        access_token: Storage bearer token
+        retries: Extra attempts allowed for timeouts, throttling and 5xx responses
+    
+    Returns:
+        int: Number of retries used
+    """
+    block_url = f"{blob_url}?comp=block&blockid={urllib.parse.quote(block_id, safe='')}"
+    for attempt in range(retries + 1):
+        req = urllib.request.Request(block_url, data=data, method='PUT')
+        req.add_header("Authorization", f"Bearer {access_token}")
+        req.add_header("x-ms-version", "2021-06-08")
+        req.add_header("Content-Length", str(len(data)))
+        wait = BLOB_BLOCK_RETRY_BACKOFF * (2 ** attempt)
+        try:
+            with pooled_urlopen(req, timeout=BLOB_BLOCK_TIMEOUT) as response:
+                response.read()
+            return attempt
+        except urllib.error.HTTPError as e:
+            if e.code not in BLOB_RETRYABLE_STATUS or attempt == retries:
+                raise
+            wait = parse_retry_after(e.headers.get('Retry-After')) or wait
+            logging.warning(f'⚠️ Put Block {block_id} returned {e.code}, retrying ({attempt + 1}/{retries})')
+        except OSError as e:
+            if attempt == retries:
+                raise
+            logging.warning(f'⚠️ Put Block {block_id} failed: {str(e)}, retrying ({attempt + 1}/{retries})')
+        time.sleep(min(wait, HTTP_MAX_RETRY_AFTER))
+
+def upload_blob_in_blocks(content, content_length, blob_url, access_token, headers,
+                          block_size=BLOB_BLOCK_SIZE, concurrency=BLOB_UPLOAD_CONCURRENCY):
+    """Upload a large body as parallel blocks, then commit them with Put Block List
+    
+    Only concurrency blocks are held in memory at once - file bodies are read
+    block by block under a lock, so a spooled download is never loaded whole.
+    
+    Args:
+        content: bytes, or a seekable file object positioned at the start of the body
+        content_length: Body length in bytes
+        blob_url: Target blob URL
+        access_token: Storage bearer token
+        headers: Blob property/metadata headers (x-ms-blob-content-type, x-ms-meta-*) applied on commit
+        block_size: Bytes per block
+        concurrency: Blocks uploaded in parallel
+    
+    Returns:
+        tuple: (block count, retries used, Put Block List status code)
+    """
+    block_count = max(1, -(-content_length // block_size))
+    block_ids = [make_block_id(i) for i in range(block_count)]
+    base_offset = content.tell() if hasattr(content, 'read') else 0
+    read_lock = threading.Lock()
+    
+    def read_block(index):
+        if not hasattr(content, 'read'):
+            return content[index * block_size:(index + 1) * block_size]
+        with read_lock:
+            content.seek(base_offset + index * block_size)
+            return content.read(min(block_size, content_length - index * block_size))
+    
+    trace = ACTIVE_TRACE.get()
+    
+    def upload_block(index):
+        ACTIVE_TRACE.set(trace)  # Pool threads start without the crawl's trace
+        with trace_span("upload.block"):
+            return put_blob_block(blob_url, block_ids[index], read_block(index), access_token)
+    
+    # Executor.map keeps at most `concurrency` blocks in flight and re-raises the first failure
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        retries_used = sum(executor.map(upload_block, range(block_count)))
+    
+    block_list = ''.join(f'<Latest>{block_id}</Latest>' for block_id in block_ids)
+    body = f'<?xml version="1.0" encoding="utf-8"?><BlockList>{block_list}</BlockList>'.encode('utf-8')
+    req = urllib.request.Request(f"{blob_url}?comp=blocklist", data=body, method='PUT')
+    req.add_header("Authorization", f"Bearer {access_token}")
+    req.add_header("x-ms-version", "2021-06-08")
+    req.add_header("Content-Type", "application/xml")
+    req.add_header("Content-Length", str(len(body)))
+    for name, value in headers.items():
+        req.add_header(name, value)
+    with pooled_urlopen(req, timeout=BLOB_BLOCK_TIMEOUT) as response:
+        status_code = response.status
+    return block_count, retries_used, status_code
+
+@traced("upload")
 def upload_to_blob_storage_real(content, filename, storage_account="stbtpuksprodcrawler01", container="documents", 
                                 website_id=None, website_name=None, metadata=None):
     """Upload content to Azure Blob Storage using REST API and managed identity with rich metadata
     
+    Bodies up to BLOB_SINGLE_PUT_THRESHOLD go up in a single Put Blob; larger ones
+    are split into BLOB_BLOCK_SIZE blocks uploaded in parallel and committed with
+    Put Block List, so a failure only retries the affected block.
+    
     Args:
-        content: Binary content to upload
+        content: Binary content to upload - bytes, or a seekable file object streamed from its current position
         filename: Filename with folder prefix (e.g., "crown-prosecution-service/abc123_doc.pdf")
         storage_account: Azure storage account name
         container: Container name (default: "documents")
@@ -423,6 +1482,7 @@ def upload_to_blob_storage_real(content, filename, storage_account="stbtpuksprod
     Returns:
         dict: Upload result with success status
     """
+    content_length = get_body_length(content)
     try:
         # Get access token
         access_token = get_managed_identity_token()
@@ -434,38 +1494,32 @@ def upload_to_blob_storage_real(content, filename, storage_account="stbtpuksprod
             }
         
         # Construct blob URL
-        blob_url = f"https://{storage_account}.blob.core.windows.net/{container}/{filename}"
-        
-        # Create request
-        req = urllib.request.Request(blob_url, data=content, method='PUT')
-        req.add_header("Authorization", f"Bearer {access_token}")
-        req.add_header("x-ms-blob-type", "BlockBlob")
-        req.add_header("x-ms-version", "2021-06-08")
-        req.add_header("Content-Length", str(len(content)))
+        blob_url = f"{blob_service_url(storage_account)}/{container}/{filename}"
         
         # Determine content type based on file extension
         if filename.lower().endswith('.pdf'):
-            req.add_header("Content-Type", "application/pdf")
+            content_type = "application/pdf"
         elif filename.lower().endswith('.xml'):
-            req.add_header("Content-Type", "application/xml")
+            content_type = "application/xml"
         elif filename.lower().endswith('.csv'):
-            req.add_header("Content-Type", "text/csv")
+            content_type = "text/csv"
         elif filename.lower().endswith('.html') or filename.lower().endswith('.htm'):
-            req.add_header("Content-Type", "text/html; charset=utf-8")
+            content_type = "text/html; charset=utf-8"
         else:
-            req.add_header("Content-Type", "application/octet-stream")
+            content_type = "application/octet-stream"
         
         # Add rich blob metadata for AI search and filtering
         # Metadata keys must be lowercase and valid HTTP header names
+        metadata_headers = {}
         if website_id:
-            req.add_header("x-ms-meta-websiteid", website_id)
+            metadata_headers["x-ms-meta-websiteid"] = website_id
         if website_name:
             # URL-encode website name for header safety
             safe_name = urllib.parse.quote(website_name)
-            req.add_header("x-ms-meta-websitename", safe_name)
+            metadata_headers["x-ms-meta-websitename"] = safe_name
         
         # Add crawl timestamp
-        req.add_header("x-ms-meta-crawldate", datetime.now(timezone.utc).isoformat())
+        metadata_headers["x-ms-meta-crawldate"] = datetime.now(timezone.utc).isoformat()
         
         # Add custom metadata if provided
         if metadata:
@@ -473,20 +1527,42 @@ def upload_to_blob_storage_real(content, filename, storage_account="stbtpuksprod
                 # Sanitize key and value for HTTP headers
                 safe_key = re.sub(r'[^a-z0-9]', '', key.lower())
                 safe_value = urllib.parse.quote(str(value))
-                req.add_header(f"x-ms-meta-{safe_key}", safe_value)
-        
-        # Upload to blob storage
-        with urllib.request.urlopen(req, timeout=60) as response:
-            status_code = response.status
+                metadata_headers[f"x-ms-meta-{safe_key}"] = safe_value
+        
+        if content_length > BLOB_SINGLE_PUT_THRESHOLD:
+            # Large body - parallel Put Block uploads with per-block retry, then Put Block List
+            commit_headers = dict(metadata_headers, **{"x-ms-blob-content-type": content_type})
+            block_count, block_retries, status_code = upload_blob_in_blocks(
+                content, content_length, blob_url, access_token, commit_headers,
+                block_size=BLOB_BLOCK_SIZE, concurrency=BLOB_UPLOAD_CONCURRENCY
+            )
+            upload_details = {"upload_mode": "blocks", "blocks": block_count, "block_retries": block_retries}
+            logging.info(f'📦 Uploaded {filename} as {block_count} blocks ({block_retries} retries)')
+        else:
+            # Create request (file objects are streamed by the connection in blocks)
+            req = urllib.request.Request(blob_url, data=content, method='PUT')
+            req.add_header("Authorization", f"Bearer {access_token}")
+            req.add_header("x-ms-blob-type", "BlockBlob")
+            req.add_header("x-ms-version", "2021-06-08")
+            req.add_header("Content-Length", str(content_length))
+            req.add_header("Content-Type", content_type)
+            for name, value in metadata_headers.items():
+                req.add_header(name, value)
+            
+            # Upload to blob storage
+            with pooled_urlopen(req, timeout=60) as response:
+                status_code = response.status
+            upload_details = {"upload_mode": "single"}
             
         if status_code in [200, 201]:
             logging.info(f'Successfully uploaded {filename} to {blob_url}')
             return {
                 "success": True,
                 "blob_url": blob_url,
-                "size": len(content),
+                "size": content_length,
                 "message": "Real Azure Storage upload successful",
-                "status_code": status_code
+                "status_code": status_code,
+                **upload_details
             }
         else:
             return {
@@ -502,32 +1578,133 @@ def upload_to_blob_storage_real(content, filename, storage_account="stbtpuksprod
             "success": False,
             "error": str(e),
             "fallback": True,
-            "blob_url": f"https://{storage_account}.blob.core.windows.net/{container}/{filename}",
-            "size": len(content),
+            "blob_url": f"{blob_service_url(storage_account)}/{container}/{filename}",
+            "size": content_length,
             "message": "Real upload failed, would simulate"
         }
 
-def download_document(url):
-    """Download document content from URL"""
+# Streaming download tuning - bodies larger than the threshold are spooled to a temp file
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+DOWNLOAD_SPOOL_THRESHOLD = int(os.environ.get('DOWNLOAD_SPOOL_THRESHOLD_BYTES', str(4 * 1024 * 1024)))
+
+def get_body_length(content):
+    """Length of an upload body - bytes or a seekable file object (from its current position)"""
+    if hasattr(content, 'seek'):
+        position = content.tell()
+        end = content.seek(0, os.SEEK_END)
+        content.seek(position)
+        return end - position
+    return len(content)
+
+def spool_response_body(response, chunk_size=DOWNLOAD_CHUNK_SIZE, spool_threshold=DOWNLOAD_SPOOL_THRESHOLD):
+    """Read a response body in chunks, hashing incrementally and spooling large bodies to disk
+    
+    Returns:
+        tuple: (file object rewound to the start, size in bytes, MD5 hex digest)
+    """
+    digest = hashlib.md5()
+    body = tempfile.SpooledTemporaryFile(max_size=spool_threshold)
+    size = 0
+    hash_seconds = 0.0
+    try:
+        while True:
+            chunk = response.read(chunk_size)
+            if not chunk:
+                break
+            hash_start = time.perf_counter()
+            digest.update(chunk)
+            hash_seconds += time.perf_counter() - hash_start
+            body.write(chunk)
+            size += len(chunk)
+        body.seek(0)
+    except BaseException:
+        body.close()
+        raise
+    record_span("hash", hash_seconds)
+    return body, size, digest.hexdigest()
+
+@traced("download")
+def download_document(url, etag=None, last_modified=None, stream=False):
+    """Download document content from URL
+    
+    When validators from a previous crawl are supplied, a conditional GET is sent
+    (If-None-Match / If-Modified-Since) and a 304 response returns not_modified=True
+    without transferring the body.
+    
+    With stream=True the body is read in chunks, hashed incrementally and spooled
+    to a temp file past DOWNLOAD_SPOOL_THRESHOLD, so peak memory per document is
+    bounded. The result then carries "body" (file object - caller closes it) and
+    "hash" instead of "content".
+    
+    Args:
+        url: Document URL
+        etag: ETag stored from the previous crawl (optional)
+        last_modified: Last-Modified value stored from the previous crawl (optional)
+        stream: Return a spooled file body instead of bytes
+    """
     try:
-        with urllib.request.urlopen(url, timeout=30) as response:
-            content = response.read()
+        req = urllib.request.Request(url)
+        add_conditional_headers(req, etag, last_modified)
+        
+        with pooled_urlopen(req, timeout=30) as response:
+            if response.status == 304:
+                return not_modified_result(response, etag, last_modified)
             content_type = response.headers.get('Content-Type', 'application/octet-stream')
+            response_etag = response.headers.get('ETag')
+            response_last_modified = response.headers.get('Last-Modified')
             
-        return {
+            if not stream:
+                content = response.read()
+            else:
+                try:
+                    declared_length = int(response.headers.get('Content-Length'))
+                except (TypeError, ValueError):
+                    declared_length = None
+                
+                if declared_length is not None and declared_length <= DOWNLOAD_SPOOL_THRESHOLD:
+                    # Small body of known size - a single read stays within the memory bound
+                    content = response.read()
+                    body, size, content_hash = io.BytesIO(content), len(content), calculate_content_hash(content)
+                else:
+                    body, size, content_hash = spool_response_body(response)
+        
+        result = {
             "success": True,
-            "content": content,
             "content_type": content_type,
-            "size": len(content)
+            "etag": response_etag,
+            "last_modified": response_last_modified
         }
+        if stream:
+            result.update({"body": body, "hash": content_hash, "size": size})
+        else:
+            result.update({"content": content, "size": len(content)})
+        return result
     except Exception as e:
         logging.error(f'Document download failed: {str(e)}')
         return {"success": False, "error": str(e)}
 
+def add_conditional_headers(req, etag=None, last_modified=None):
+    """Add revalidation headers from a previous crawl's response to a request"""
+    if etag:
+        req.add_header('If-None-Match', etag)
+    if last_modified:
+        req.add_header('If-Modified-Since', last_modified)
+
+def not_modified_result(response, etag=None, last_modified=None):
+    """Build the download result for a 304 Not Modified response (no body transferred)"""
+    return {
+        "success": True,
+        "not_modified": True,
+        "size": 0,
+        "etag": response.headers.get('ETag') or etag,
+        "last_modified": response.headers.get('Last-Modified') or last_modified
+    }
+
 def is_guidance_page(url, min_depth=2):
     """Determine if URL is likely a guidance content page (not navigation/listing)
     
     Used for College of Policing APP guidance which is web-based, not downloadable files.
+    Thin wrapper over the precompiled URLClassifier default rules.
     
     Args:
         url: URL to check
@@ -536,45 +1713,14 @@ def is_guidance_page(url, min_depth=2):
     Returns:
         bool: True if likely a guidance page
     """
-    # College of Policing APP guidance patterns
-    app_guidance_patterns = [
-        r'/app/[^/]+/[^/]+',  # /app/category/topic (e.g., /app/armed-policing/legal-framework)
-        r'/app/[^/]+/[^/]+/[^/]+',  # /app/category/topic/subtopic
-    ]
-    
-    # Exclude navigation/listing pages
-    navigation_indicators = [
-        '/app/search',
-        '/app/categories',
-        '/app/?$',  # Just /app or /app/
-        '/app$',
-    ]
-    
-    # Check if it's a navigation page (exclude these)
-    for pattern in navigation_indicators:
-        if re.search(pattern, url, re.IGNORECASE):
-            return False
-    
-    # Check path depth
-    parsed = urllib.parse.urlparse(url)
-    path_parts = [p for p in parsed.path.split('/') if p]
-    
-    # For College of Policing: need at least /app/category/topic (3 parts minimum)
-    if min_depth >= 2 and len(path_parts) < 3:
-        return False
-    
-    # Check if it matches guidance patterns
-    for pattern in app_guidance_patterns:
-        if re.search(pattern, url, re.IGNORECASE):
-            return True
-    
-    return False
-
-def is_cps_guidance_page(url):
-    """Determine if URL is a CPS prosecution guidance content page
+    return get_url_classifier({"url_rules": APP_GUIDANCE_RULES, "guidance_min_depth": min_depth}).is_guidance(url)
+
+def is_cps_guidance_page(url):
+    """Determine if URL is a CPS prosecution guidance content page
     
     CPS guidance pages follow the pattern: /prosecution-guidance/{topic}
     where {topic} is a kebab-case slug like 'abuse-process', 'bail-applications', etc.
+    Thin wrapper over the precompiled URLClassifier default rules.
     
     Args:
         url: URL to check
@@ -582,30 +1728,10 @@ def is_cps_guidance_page(url):
     Returns:
         bool: True if it's a CPS guidance page
     """
-    # CPS guidance pattern: /prosecution-guidance/{topic-name}
-    # Must have exactly 2 path segments after domain
-    cps_guidance_pattern = r'/prosecution-guidance/[a-z0-9-]+$'
-    
-    # Exclude navigation/index pages
-    exclusion_patterns = [
-        r'/prosecution-guidance/?$',           # Main page
-        r'/prosecution-guidance-search',       # Search/alphabetical pages
-        r'/prosecution-guidance-library',      # Library page
-        r'/node/',                             # Drupal node URLs
-    ]
-    
-    # Check exclusions first
-    for pattern in exclusion_patterns:
-        if re.search(pattern, url, re.IGNORECASE):
-            return False
-    
-    # Check if matches CPS guidance pattern
-    if re.search(cps_guidance_pattern, url, re.IGNORECASE):
-        return True
-    
-    return False
+    return get_url_classifier({"url_rules": CPS_GUIDANCE_RULES}).is_guidance(url)
 
-def capture_html_guidance(url, site_name="Unknown"):
+@traced("guidance_capture")
+def capture_html_guidance(url, site_name="Unknown", etag=None, last_modified=None):
     """Capture HTML content from guidance pages
     
     Used for sites like College of Policing where guidance is web-based, not downloadable.
@@ -614,6 +1740,8 @@ def capture_html_guidance(url, site_name="Unknown"):
     Args:
         url: URL of guidance page
         site_name: Name of source website
+        etag: ETag stored from the previous crawl (sent as If-None-Match)
+        last_modified: Last-Modified stored from the previous crawl (sent as If-Modified-Since)
         
     Returns:
         dict: Result with success status, content, metadata
@@ -638,8 +1766,13 @@ def capture_html_guidance(url, site_name="Unknown"):
         }
         
         req = urllib.request.Request(url, headers=headers)
+        add_conditional_headers(req, etag, last_modified)
         
-        with urllib.request.urlopen(req, timeout=30) as response:
+        with pooled_urlopen(req, timeout=30) as response:
+            if response.status == 304:
+                return not_modified_result(response, etag, last_modified)
+            response_etag = response.headers.get('ETag')
+            response_last_modified = response.headers.get('Last-Modified')
             raw_content = response.read()
             
             # Handle gzip encoding
@@ -710,48 +1843,506 @@ def capture_html_guidance(url, site_name="Unknown"):
             "content_type": "text/html",
             "size": len(content_bytes),
             "filename": filename,
-            "text_length": len(text_content)
+            "text_length": len(text_content),
+            "etag": response_etag,
+            "last_modified": response_last_modified
         }
         
     except Exception as e:
         logging.error(f'HTML guidance capture failed for {url}: {str(e)}')
         return {"success": False, "error": str(e)}
 
+@traced("hash")
 def calculate_content_hash(content):
     """Calculate MD5 hash of content for change detection"""
     return hashlib.md5(content).hexdigest()
 
+# Sharded document-hash manifest - one compact gzip JSON shard per site folder
+# (optionally split further by URL hash prefix) plus an index of shard fingerprints
+MANIFEST_PREFIX = "document-hashes"
+MANIFEST_INDEX_NAME = f"{MANIFEST_PREFIX}/index.json"
+LEGACY_MANIFEST_NAME = "document-hashes.json"
+MANIFEST_SHARD_PREFIX_LENGTH = int(os.environ.get('MANIFEST_SHARD_PREFIX_LENGTH', '0'))
+# Unchanged shards are still rewritten after this long so last_seen stays roughly current
+MANIFEST_LAST_SEEN_REFRESH = int(os.environ.get('MANIFEST_LAST_SEEN_REFRESH_SECONDS', '86400'))
+UNASSIGNED_SHARD_FOLDER = "_unassigned"  # Records without a site folder (legacy/manual crawls)
+MANIFEST_INDEX_WRITE_ATTEMPTS = 5  # Conditional (If-Match) index rewrites before giving up
+# Records for URLs a complete crawl no longer found are tombstoned, not deleted, and
+# kept this long - a URL that comes back keeps its hash and blob name (no re-upload)
+MANIFEST_TOMBSTONE_RETENTION = int(os.environ.get('MANIFEST_TOMBSTONE_RETENTION_SECONDS', str(30 * 86400)))
+
+def manifest_shard_name(url, record, prefix_length=None):
+    """Shard a hash record belongs to - its site folder, plus a URL hash prefix when configured"""
+    unique_filename = record.get("unique_filename") or ""
+    folder = unique_filename.split('/')[0] if '/' in unique_filename else UNASSIGNED_SHARD_FOLDER
+    prefix_length = MANIFEST_SHARD_PREFIX_LENGTH if prefix_length is None else prefix_length
+    if prefix_length:
+        return f"{folder}/{hashlib.md5(url.encode()).hexdigest()[:prefix_length]}"
+    return folder
+
+def manifest_shard_folder(shard_name):
+    """Site folder of a shard name"""
+    return shard_name.split('/')[0]
+
+def manifest_shard_blob(shard_name):
+    """Blob name holding a shard"""
+    return f"{MANIFEST_PREFIX}/{shard_name}.json.gz"
+
+def encode_manifest_shard(records):
+    """Compact, deterministic encoding - minified JSON with sorted keys, gzip-compressed"""
+    return gzip.compress(json.dumps(records, separators=(',', ':'), sort_keys=True).encode('utf-8'), mtime=0)
+
+def decode_manifest_shard(content):
+    """Inverse of encode_manifest_shard"""
+    return json.loads(gzip.decompress(content).decode('utf-8'))
+
+def manifest_fingerprint(records):
+    """Fingerprint of a shard's records ignoring last_seen, which changes on every crawl"""
+    stable = {url: {k: v for k, v in record.items() if k != "last_seen"} for url, record in records.items()}
+    return hashlib.md5(json.dumps(stable, separators=(',', ':'), sort_keys=True).encode('utf-8')).hexdigest()
+
+def read_metadata_blob(name, storage_account="stbtpuksprodcrawler01", container="crawl-metadata"):
+    """Read a metadata blob
+    
+    Returns:
+        bytes: Blob content, or None if the blob does not exist
+    
+    Raises:
+        RuntimeError: If no access token is available; urllib errors for other failures
+    """
+    return read_metadata_blob_with_etag(name, storage_account, container)[0]
+
+def read_metadata_blob_with_etag(name, storage_account="stbtpuksprodcrawler01", container="crawl-metadata"):
+    """Read a metadata blob along with its ETag, for conditional (If-Match) rewrites
+    
+    Returns:
+        tuple: (bytes content, etag), or (None, None) if the blob does not exist
+    """
+    access_token = get_managed_identity_token()
+    if not access_token:
+        raise RuntimeError('Failed to get access token')
+    
+    req = urllib.request.Request(f"{blob_service_url(storage_account)}/{container}/{name}", method='GET')
+    req.add_header('Authorization', f'Bearer {access_token}')
+    req.add_header('x-ms-version', '2020-04-08')
+    try:
+        with pooled_urlopen(req, timeout=30) as response:
+            return response.read(), response.headers.get('ETag')
+    except urllib.error.HTTPError as e:
+        if e.code == 404:
+            return None, None
+        raise
+
+def write_metadata_blob(name, content, content_type="application/json",
+                        storage_account="stbtpuksprodcrawler01", container="crawl-metadata", if_match=None,
+                        if_none_match=None):
+    """Write a metadata blob, returning True on success
+    
+    With if_match, the write only succeeds if the blob still has that ETag - a
+    concurrent writer makes it raise urllib.error.HTTPError 412. With
+    if_none_match="*" it only creates the blob (HTTPError 409/412 if it exists).
+    """
+    access_token = get_managed_identity_token()
+    if not access_token:
+        logging.error(f'Failed to get access token for writing {container}/{name}')
+        return False
+    
+    req = urllib.request.Request(f"{blob_service_url(storage_account)}/{container}/{name}", data=content, method='PUT')
+    req.add_header('Authorization', f'Bearer {access_token}')
+    req.add_header('x-ms-version', '2020-04-08')
+    req.add_header('x-ms-blob-type', 'BlockBlob')
+    req.add_header('Content-Type', content_type)
+    req.add_header('Content-Length', str(len(content)))
+    if if_match:
+        req.add_header('If-Match', if_match)
+    if if_none_match:
+        req.add_header('If-None-Match', if_none_match)
+    with pooled_urlopen(req, timeout=30) as response:
+        return response.status == 201
+
+def delete_metadata_blob(name, storage_account="stbtpuksprodcrawler01", container="crawl-metadata"):
+    """Delete a metadata blob (missing blobs count as deleted)"""
+    access_token = get_managed_identity_token()
+    if not access_token:
+        return False
+    
+    req = urllib.request.Request(f"{blob_service_url(storage_account)}/{container}/{name}", method='DELETE')
+    req.add_header('Authorization', f'Bearer {access_token}')
+    req.add_header('x-ms-version', '2020-04-08')
+    try:
+        with pooled_urlopen(req, timeout=30) as response:
+            return response.status in [200, 202]
+    except urllib.error.HTTPError as e:
+        return e.code == 404
+
+def load_manifest_index(storage_account="stbtpuksprodcrawler01", container="crawl-metadata"):
+    """Load the shard index, or None if the manifest has not been sharded yet"""
+    content = read_metadata_blob(MANIFEST_INDEX_NAME, storage_account, container)
+    if content is None:
+        return None
+    return json.loads(content.decode('utf-8'))
+
+def load_manifest_index_with_etag(storage_account="stbtpuksprodcrawler01", container="crawl-metadata"):
+    """Load the shard index with its ETag for a conditional rewrite
+    
+    Returns:
+        tuple: (index dict, etag), or (None, None) if the manifest has not been sharded yet
+    """
+    content, etag = read_metadata_blob_with_etag(MANIFEST_INDEX_NAME, storage_account, container)
+    if content is None:
+        return None, None
+    return json.loads(content.decode('utf-8')), etag
+
+def load_legacy_document_hashes(storage_account="stbtpuksprodcrawler01", container="crawl-metadata"):
+    """Read the pre-sharding monolithic document-hashes.json (empty if absent)"""
+    content = read_metadata_blob(LEGACY_MANIFEST_NAME, storage_account, container)
+    return json.loads(content.decode()) if content else {}
+
+def load_document_hash_shards(shard_names, storage_account="stbtpuksprodcrawler01", container="crawl-metadata"):
+    """Read and merge the given manifest shards"""
+    hash_data = {}
+    for shard_name in shard_names:
+        content = read_metadata_blob(manifest_shard_blob(shard_name), storage_account, container)
+        if content:
+            hash_data.update(decode_manifest_shard(content))
+    return hash_data
+
+def read_site_document_hashes(site_folder, storage_account="stbtpuksprodcrawler01", container="crawl-metadata"):
+    """Read the hash records for one site folder, raising on read errors
+    
+    For callers that rewrite the folder's shards - an empty result must mean the
+    folder really has no records, not that storage could not be read.
+    
+    Returns:
+        dict: URL -> hash record for that site (empty on first run)
+    
+    Raises:
+        RuntimeError / urllib errors / ValueError: If the index or a shard cannot be read
+    """
+    index = load_manifest_index(storage_account, container)
+    if index is None:
+        # Not migrated yet - filter the monolithic manifest
+        legacy = load_legacy_document_hashes(storage_account, container)
+        hash_data = {url: record for url, record in legacy.items()
+                     if manifest_shard_folder(manifest_shard_name(url, record)) == site_folder}
+    else:
+        shard_names = [name for name in index.get("shards", {}) if manifest_shard_folder(name) == site_folder]
+        hash_data = load_document_hash_shards(shard_names, storage_account, container)
+    logging.info(f'Retrieved {len(hash_data)} stored document hashes for {site_folder}')
+    return hash_data
+
+def load_site_document_hashes(site_folder, storage_account="stbtpuksprodcrawler01", container="crawl-metadata"):
+    """Load only the hash records for one site folder - used by crawl activities
+    
+    Args:
+        site_folder: Site storage folder (see get_site_folder)
+    
+    Returns:
+        dict: URL -> hash record for that site (empty on first run or error)
+    """
+    try:
+        return read_site_document_hashes(site_folder, storage_account, container)
+    except Exception as e:
+        logging.error(f'Error retrieving document hashes for {site_folder}: {str(e)}')
+        return {}
+
 def get_document_hashes_from_storage(storage_account="stbtpuksprodcrawler01", container="crawl-metadata"):
-    """Retrieve stored document hashes from Azure Storage for change detection - using crawl-metadata container"""
+    """Retrieve stored document hashes from Azure Storage for change detection - using crawl-metadata container
+    
+    Reads every shard listed in the manifest index, falling back to the
+    pre-sharding document-hashes.json. Crawls should prefer load_site_document_hashes.
+    """
     try:
-        access_token = get_managed_identity_token()
-        if not access_token:
-            logging.error('Failed to get access token for hash retrieval')
-            return {}
-            
-        filename = "document-hashes.json"
-        url = f"https://{storage_account}.blob.core.windows.net/{container}/{filename}"
-        
-        req = urllib.request.Request(url, method='GET')
-        req.add_header('Authorization', f'Bearer {access_token}')
-        req.add_header('x-ms-version', '2020-04-08')
-        
-        with urllib.request.urlopen(req, timeout=30) as response:
-            hash_data = json.loads(response.read().decode())
-            logging.info(f'Retrieved {len(hash_data)} stored document hashes from {container}/{filename}')
+        index = load_manifest_index(storage_account, container)
+        if index is None:
+            hash_data = load_legacy_document_hashes(storage_account, container)
+            if not hash_data:
+                logging.info('No previous hash file found - this appears to be the first run')
             return hash_data
+        
+        hash_data = load_document_hash_shards(index.get("shards", {}).keys(), storage_account, container)
+        logging.info(f'Retrieved {len(hash_data)} stored document hashes from {len(index.get("shards", {}))} shards')
+        return hash_data
             
     except urllib.error.HTTPError as e:
-        if e.code == 404:
-            logging.info('No previous hash file found - this appears to be the first run')
-            return {}
-        else:
-            logging.error(f'HTTP error retrieving hashes: {e.code} {e.reason}')
-            return {}
+        logging.error(f'HTTP error retrieving hashes: {e.code} {e.reason}')
+        return {}
     except Exception as e:
         logging.error(f'Error retrieving document hashes: {str(e)}')
         return {}
 
+def get_manifest_version(storage_account="stbtpuksprodcrawler01", container="crawl-metadata"):
+    """ETag of the manifest index - the reference crawls load prior state against
+    
+    Returns:
+        str: Index ETag, or None before the first sharded write (or on error)
+    """
+    try:
+        access_token = get_managed_identity_token()
+        if not access_token:
+            return None
+        req = urllib.request.Request(f"{blob_service_url(storage_account)}/{container}/{MANIFEST_INDEX_NAME}", method='HEAD')
+        req.add_header('Authorization', f'Bearer {access_token}')
+        req.add_header('x-ms-version', '2020-04-08')
+        with pooled_urlopen(req, timeout=30) as response:
+            return response.headers.get('ETag')
+    except urllib.error.HTTPError as e:
+        if e.code != 404:
+            logging.error(f'HTTP error reading manifest version: {e.code} {e.reason}')
+        return None
+    except Exception as e:
+        logging.error(f'Error reading manifest version: {str(e)}')
+        return None
+
+def compute_hash_delta(site_folder, previous_hashes, current_hashes, complete=True, base_version=None, crawled_at=None,
+                       feed_state=None):
+    """Reduce a site crawl's hashes to the manifest changes it produced
+    
+    Args:
+        site_folder: Site storage folder the hashes belong to
+        previous_hashes: Records loaded for the site before the crawl
+        current_hashes: Records produced by the crawl
+        complete: Whether the crawl finished - only complete crawls tombstone unseen URLs
+                  and refresh last_seen on unchanged records
+        base_version: Manifest version the previous hashes were loaded at
+        crawled_at: ISO timestamp applied as last_seen to retained records
+        feed_state: The crawl's feed state (see plan_feed_discovery) - saved once the delta
+                    is applied; incremental crawls never tombstone or refresh last_seen
+    
+    Returns:
+        dict: Delta with upserts (new/changed/revived records) and removed (newly unseen) URLs
+    """
+    incremental = (feed_state or {}).get("mode") == "incremental"
+    upserts = {}
+    for url, record in current_hashes.items():
+        previous = previous_hashes.get(url)
+        if previous is None or manifest_fingerprint({url: previous}) != manifest_fingerprint({url: record}):
+            upserts[url] = record
+    removed = sorted(url for url, record in previous_hashes.items()
+                     if url not in current_hashes and not record.get("tombstoned_at")) if complete and not incremental else []
+    return {
+        "site_folder": site_folder,
+        "base_version": base_version,
+        "crawled_at": crawled_at or datetime.now(timezone.utc).isoformat(),
+        "complete": complete,
+        "incremental": incremental,
+        "feed_state": feed_state,
+        "upserts": upserts,
+        "removed": removed,
+        "retained": len(current_hashes) - len(upserts)
+    }
+
+def merge_hash_records(records, delta):
+    """Apply one site delta to that site's stored records in place
+    
+    Only keys the delta touches change: upserts replace (and revive) records, removed
+    URLs are tombstoned with the crawl time rather than dropped, and complete full
+    (non-incremental) crawls refresh last_seen on the live records they retained. Tombstones older than
+    MANIFEST_TOMBSTONE_RETENTION are purged.
+    
+    Args:
+        records: URL -> record for the delta's site folder, as stored
+        delta: compute_hash_delta result
+    
+    Returns:
+        dict: Counts of upserted, tombstoned and purged records
+    """
+    crawled_at = delta["crawled_at"]
+    counts = {"upserted": len(delta["upserts"]), "tombstoned": 0, "purged": 0}
+    for url in delta["removed"]:
+        record = records.get(url)
+        if record is not None and not record.get("tombstoned_at"):
+            record["tombstoned_at"] = crawled_at
+            counts["tombstoned"] += 1
+    if delta["complete"] and not delta.get("incremental"):
+        for url, record in records.items():
+            if not record.get("tombstoned_at"):
+                record["last_seen"] = crawled_at
+    records.update(delta["upserts"])
+    
+    cutoff = datetime.fromisoformat(crawled_at) - timedelta(seconds=MANIFEST_TOMBSTONE_RETENTION)
+    for url in [url for url, record in records.items()
+                if record.get("tombstoned_at") and datetime.fromisoformat(record["tombstoned_at"]) < cutoff]:
+        del records[url]
+        counts["purged"] += 1
+    return counts
+
+def apply_document_hash_deltas(deltas, storage_account="stbtpuksprodcrawler01", container="crawl-metadata"):
+    """Merge site crawl deltas into the sharded manifest
+    
+    Each site's shards are reloaded from storage, so deltas always apply on top of
+    the latest manifest even if it moved past the version the crawl started from.
+    Records the deltas do not touch are kept as stored (see merge_hash_records).
+    If a site's stored records cannot be read nothing is written - merging into an
+    empty set would replace the folder's shards with the delta alone - and
+    checkpoints and feed state are kept so the next run retries.
+    
+    Args:
+        deltas: List of compute_hash_delta results
+    
+    Returns:
+        bool: Success status
+    """
+    current_version = get_manifest_version(storage_account, container)
+    folder_records = {}
+    totals = {"upserted": 0, "tombstoned": 0, "purged": 0}
+    for delta in deltas:
+        if not (delta["upserts"] or delta["removed"] or delta["complete"]):
+            continue
+        if delta.get("base_version") != current_version:
+            logging.warning(f'Manifest moved from {delta.get("base_version")} to {current_version} during the '
+                           f'{delta["site_folder"]} crawl - applying delta to the latest version')
+        if delta["site_folder"] not in folder_records:
+            try:
+                folder_records[delta["site_folder"]] = read_site_document_hashes(delta["site_folder"],
+                                                                                 storage_account, container)
+            except Exception as e:
+                logging.error(f'Could not read stored hashes for {delta["site_folder"]} - manifest merge aborted: {str(e)}')
+                return False
+        for key, count in merge_hash_records(folder_records[delta["site_folder"]], delta).items():
+            totals[key] += count
+    
+    if not folder_records:
+        return True
+    logging.info(f'Manifest merge: {totals["upserted"]} upserted, {totals["tombstoned"]} tombstoned, '
+                 f'{totals["purged"]} purged across {len(folder_records)} site folders')
+    merged = {url: record for records in folder_records.values() for url, record in records.items()}
+    stored = store_document_hashes_to_storage(merged, storage_account, container, folders=set(folder_records))
+    if stored:
+        # Finished sites' progress is in the manifest now - incomplete sites keep
+        # their checkpoints so the next crawl resumes them, and their feed
+        # high-water mark so it re-reads the same feed items
+        for delta in deltas:
+            if delta["complete"] and delta.get("checkpoint_units"):
+                clear_crawl_checkpoints(delta["site_folder"], delta["checkpoint_units"])
+            if delta["complete"] and delta.get("feed_state"):
+                save_feed_state(delta["site_folder"], delta["feed_state"], storage_account, container)
+    return stored
+
+CHECKPOINT_PREFIX = "crawl-checkpoints"
+CRAWL_CHECKPOINTS_ENABLED = os.environ.get('CRAWL_CHECKPOINTS_ENABLED', 'true').lower() == 'true'
+CRAWL_CHECKPOINT_INTERVAL = int(os.environ.get('CRAWL_CHECKPOINT_INTERVAL', '25'))  # Documents between checkpoint writes
+CRAWL_CHECKPOINT_TTL = int(os.environ.get('CRAWL_CHECKPOINT_TTL_SECONDS', '21600'))  # Older checkpoints are ignored
+
+def checkpoint_blob(site_folder, unit):
+    """Checkpoint blob for one unit of a site crawl ("discovery", "documents" or "batch-N")"""
+    return f"{CHECKPOINT_PREFIX}/{site_folder}/{unit}.json"
+
+class CrawlCheckpoint:
+    """Periodically persisted progress for one unit of a site crawl
+    
+    Discovery units store the discovered document list; document units store the
+    hash record of every document whose upload (or unchanged check) completed.
+    A retried activity - or the next crawl within CRAWL_CHECKPOINT_TTL - loads the
+    checkpoint and skips that work. Checkpoints are deleted once the site's records
+    reach the hash manifest.
+    
+    Args:
+        site_folder: Site storage folder (see get_site_folder)
+        unit: Checkpoint unit name within the site
+        interval: Documents recorded between writes
+    """
+    def __init__(self, site_folder, unit, interval=None):
+        self.site_folder = site_folder
+        self.unit = unit
+        self.blob_name = checkpoint_blob(site_folder, unit)
+        self.interval = max(1, interval or CRAWL_CHECKPOINT_INTERVAL)
+        self.started_at = datetime.now(timezone.utc).isoformat()
+        self.records = {}
+        self.discovery = None
+        self.recovered = {"resumed": False, "documents_recovered": 0, "pages_recovered": 0,
+                          "bytes_recovered": 0, "checkpoints_written": 0}
+        self._unsaved = 0
+    
+    def load(self):
+        """Load a previous attempt's progress - returns True if a usable checkpoint was found"""
+        try:
+            content = read_metadata_blob(self.blob_name)
+            if not content:
+                return False
+            state = json.loads(content.decode('utf-8'))
+            saved_at = datetime.fromisoformat(state["saved_at"])
+            if (datetime.now(timezone.utc) - saved_at).total_seconds() > CRAWL_CHECKPOINT_TTL:
+                logging.info(f'Ignoring expired checkpoint {self.blob_name} from {state["saved_at"]}')
+                return False
+        except Exception as e:
+            logging.warning(f'Could not load checkpoint {self.blob_name}: {str(e)}')
+            return False
+        
+        self.started_at = state.get("started_at", self.started_at)
+        self.records = state.get("records", {})
+        self.discovery = state.get("discovery")
+        self.recovered["resumed"] = True
+        logging.info(f'♻️  Resuming from checkpoint {self.blob_name}: {len(self.records)} documents done'
+                     f'{", discovery complete" if self.discovery else ""}')
+        return True
+    
+    def record(self, url, record):
+        """Mark a document as done, writing the checkpoint every `interval` documents"""
+        self.records[url] = record
+        self._unsaved += 1
+        if self._unsaved >= self.interval:
+            self.save()
+    
+    def save_discovery(self, documents, stats):
+        """Persist a finished discovery so a retry goes straight to processing"""
+        self.discovery = {"documents": documents, "stats": stats}
+        self.save(force=True)
+    
+    def save(self, force=False):
+        """Write unsaved progress (failures are logged - checkpoints are best effort)"""
+        if not (force or self._unsaved):
+            return False
+        state = {
+            "site_folder": self.site_folder,
+            "unit": self.unit,
+            "started_at": self.started_at,
+            "saved_at": datetime.now(timezone.utc).isoformat(),
+            "discovery": self.discovery,
+            "records": self.records
+        }
+        try:
+            saved = write_metadata_blob(self.blob_name, json.dumps(state, separators=(',', ':')).encode('utf-8'))
+        except Exception as e:
+            logging.warning(f'Could not write checkpoint {self.blob_name}: {str(e)}')
+            return False
+        if saved:
+            self._unsaved = 0
+            self.recovered["checkpoints_written"] += 1
+        return saved
+    
+    def clear(self):
+        """Delete the checkpoint once its work is safely stored"""
+        try:
+            return delete_metadata_blob(self.blob_name)
+        except Exception as e:
+            logging.warning(f'Could not delete checkpoint {self.blob_name}: {str(e)}')
+            return False
+
+def open_crawl_checkpoint(site_folder, unit):
+    """Create and load a unit's checkpoint, or None when checkpoints are disabled"""
+    if not CRAWL_CHECKPOINTS_ENABLED:
+        return None
+    checkpoint = CrawlCheckpoint(site_folder, unit)
+    checkpoint.load()
+    return checkpoint
+
+def clear_crawl_checkpoints(site_folder, units):
+    """Delete the given checkpoint units for a site"""
+    if not CRAWL_CHECKPOINTS_ENABLED:
+        return
+    for unit in units:
+        CrawlCheckpoint(site_folder, unit).clear()
+
+def merge_recovered_work(recoveries):
+    """Sum checkpoint recovery counters (CrawlCheckpoint.recovered) across units or sites"""
+    merged = {"resumed": 0, "documents_recovered": 0, "pages_recovered": 0,
+              "bytes_recovered": 0, "checkpoints_written": 0}
+    for recovered in recoveries:
+        for key in merged:
+            merged[key] += int((recovered or {}).get(key, 0))
+    return merged
+
 def load_websites_config():
     """Load website configurations from websites.json file
     
@@ -763,8 +2354,8 @@ def load_websites_config():
         config_location = os.environ.get('WEBSITES_CONFIG_LOCATION', 'local')
         
         if config_location == 'local':
-            # Read from local file system
-            config_path = os.path.join(os.path.dirname(__file__), 'websites.json')
+            # Read from local file system (WEBSITES_CONFIG_PATH points at an alternative file)
+            config_path = os.environ.get('WEBSITES_CONFIG_PATH') or os.path.join(os.path.dirname(__file__), 'websites.json')
             with open(config_path, 'r', encoding='utf-8') as f:
                 config_data = json.load(f)
             logging.info(f'Loaded website config from local file: {config_path}')
@@ -895,471 +2486,1085 @@ def get_enabled_websites_legacy():
     
     return enabled_sites
 
-def crawl_website_core(site_config, previous_hashes=None):
-    """Core website crawling logic extracted for reusability
+# ============================================================================
+# FRONTIER DISCOVERY - Rule-driven concurrent link discovery
+# ============================================================================
+
+# Browser-like headers for every discovery page fetch
+DISCOVERY_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36 Edg/119.0.0.0',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8',
+    'Accept-Language': 'en-GB,en;q=0.9',
+    'Accept-Encoding': 'gzip',
+    'Sec-Ch-Ua': '"Google Chrome";v="119", "Chromium";v="119", "Not?A_Brand";v="24"',
+    'Sec-Ch-Ua-Mobile': '?0',
+    'Sec-Ch-Ua-Platform': '"Windows"',
+    'Sec-Fetch-Dest': 'document',
+    'Sec-Fetch-Mode': 'navigate',
+    'Sec-Fetch-Site': 'none',
+    'Sec-Fetch-User': '?1',
+    'Upgrade-Insecure-Requests': '1',
+    'Connection': 'keep-alive',
+    'Cache-Control': 'max-age=0'
+}
+DISCOVERY_PAGE_TYPES = ('text/html', 'application/xhtml+xml', 'text/plain', 'application/xml', 'text/xml')
+DEFAULT_DISCOVERY_MAX_PAGES = 500  # Safety cap on pages fetched per site crawl
+DEFAULT_DISCOVERY_MAX_DEPTH = 5
+
+# CPS A-Z guidance index: subject_area=2343 (A) through 2368 (Z)
+CPS_SUBJECT_AREA_RANGE = [2343, 2368]
+
+# XML sitemaps (sitemaps.org) - child sitemaps listed by a <sitemapindex> get this link class
+SITEMAP_LINK_CLASS = "sitemap"
+SITEMAP_GZIP_TYPES = ('application/gzip', 'application/x-gzip')
+
+# Atom/RSS feeds - incremental discovery of items updated since the last crawl's high-water mark
+FEED_LINK_CLASS = "feed"  # Link class of a feed's next page (Atom rel="next")
+FEED_STATE_PREFIX = "feed-state"
+FEED_MAX_PAGES = 10  # Feed pages followed per incremental crawl
+FEED_FULL_CRAWL_INTERVAL_HOURS = float(os.environ.get('FEED_FULL_CRAWL_INTERVAL_HOURS', '24'))
+FEED_HIGH_WATER_OVERLAP = 3600  # Seconds a full crawl's high-water mark is set back to cover feed publishing lag
+
+def get_discovery_rules(site_config):
+    """Discovery rules for a site - the "discovery" block from websites.json, or rules
+    equivalent to the legacy flags (capture_html_guidance, CPS A-Z, multi_level)
     
-    Args:
-        site_config (dict): Website configuration with url, name, multi_level settings
-        previous_hashes (dict): Previously stored document hashes for change detection
+    Rules:
+        seeds: [{"url": template, "page": kind, "range": [first, last]}] - templates may use
+               {site_url}, {origin} and (with range) {n}
+        pages: {kind: page rule} in output order, each with
+               documents (collect document links), guidance (collect guidance links),
+               same_host (only collect links on the site's host), max_items (cap on unique
+               items collected from pages of this kind), required (errors fail the crawl),
+               sitemap (pages are XML sitemaps - child sitemaps have link class "sitemap") and
+               follow: [{"links": link class, "page": kind, "limit": total pages}]
+        max_pages / max_depth / concurrency: engine limits
     
-    Returns:
-        dict: Crawl results including documents found, processed, new, changed, uploaded
+    A site with "sitemaps" (seed URL templates) and no "discovery" block is discovered
+    from its sitemaps alone, following sitemap indexes.
     """
+    if site_config.get("discovery"):
+        return site_config["discovery"]
+    
     site_url = site_config["url"]
-    site_name = site_config["name"]
+    if site_config.get("sitemaps"):
+        sitemap = {"sitemap": True, "documents": True, "guidance": site_config.get("capture_html_guidance", False),
+                   "required": True, "follow": [{"links": SITEMAP_LINK_CLASS, "page": "sitemap"}]}
+        if site_config.get("capture_html_guidance", False):
+            sitemap["max_items"] = site_config.get("max_guidance_pages", 300)
+        return {"seeds": [{"url": url, "page": "sitemap"} for url in site_config["sitemaps"]],
+                "pages": {"sitemap": sitemap}}
     
-    result = {
-        "site_name": site_name,
-        "site_url": site_url,
-        "status": "unknown",
-        "documents_found": 0,
-        "documents_processed": 0,
-        "documents_new": 0,
-        "documents_changed": 0,
-        "documents_unchanged": 0,
-        "documents_uploaded": 0,
-        "current_hashes": {},
-        "error": None
-    }
+    start = {"documents": True, "required": True}
+    rules = {"seeds": [{"url": "{site_url}", "page": "start"}], "pages": {"start": start}}
     
-    try:
-        logging.info(f'Crawling site: {site_name} ({site_url})')
-        
-        # Ensure website folder exists in storage (automatic folder creation)
-        ensure_website_folder_exists(site_name)
-        
-        # Advanced headers with Chrome security context
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36 Edg/119.0.0.0',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7',
-            'Accept-Language': 'en-GB,en;q=0.9',
-            'Sec-Ch-Ua': '"Google Chrome";v="119", "Chromium";v="119", "Not?A_Brand";v="24"',
-            'Sec-Ch-Ua-Mobile': '?0',
-            'Sec-Ch-Ua-Platform': '"Windows"',
-            'Sec-Fetch-Dest': 'document',
-            'Sec-Fetch-Mode': 'navigate',
-            'Sec-Fetch-Site': 'none',
-            'Sec-Fetch-User': '?1',
-            'Upgrade-Insecure-Requests': '1',
-            'Connection': 'keep-alive',
-            'Cache-Control': 'max-age=0'
-        }
+    if site_config.get("capture_html_guidance", False):
+        # Category pages (one level below the start page) link to guidance pages
+        start["follow"] = [{"links": "category", "page": "category", "limit": 20}]
+        rules["pages"]["category"] = {"guidance": True, "max_items": site_config.get("max_guidance_pages", 50)}
+        if "cps.gov.uk" in site_url.lower() and "/prosecution-guidance" in site_url.lower():
+            rules["seeds"].append({"url": "{origin}/prosecution-guidance-search?subject_area={n}",
+                                   "range": CPS_SUBJECT_AREA_RANGE, "page": "index"})
+            rules["pages"]["index"] = {"guidance": True, "max_items": site_config.get("max_guidance_pages", 300)}
+    elif site_config.get("multi_level", False) and site_config.get("max_depth", 1) > 1:
+        # Level 1 document links are fetched once more for same-site sub-documents
+        start["follow"] = [{"links": "document", "page": "document_page", "limit": 100}]
+        rules["pages"]["document_page"] = {"documents": True, "same_host": True}
+    
+    return rules
+
+def expand_discovery_seeds(seeds, site_url):
+    """Seed URLs from rule templates, in rule order"""
+    origin = urllib.parse.urlsplit(site_url)
+    values = {"site_url": site_url, "origin": f"{origin.scheme}://{origin.netloc}"}
+    expanded = []
+    for seed in seeds:
+        if "range" in seed:
+            first, last = seed["range"]
+            urls = [seed["url"].format(n=n, **values) for n in range(first, last + 1)]
+        else:
+            urls = [seed["url"].format(**values)]
+        expanded.extend((url, seed.get("page", "start")) for url in urls)
+    return expanded
+
+class FrontierCrawler:
+    """Breadth-first link discovery over a URL frontier, driven by per-site rules
+    
+    Pages wait in a priority queue ordered by (depth, page kind, discovery order).
+    Each depth level is fetched concurrently - one worker pool per host, so each host
+    has at most `concurrency` pages in flight while the shared HOST_RATE_LIMITER paces
+    its requests - and the next level is scheduled from the results in discovery
+    order, so limits, the URL-seen set and the collected document list are the same
+    as a sequential crawl.
+    
+    Args:
+        site_config: Website configuration (url, discovery rules or legacy flags)
+        classifier: URLClassifier for the site
+        rules: Discovery rules (defaults to get_discovery_rules(site_config))
+        seen: The crawl's URLSeenSet - pages and collected documents are deduplicated
+              on canonical URLs across every level and page kind
+    """
+    def __init__(self, site_config, classifier=None, rules=None, seen=None):
+        self.site_url = site_config["url"]
+        self.site_host = urllib.parse.urlsplit(self.site_url).hostname
+        self.classifier = classifier or get_url_classifier(site_config)
+        self.rules = rules or get_discovery_rules(site_config)
+        self.page_rules = self.rules["pages"]
+        self.kind_rank = {kind: rank for rank, kind in enumerate(self.page_rules)}
+        self.max_pages = int(self.rules.get("max_pages", DEFAULT_DISCOVERY_MAX_PAGES))
+        self.max_depth = int(self.rules.get("max_depth", DEFAULT_DISCOVERY_MAX_DEPTH))
+        self.concurrency = max(1, int(self.rules.get("concurrency",
+                                                     site_config.get("max_concurrent_documents", DEFAULT_DOCUMENT_CONCURRENCY))))
+        self.seen = seen if seen is not None else URLSeenSet()
+        self.kept = {kind: 0 for kind in self.page_rules}  # Items yielded per page kind
+        self.stats = {"pages_fetched": 0, "pages_failed": 0, "pages_skipped": 0, "pages_cancelled": 0,
+                      "links_seen": 0, "pages_by_kind": {}}
+    
+    def run(self):
+        """Discover documents
         
-        req = urllib.request.Request(site_url, headers=headers)
+        Returns:
+            dict: {"documents": [...], "stats": {...}} - documents in stream() order
         
+        Raises:
+            urllib.error.HTTPError / Exception: when a page of a "required" kind fails
+        """
+        documents = list(self.stream())
+        return {"documents": documents, "stats": self.stats}
+    
+    def stream(self):
+        """Discover documents, yielding each one as soon as its page has been parsed
+        
+        Pages are consumed in frontier order, so a document is final when it is yielded:
+        it is the first of its canonical URL (across every page kind) and within its
+        kind's max_items. Output is ordered by depth, then page kind (rule order), then
+        discovery order - the same for every run and concurrency setting. self.stats is
+        complete once the generator is exhausted.
+        
+        Yields:
+            dict: Document (or guidance page) to process
+        
+        Raises:
+            urllib.error.HTTPError / Exception: when a page of a "required" kind fails
+        """
+        frontier = []  # heap of (depth, kind rank, discovery key, url, kind)
+        follow_counts = {}
+        kept = self.kept
+        over_limit = {kind: 0 for kind in self.page_rules}
+        
+        for index, (url, kind) in enumerate(expand_discovery_seeds(self.rules.get("seeds", []), self.site_url)):
+            if kind in self.page_rules and self.seen.add(url, "page"):
+                heapq.heappush(frontier, (0, self.kind_rank[kind], (index,), url, kind))
+        
+        pages_scheduled = len(frontier)
+        host_pools = {}
         try:
-            with urllib.request.urlopen(req, timeout=15) as response:
-                # Handle gzipped responses
+            while frontier:
+                depth = frontier[0][0]
+                level = []
+                while frontier and frontier[0][0] == depth:
+                    level.append(heapq.heappop(frontier))
+                
+                for entry, links in self._fetch_level(host_pools, level):
+                    _, _, key, page_url, kind = entry
+                    rule = self.page_rules[kind]
+                    max_items = rule.get("max_items")
+                    for link_index, link in enumerate(links):
+                        self.stats["links_seen"] += 1
+                        link_key = key + (link_index,)
+                        item = self._collect(rule, page_url, depth, link)
+                        if item is not None:
+                            if max_items is not None and kept[kind] >= max_items:
+                                over_limit[kind] += 1
+                            elif self.seen.add(item["url"], "document"):
+                                kept[kind] += 1
+                                yield item
+                        
+                        if depth + 1 >= self.max_depth:
+                            continue
+                        for follow in rule.get("follow", []):
+                            matches = link["document"] if follow["links"] == "document" else link["class"] == follow["links"]
+                            if not matches or follow["page"] not in self.page_rules:
+                                continue
+                            follow_id = (kind, follow["page"])
+                            if follow_counts.get(follow_id, 0) >= follow.get("limit", self.max_pages):
+                                continue
+                            if self.is_exhausted(follow["page"]):
+                                # Budget already met - count the page as skipped instead of scheduling it
+                                if self.seen.add(link["url"], "page"):
+                                    follow_counts[follow_id] = follow_counts.get(follow_id, 0) + 1
+                                    self.stats["pages_cancelled"] += 1
+                                break
+                            if pages_scheduled >= self.max_pages:
+                                self.stats["pages_skipped"] += 1
+                                continue
+                            if not self.seen.add(link["url"], "page"):
+                                continue
+                            follow_counts[follow_id] = follow_counts.get(follow_id, 0) + 1
+                            pages_scheduled += 1
+                            heapq.heappush(frontier, (depth + 1, self.kind_rank[follow["page"]], link_key, link["url"], follow["page"]))
+                            break
+        finally:
+            for pool in host_pools.values():
+                pool.shutdown(wait=True, cancel_futures=True)
+        
+        for kind, count in over_limit.items():
+            if count:
+                logging.info(f'Limiting {kind} pages to first {self.page_rules[kind]["max_items"]} discovered items '
+                             f'({count} more links not kept)')
+        self.stats["items_over_limit"] = {kind: count for kind, count in over_limit.items() if count}
+        if self.stats["pages_cancelled"]:
+            logging.info(f'⏭️  Discovery budget met - {self.stats["pages_cancelled"]} pages not fetched')
+        self.stats["duplicates_avoided"] = self.seen.get_stats()
+    
+    def is_exhausted(self, kind, visiting=()):
+        """True once pages of this kind can add nothing: its max_items is reached and
+        every page kind it follows into is exhausted too"""
+        rule = self.page_rules[kind]
+        max_items = rule.get("max_items")
+        if max_items is None or self.kept[kind] < max_items:
+            return False
+        visiting = visiting + (kind,)
+        return all(follow["page"] in visiting or follow["page"] not in self.page_rules
+                   or self.is_exhausted(follow["page"], visiting)
+                   for follow in rule.get("follow", []))
+    
+    def _fetch_level(self, host_pools, level):
+        """Fetch one depth level concurrently, yielding (entry, links) in frontier order
+        
+        Pages are submitted at most `concurrency` per host ahead of the page being
+        consumed. Once a page kind is exhausted (see is_exhausted) its remaining pages
+        are cancelled, so capped sites stop discovering as soon as the budget is met
+        rather than after every listed page.
+        """
+        hosts = {urllib.parse.urlsplit(entry[3]).netloc for entry in level}
+        window = self.concurrency * len(hosts)
+        upcoming = iter(level)
+        pending = collections.deque()
+        
+        def submit_ahead():
+            while len(pending) < window:
+                entry = next(upcoming, None)
+                if entry is None:
+                    return
+                if self.is_exhausted(entry[4]):
+                    self.stats["pages_cancelled"] += 1
+                    continue
+                host = urllib.parse.urlsplit(entry[3]).netloc
+                if host not in host_pools:
+                    host_pools[host] = concurrent.futures.ThreadPoolExecutor(
+                        max_workers=self.concurrency, thread_name_prefix='discovery')
+                pending.append((entry, submit_traced(host_pools[host], self._fetch_page, entry[3], entry[4])))
+        
+        submit_ahead()
+        while pending:
+            entry, future = pending.popleft()
+            if self.is_exhausted(entry[4]):
+                future.cancel()  # An already running fetch finishes but its links are not used
+                self.stats["pages_cancelled"] += 1
+                submit_ahead()
+                continue
+            try:
+                links = future.result()
+            except Exception as e:
+                self.stats["pages_failed"] += 1
+                if self.page_rules[entry[4]].get("required"):
+                    raise
+                if isinstance(e, urllib.error.HTTPError) and e.code == 403:
+                    logging.error(f'❌ Discovery page BLOCKED (403): {entry[3]} - bot detection active')
+                else:
+                    logging.warning(f'Failed to crawl {entry[4]} page {entry[3]}: {str(e)}')
+                continue
+            finally:
+                submit_ahead()
+            self.stats["pages_fetched"] += 1
+            self.stats["pages_by_kind"][entry[4]] = self.stats["pages_by_kind"].get(entry[4], 0) + 1
+            yield entry, links
+    
+    def _fetch_page(self, url, kind):
+        """Download one page and return its links"""
+        with trace_span(f"discovery.{kind}"):
+            req = urllib.request.Request(url, headers=DISCOVERY_HEADERS)
+            if self.page_rules[kind].get("sitemap"):
+                with pooled_urlopen(req, timeout=30) as response:
+                    return self._extract_sitemap_links(url, response)
+            if self.page_rules[kind].get("feed"):
+                with pooled_urlopen(req, timeout=30) as response:
+                    return self._extract_feed_links(url, response, self.page_rules[kind].get("since"))
+            with pooled_urlopen(req, timeout=15) as response:
+                content_type = (response.headers.get('Content-Type') or 'text/html').split(';')[0].strip().lower()
+                if content_type not in DISCOVERY_PAGE_TYPES:
+                    return []  # Binary documents have no links - skip the body
                 raw_content = response.read()
                 if response.info().get('Content-Encoding') == 'gzip':
-                    content = gzip.decompress(raw_content).decode('utf-8')
-                else:
-                    content = raw_content.decode('utf-8')
-                
-                parse_result = find_documents_in_html(content, site_url)
-                
-        except urllib.error.HTTPError as e:
-            if e.code == 403:
-                logging.warning(f'Site {site_name} blocked (403) - anti-bot protection')
-                result["status"] = "blocked"
-                result["error"] = "HTTP 403 - Anti-bot protection"
-                return result
-            else:
-                raise
-        
-        all_documents = parse_result["documents"]
-        logging.info(f'Found {len(all_documents)} Level 1 documents on {site_name}')
-        
-        # HTML Guidance Capture Mode (for College of Policing APP and similar sites)
-        # If enabled, capture web-based guidance pages as HTML documents
-        if site_config.get("capture_html_guidance", False):
-            logging.info(f'HTML guidance capture enabled for {site_name} - will discover and capture web-based guidance pages')
-            
-            # Parse the main page to find all relevant links
-            parser = EnhancedDocumentLinkParser()
+                    raw_content = gzip.decompress(raw_content)
+            return self._extract_links(url, raw_content.decode('utf-8', errors='replace'))
+    
+    def _extract_links(self, page_url, content):
+        """Links on a page, each with its absolute (fragment-free) URL and classification"""
+        with trace_span("parse"):
+            parser = EnhancedDocumentLinkParser(self.classifier)
             parser.feed(content)
-            
-            # Get minimum depth requirement
-            min_depth = site_config.get("guidance_min_depth", 2)
-            
-            # First, discover category pages (Level 1)
-            category_pages = []
-            for link in parser.all_links:
-                # Convert to absolute URL
-                if link.startswith(('http://', 'https://')):
-                    full_url = link
-                elif link.startswith('/'):
-                    base = urllib.parse.urlparse(site_url)
-                    full_url = f"{base.scheme}://{base.netloc}{link}"
-                else:
-                    full_url = urllib.parse.urljoin(site_url, link)
-                
-                # Check if it's a category page (1 level deep: /app/category)
-                parsed = urllib.parse.urlparse(full_url)
-                path_parts = [p for p in parsed.path.split('/') if p]
-                if len(path_parts) == 2 and '/app/' in full_url.lower():
-                    category_pages.append(full_url)
-            
-            logging.info(f'Found {len(category_pages)} category pages on {site_name}')
-            
-            # Now crawl each category page to find guidance pages (Level 2)
-            guidance_pages = []
-            max_categories = min(20, len(category_pages))  # Limit categories for safety
-            logging.info(f'Will crawl {max_categories} category pages to find guidance')
-            
-            import time
-            for i, category_url in enumerate(category_pages[:max_categories]):
-                try:
-                    logging.info(f'Crawling category {i+1}/{max_categories}: {category_url}')
-                    
-                    # Download category page with full browser headers
-                    headers = {
-                        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36 Edg/119.0.0.0',
-                        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8',
-                        'Accept-Language': 'en-GB,en;q=0.9',
-                        'Accept-Encoding': 'gzip, deflate, br',
-                        'Sec-Ch-Ua': '"Google Chrome";v="119", "Chromium";v="119", "Not?A_Brand";v="24"',
-                        'Sec-Ch-Ua-Mobile': '?0',
-                        'Sec-Ch-Ua-Platform': '"Windows"',
-                        'Sec-Fetch-Dest': 'document',
-                        'Sec-Fetch-Mode': 'navigate',
-                        'Sec-Fetch-Site': 'none',
-                        'Sec-Fetch-User': '?1',
-                        'Upgrade-Insecure-Requests': '1',
-                        'Cache-Control': 'max-age=0',
-                        'Connection': 'keep-alive'
-                    }
-                    req = urllib.request.Request(category_url, headers=headers)
-                    with urllib.request.urlopen(req, timeout=15) as response:
-                        raw_cat = response.read()
-                        if response.info().get('Content-Encoding') == 'gzip':
-                            cat_content = gzip.decompress(raw_cat).decode('utf-8')
-                        else:
-                            cat_content = raw_cat.decode('utf-8')
-                    
-                    # Parse category page for guidance links
-                    cat_parser = EnhancedDocumentLinkParser()
-                    cat_parser.feed(cat_content)
-                    
-                    for link in cat_parser.all_links:
-                        # Convert to absolute URL
-                        if link.startswith(('http://', 'https://')):
-                            guidance_url = link
-                        elif link.startswith('/'):
-                            base = urllib.parse.urlparse(site_url)
-                            guidance_url = f"{base.scheme}://{base.netloc}{link}"
-                        else:
-                            guidance_url = urllib.parse.urljoin(category_url, link)
-                        
-                        # Check if it's a guidance page using updated function
-                        if is_guidance_page(guidance_url, min_depth=min_depth):
-                            guidance_pages.append({
-                                "url": guidance_url,
-                                "filename": guidance_url.split('/')[-1] or "guidance",
-                                "type": "html_guidance",
-                                "extension": "html"
-                            })
-                    
-                    # Be respectful - add delay
-                    time.sleep(1)
-                    
-                except urllib.error.HTTPError as e:
-                    if e.code == 403:
-                        logging.error(f'❌ Category page BLOCKED (403): {category_url} - bot detection active')
-                    else:
-                        logging.warning(f'HTTP error {e.code} crawling category page {category_url}: {str(e)}')
+        document_links = set(parser.document_links)
+        links = []
+        for link in parser.all_links:
+            absolute_url = urllib.parse.urldefrag(urllib.parse.urljoin(page_url, link))[0]
+            links.append({
+                "href": link,
+                "url": absolute_url,
+                "class": self.classifier.classify(absolute_url),
+                "document": link in document_links
+            })
+        return links
+    
+    def _extract_sitemap_links(self, url, response):
+        """Links listed by a sitemap or sitemap index, parsed incrementally off the response
+        
+        Gzipped sitemaps (Content-Encoding, a gzip Content-Type or a .gz URL) are
+        decompressed as they stream. Each <loc> becomes a link carrying its <lastmod>;
+        a <sitemapindex> lists child sitemaps, which get link class "sitemap".
+        """
+        body = response
+        content_type = (response.headers.get('Content-Type') or '').split(';')[0].strip().lower()
+        if (response.info().get('Content-Encoding') == 'gzip' or content_type in SITEMAP_GZIP_TYPES
+                or urllib.parse.urlsplit(url).path.lower().endswith('.gz')):
+            body = gzip.GzipFile(fileobj=response)
+        links = []
+        with trace_span("parse"):
+            for _, elem in ET.iterparse(body, events=("end",)):
+                tag = elem.tag.rsplit('}', 1)[-1]
+                if tag not in ("url", "sitemap"):
                     continue
-                except Exception as e:
-                    logging.warning(f'Failed to crawl category page {category_url}: {str(e)}')
+                loc = (elem.findtext("{*}loc") or "").strip()
+                if loc:
+                    links.append({
+                        "href": loc,
+                        "url": urllib.parse.urldefrag(loc)[0],
+                        "class": SITEMAP_LINK_CLASS if tag == "sitemap" else self.classifier.classify(loc),
+                        "document": tag == "url" and self.classifier.is_document(loc),
+                        "lastmod": (elem.findtext("{*}lastmod") or "").strip() or None
+                    })
+                elem.clear()
+        return links
+    
+    def _extract_feed_links(self, url, response, since=None):
+        """Links from the entries of an Atom or RSS feed updated after `since`
+        
+        Every link of an entry (Atom <link href>, RSS <link> and <enclosure url>) carries
+        the entry's updated/published date as its lastmod. Entries at or before `since`
+        are dropped; undated entries, or dates that cannot be parsed, count as updated.
+        The next feed page (Atom rel="next", link class "feed") is only
+        listed while every entry on this page was newer.
+        """
+        since = parse_sitemap_lastmod(since)
+        body = gzip.GzipFile(fileobj=response) if response.info().get('Content-Encoding') == 'gzip' else response
+        links, next_page, reached_since = [], None, False
+        with trace_span("parse"):
+            for _, elem in ET.iterparse(body, events=("end",)):
+                tag = elem.tag.rsplit('}', 1)[-1]
+                if tag == "link" and elem.get("rel") == "next" and elem.get("href"):
+                    next_page = urllib.parse.urljoin(url, elem.get("href"))
+                if tag not in ("entry", "item"):
                     continue
-            
-            # Remove duplicates
-            seen_urls = set()
-            unique_guidance = []
-            for page in guidance_pages:
-                if page["url"] not in seen_urls:
-                    seen_urls.add(page["url"])
-                    unique_guidance.append(page)
-            
-            logging.info(f'Found {len(unique_guidance)} unique guidance pages to capture for {site_name}')
-            
-            # Limit to reasonable number
-            max_guidance_pages = site_config.get("max_guidance_pages", 50)
-            if len(unique_guidance) > max_guidance_pages:
-                logging.info(f'Limiting to first {max_guidance_pages} guidance pages')
-                unique_guidance = unique_guidance[:max_guidance_pages]
-            
-            # Add guidance pages to documents list
-            all_documents.extend(unique_guidance)
-            logging.info(f'Total items to process: {len(all_documents)} (includes {len(unique_guidance)} HTML guidance pages)')
-            
-            # CPS-specific guidance discovery (alphabetical index approach)
-            # Check if this is a CPS site needing special handling
-            if "cps.gov.uk" in site_url.lower() and "/prosecution-guidance" in site_url.lower():
-                logging.info(f'🔍 CPS-specific guidance discovery activated for {site_name}')
-                
-                # CPS uses alphabetical index pages: subject_area=2343 (A) through 2368 (Z)
-                cps_guidance_pages = []
-                base_domain = urllib.parse.urlparse(site_url)
-                base_url = f"{base_domain.scheme}://{base_domain.netloc}"
-                
-                # Generate all 26 alphabetical index URLs
-                alphabet_urls = []
-                for i in range(26):  # A-Z
-                    subject_area = 2343 + i
-                    letter = chr(65 + i)  # A=65, B=66, etc.
-                    alpha_url = f"{base_url}/prosecution-guidance-search?subject_area={subject_area}"
-                    alphabet_urls.append((letter, alpha_url))
-                
-                logging.info(f'📚 Will crawl {len(alphabet_urls)} alphabetical index pages (A-Z)')
-                
-                # Crawl each alphabetical page to find guidance links
-                import time
-                for letter, alpha_url in alphabet_urls:
-                    try:
-                        logging.info(f'  Crawling letter "{letter}": {alpha_url}')
-                        
-                        # Download alphabetical index page
-                        headers = {
-                            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36',
-                            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-                            'Accept-Language': 'en-GB,en;q=0.9',
-                            'Accept-Encoding': 'gzip, deflate, br',
-                        }
-                        req = urllib.request.Request(alpha_url, headers=headers)
-                        with urllib.request.urlopen(req, timeout=15) as response:
-                            raw_alpha = response.read()
-                            if response.info().get('Content-Encoding') == 'gzip':
-                                alpha_content = gzip.decompress(raw_alpha).decode('utf-8')
-                            else:
-                                alpha_content = raw_alpha.decode('utf-8')
-                        
-                        # Parse alphabetical page for guidance links
-                        alpha_parser = EnhancedDocumentLinkParser()
-                        alpha_parser.feed(alpha_content)
-                        
-                        letter_count = 0
-                        for link in alpha_parser.all_links:
-                            # Convert to absolute URL
-                            if link.startswith(('http://', 'https://')):
-                                guidance_url = link
-                            elif link.startswith('/'):
-                                guidance_url = f"{base_url}{link}"
-                            else:
-                                guidance_url = urllib.parse.urljoin(alpha_url, link)
-                            
-                            # Check if it's a CPS guidance page using our detection function
-                            if is_cps_guidance_page(guidance_url):
-                                cps_guidance_pages.append({
-                                    "url": guidance_url,
-                                    "filename": guidance_url.split('/')[-1] or "guidance",
-                                    "type": "html_guidance",
-                                    "extension": "html"
-                                })
-                                letter_count += 1
-                        
-                        if letter_count > 0:
-                            logging.info(f'  ✅ Letter "{letter}": Found {letter_count} guidance pages')
-                        
-                        # Be respectful - add delay between requests
-                        time.sleep(0.5)
-                        
-                    except urllib.error.HTTPError as e:
-                        logging.warning(f'  ⚠️  Letter "{letter}": HTTP error {e.code} - {str(e)}')
-                        continue
-                    except Exception as e:
-                        logging.warning(f'  ⚠️  Letter "{letter}": Failed to crawl - {str(e)}')
-                        continue
-                
-                # Remove duplicates from CPS guidance pages
-                seen_cps_urls = set()
-                unique_cps_guidance = []
-                for page in cps_guidance_pages:
-                    if page["url"] not in seen_cps_urls:
-                        seen_cps_urls.add(page["url"])
-                        unique_cps_guidance.append(page)
-                
-                logging.info(f'📊 CPS Discovery Summary: Found {len(unique_cps_guidance)} unique prosecution guidance pages across A-Z')
-                
-                # Limit to configured maximum
-                max_cps_pages = site_config.get("max_guidance_pages", 300)
-                if len(unique_cps_guidance) > max_cps_pages:
-                    logging.info(f'⚠️  Limiting to first {max_cps_pages} CPS guidance pages (found {len(unique_cps_guidance)})')
-                    unique_cps_guidance = unique_cps_guidance[:max_cps_pages]
-                
-                # Add CPS guidance pages to documents list
-                all_documents.extend(unique_cps_guidance)
-                logging.info(f'✅ Total items to process: {len(all_documents)} (includes {len(unique_cps_guidance)} CPS guidance pages)')
-        
-        # Multi-level crawling if enabled (for traditional document discovery)
-        elif site_config.get("multi_level", False) and site_config.get("max_depth", 1) > 1:
-            max_depth = site_config.get("max_depth", 2)
-            logging.info(f'Starting multi-level crawl for {site_name} (max depth: {max_depth})')
-            
-            level1_count = len(all_documents)
-            sub_documents_found = 0
-            
-            # Crawl Level 1 documents for sub-documents (limit to first 100 for safety)
-            max_level1_to_crawl = min(100, len(all_documents))
-            logging.info(f'Will crawl {max_level1_to_crawl} Level 1 documents for sub-documents')
-            
-            for level1_doc in all_documents[:max_level1_to_crawl]:
-                try:
-                    sub_docs = crawl_document_page_for_sub_documents(
-                        level1_doc["url"],
-                        site_url,
-                        max_depth=max_depth,
-                        current_depth=1
-                    )
-                    all_documents.extend(sub_docs)
-                    sub_documents_found += len(sub_docs)
-                    
-                    # Be respectful - add delay
-                    import time
-                    time.sleep(1)
-                    
-                except Exception as e:
-                    logging.warning(f'Failed to crawl sub-docs for {level1_doc["url"]}: {str(e)}')
-                    continue
-            
-            logging.info(f'Multi-level crawl complete - {level1_count} Level 1 + {sub_documents_found} Level 2+ = {len(all_documents)} total')
-        
-        result["documents_found"] = len(all_documents)
-        
-        if not all_documents:
-            result["status"] = "no_documents"
-            return result
-        
-        # Use provided hashes or get from storage
-        if previous_hashes is None:
-            previous_hashes = get_document_hashes_from_storage()
-        
-        current_hashes = {}
+                updated = feed_entry_updated(elem)
+                updated_at = parse_sitemap_lastmod(updated)  # None when missing or unreadable - keep the entry
+                if since is not None and updated_at is not None and updated_at <= since:
+                    reached_since = True
+                    self.stats["feed_entries_old"] = self.stats.get("feed_entries_old", 0) + 1
+                else:
+                    for href in feed_entry_links(elem):
+                        absolute_url = urllib.parse.urldefrag(urllib.parse.urljoin(url, href))[0]
+                        links.append({
+                            "href": href,
+                            "url": absolute_url,
+                            "class": self.classifier.classify(absolute_url),
+                            "document": self.classifier.is_document(href),
+                            "lastmod": updated
+                        })
+                elem.clear()
+        if next_page and not reached_since:
+            links.append({"href": next_page, "url": next_page, "class": FEED_LINK_CLASS, "document": False})
+        return links
+    
+    def _collect(self, rule, page_url, depth, link):
+        """Document dict for a link this page kind collects, or None"""
+        absolute_url = link["url"]
+        if rule.get("same_host") and urllib.parse.urlsplit(absolute_url).hostname != self.site_host:
+            return None
+        
+        if rule.get("documents") and link["document"]:
+            href = link["href"]
+            item = {
+                "url": absolute_url,
+                "filename": href.split('/')[-1] if '/' in href else href,
+                "extension": self.classifier.document_extension(href) or 'unknown',
+                "original_link": href
+            }
+            if depth > 0:
+                item["crawl_level"] = depth + 1
+                item["parent_url"] = page_url
+        elif rule.get("guidance") and link["class"] == "guidance":
+            item = {
+                "url": absolute_url,
+                "filename": absolute_url.split('/')[-1] or "guidance",
+                "type": "html_guidance",
+                "extension": "html"
+            }
+        else:
+            return None
+        if link.get("lastmod"):
+            item["lastmod"] = link["lastmod"]  # Sitemap <lastmod> - lets processing skip unchanged URLs
+        return item
+
+def parse_sitemap_lastmod(value):
+    """Latest moment a sitemap <lastmod> (W3C datetime) can refer to, as an aware datetime
+    
+    Date-only values cover the whole day, so they compare as the following midnight.
+    Values without a timezone are taken as UTC. Returns None for missing or invalid values.
+    """
+    if not value:
+        return None
+    try:
+        if len(value) == 10:
+            return datetime.fromisoformat(value).replace(tzinfo=timezone.utc) + timedelta(days=1)
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+def unchanged_since_last_seen(doc, previous_record):
+    """True when a sitemap's <lastmod> for the document predates the manifest's last_seen
+    for it, so the stored record can be carried forward without a request"""
+    previous_record = previous_record or {}
+    if not (previous_record.get("hash") and previous_record.get("unique_filename")
+            and previous_record.get("last_seen")) or previous_record.get("tombstoned_at"):
+        return False
+    lastmod = parse_sitemap_lastmod(doc.get("lastmod"))
+    last_seen = parse_sitemap_lastmod(previous_record["last_seen"])
+    return lastmod is not None and last_seen is not None and lastmod <= last_seen
+
+def feed_entry_updated(entry):
+    """ISO date an Atom entry / RSS item was last updated (None when undated)"""
+    for child in entry:
+        name = child.tag.rsplit('}', 1)[-1]
+        value = (child.text or "").strip()
+        if name in ("updated", "published", "date") and value:
+            return value
+        if name == "pubDate" and value:
+            try:
+                return email.utils.parsedate_to_datetime(value).isoformat()
+            except (TypeError, ValueError):
+                return None
+    return None
+
+def feed_entry_links(entry):
+    """Link URLs of an Atom entry (<link href>) or RSS item (<link>, <enclosure url>), in order"""
+    hrefs = []
+    for child in entry:
+        name = child.tag.rsplit('}', 1)[-1]
+        href = child.get("href") if name == "link" else child.get("url") if name == "enclosure" else None
+        if name == "link" and href is None:
+            href = (child.text or "").strip()  # RSS <link>text</link>
+        if href and href not in hrefs:
+            hrefs.append(href)
+    return hrefs
+
+def feed_state_blob(site_folder):
+    """Metadata blob holding a site's feed high-water mark and last full crawl time"""
+    return f"{FEED_STATE_PREFIX}/{site_folder}.json"
+
+def load_feed_state(site_folder, storage_account="stbtpuksprodcrawler01", container="crawl-metadata"):
+    """A site's saved feed state, or {} when there is none (or it cannot be read)"""
+    try:
+        content = read_metadata_blob(feed_state_blob(site_folder), storage_account, container)
+        return json.loads(content) if content else {}
+    except Exception as e:
+        logging.warning(f'Could not load feed state for {site_folder}: {str(e)}')
+        return {}
+
+def save_feed_state(site_folder, feed_state, storage_account="stbtpuksprodcrawler01", container="crawl-metadata"):
+    """Persist a site's feed state once its crawl is in the manifest"""
+    state = {key: feed_state.get(key) for key in ("mode", "high_water_mark", "last_full_crawl")}
+    state["saved_at"] = datetime.now(timezone.utc).isoformat()
+    return write_metadata_blob(feed_state_blob(site_folder), json.dumps(state).encode('utf-8'),
+                               storage_account=storage_account, container=container)
+
+def plan_feed_discovery(site_config, result, now=None):
+    """Choose feed-driven incremental or full discovery for a site with "feeds"
+    
+    An incremental crawl reads only the site's Atom/RSS feeds and collects items
+    updated since the saved high-water mark. A full crawl (the site's normal rules)
+    runs when there is no saved state or the last one is older than
+    full_crawl_interval_hours; its high-water mark is the crawl start, set back by
+    FEED_HIGH_WATER_OVERLAP.
+    
+    Args:
+        site_config: Website configuration ("feeds": feed URL templates, optional
+                     "full_crawl_interval_hours")
+        result: Crawl result - "feed_state" (the state to save once the crawl is
+                applied) is set in place
+    
+    Returns:
+        dict: Discovery rules for an incremental crawl, or None for the normal rules
+    """
+    if not site_config.get("feeds"):
+        return None
+    now = now or datetime.now(timezone.utc)
+    state = load_feed_state(get_site_folder(site_config["name"]))
+    last_full_crawl = parse_sitemap_lastmod(state.get("last_full_crawl"))
+    interval = timedelta(hours=float(site_config.get("full_crawl_interval_hours", FEED_FULL_CRAWL_INTERVAL_HOURS)))
+    if not state.get("high_water_mark") or last_full_crawl is None or now - last_full_crawl >= interval:
+        logging.info(f'Full crawl for {site_config["name"]} (feed fallback - last full crawl: '
+                     f'{state.get("last_full_crawl", "never")})')
+        result["feed_state"] = {"mode": "full", "last_full_crawl": now.isoformat(),
+                                "high_water_mark": (now - timedelta(seconds=FEED_HIGH_WATER_OVERLAP)).isoformat()}
+        return None
+    
+    logging.info(f'Incremental crawl for {site_config["name"]} - feed items updated after {state["high_water_mark"]}')
+    result["feed_state"] = {"mode": "incremental", "last_full_crawl": state["last_full_crawl"],
+                            "high_water_mark": state["high_water_mark"]}
+    feed = {"feed": True, "documents": True, "guidance": site_config.get("capture_html_guidance", False),
+            "required": True, "since": state["high_water_mark"],
+            "follow": [{"links": FEED_LINK_CLASS, "page": "feed", "limit": FEED_MAX_PAGES}]}
+    return {"seeds": [{"url": url, "page": "feed"} for url in site_config["feeds"]], "pages": {"feed": feed},
+            "max_depth": FEED_MAX_PAGES + 1}
+
+def advance_feed_high_water_mark(result, documents):
+    """Raise an incremental crawl's high-water mark to the newest feed item it collected"""
+    feed_state = result.get("feed_state")
+    if not feed_state or feed_state["mode"] != "incremental":
+        return
+    newest = parse_sitemap_lastmod(feed_state["high_water_mark"])
+    for doc in documents:
+        updated = parse_sitemap_lastmod(doc.get("lastmod"))
+        if updated is not None and (newest is None or updated > newest):
+            newest = updated
+            feed_state["high_water_mark"] = updated.isoformat()
+
+def is_incremental_crawl(result):
+    """True for feed-driven crawls, which cover only updated items - unseen URLs stay live"""
+    return (result.get("feed_state") or {}).get("mode") == "incremental"
+
+def discovery_skipped_work(discovery_stats):
+    """Work discovery skipped once budgets were met
+    
+    Returns:
+        dict: pages_cancelled (caps met), pages_over_max_pages and items_over_limit (links past max_items)
+    """
+    stats = discovery_stats or {}
+    return {
+        "pages_cancelled": stats.get("pages_cancelled", 0),
+        "pages_over_max_pages": stats.get("pages_skipped", 0),
+        "items_over_limit": sum(stats.get("items_over_limit", {}).values())
+    }
+
+def merge_skipped_work(skipped):
+    """Sum per-site discovery_skipped_work() results"""
+    totals = {"pages_cancelled": 0, "pages_over_max_pages": 0, "items_over_limit": 0}
+    for entry in skipped:
+        for key in totals:
+            totals[key] += (entry or {}).get(key, 0)
+    return totals
+
+# Default number of documents downloaded/uploaded in parallel per site
+# Override per site with "max_concurrent_documents" in websites.json
+DEFAULT_DOCUMENT_CONCURRENCY = 4
+
+def fetch_document_for_processing(doc, site_name, previous_record=None):
+    """Download (or capture) a single document and hash it - runs on pipeline worker threads
+    
+    If the previous crawl stored an ETag/Last-Modified for this URL (along with the
+    hash and blob name needed to carry the record forward), a conditional GET is sent.
+    
+    Args:
+        doc: Document dict with url and optional type ("html_guidance")
+        site_name: Source website name (used for HTML guidance capture)
+        previous_record: This URL's entry from the previous hash manifest (optional)
+    
+    Returns:
+        dict: Download/capture result, plus "hash" and a "body" file object when content was transferred
+    """
+    previous_record = previous_record or {}
+    etag, last_modified = None, None
+    if previous_record.get("hash") and previous_record.get("unique_filename"):
+        etag = previous_record.get("etag")
+        last_modified = previous_record.get("last_modified")
+    
+    if doc.get("type") == "html_guidance":
+        logging.info(f'Capturing HTML guidance from: {doc["url"]}')
+        download_result = capture_html_guidance(doc["url"], site_name, etag=etag, last_modified=last_modified)
+    else:
+        download_result = download_document(doc["url"], etag=etag, last_modified=last_modified, stream=True)
+    
+    download_result["conditional"] = bool(etag or last_modified)
+    if download_result["success"] and "content" in download_result:
+        # Captured HTML guidance is built in memory - wrap it so uploads see one body type
+        download_result["hash"] = calculate_content_hash(download_result["content"])
+        download_result["body"] = io.BytesIO(download_result.pop("content"))
+    return download_result
+
+@traced("process_documents")
+def process_documents(actual_documents, site_config, previous_hashes, result, seen_urls=None, checkpoint=None):
+    """Download, hash and upload documents through a bounded concurrent pipeline
+    
+    Downloads/captures and uploads for different documents overlap on worker
+    threads, while change detection, filename generation and collision detection
+    run on the calling thread in original document order - so counts,
+    current_hashes and collision suffixes are identical to a sequential run.
+    
+    Args:
+        actual_documents: Filtered documents to process - a list, or an iterator such as
+                          stream_site_documents() that is consumed while discovery runs
+        site_config: Website configuration (name, id, max_concurrent_documents)
+        previous_hashes: Previously stored document hashes for change detection
+        result: Crawl result dict - document counters and revalidation stats are updated in place
+        seen_urls: The crawl's URLSeenSet - each canonical URL is downloaded at most once
+        checkpoint: CrawlCheckpoint for this unit - documents it already holds are restored
+                    without fetching, and completed documents are recorded into it
+    
+    Returns:
+        tuple: (current_hashes dict, collision_count)
+    """
+    site_name = site_config["name"]
+    max_workers = max(1, int(site_config.get("max_concurrent_documents", DEFAULT_DOCUMENT_CONCURRENCY)))
+    window = max_workers * 2  # Documents held in memory at once (downloaded but not yet uploaded)
+    
+    # Download each canonical URL once per crawl
+    seen_urls = seen_urls if seen_urls is not None else URLSeenSet()
+    if isinstance(actual_documents, list):
+        actual_documents = [doc for doc in actual_documents if seen_urls.add(doc["url"], "download")]
+    else:
+        # Streamed discovery - dedupe lazily so documents enter the pipeline as they are found
+        actual_documents = (doc for doc in actual_documents if seen_urls.add(doc["url"], "download"))
+    
+    # Previous records are matched exactly, then by canonical URL (e.g. a link that
+    # gained a trailing slash or fragment keeps its hash, validators and blob name)
+    canonical_previous = None
+    
+    def find_previous_record(url):
+        nonlocal canonical_previous
+        record = previous_hashes.get(url)
+        if record is None and previous_hashes:
+            if canonical_previous is None:
+                canonical_previous = {}
+                for previous_url, previous in previous_hashes.items():
+                    canonical_previous.setdefault(canonicalize_url(previous_url), previous)
+            record = canonical_previous.get(canonicalize_url(url))
+        return record
+    
+    current_hashes = {}
+    filenames_generated = set()  # Phase 2: Collision detection tracking
+    collision_count = 0
+    total = len(actual_documents) if isinstance(actual_documents, list) else None  # None while streaming
+    revalidation = {"conditional_requests": 0, "not_modified": 0, "lastmod_skipped": 0, "bytes_saved": 0}
+    storage_delta = {}  # Blob count/byte changes for the storage statistics index
+    
+    def record_storage_change(url, unique_filename, size):
+        # Rewriting the URL's previous blob changes only its size; any other name is a new blob
+        previous_record = find_previous_record(url) or {}
+        if previous_record.get("unique_filename") == unique_filename:
+            add_storage_delta(storage_delta, unique_filename, 0, size - previous_record.get("size", 0))
+        else:
+            add_storage_delta(storage_delta, unique_filename, 1, size)
+    
+    # Documents finished by an interrupted earlier attempt keep their recorded hash and blob
+    if checkpoint is not None and checkpoint.records:
+        remaining = []
+        restored = 0
+        for doc in actual_documents:
+            record = checkpoint.records.get(doc["url"])
+            if record is None:
+                remaining.append(doc)
+                continue
+            current_hashes[doc["url"]] = record
+            filenames_generated.add(record["unique_filename"])
+            previous_hash = (find_previous_record(doc["url"]) or {}).get("hash")
+            if previous_hash is None:
+                result["documents_new"] += 1
+            elif previous_hash != record["hash"]:
+                result["documents_changed"] += 1
+            else:
+                result["documents_unchanged"] += 1
+            if previous_hash != record["hash"]:
+                # Uploaded by the interrupted attempt, whose result never reached the index
+                record_storage_change(doc["url"], record["unique_filename"], record.get("size", 0))
+            result["documents_processed"] += 1
+            restored += 1
+            checkpoint.recovered["documents_recovered"] += 1
+            checkpoint.recovered["bytes_recovered"] += record.get("size", 0)
+        if restored:
+            logging.info(f'♻️  Recovered {restored} documents from checkpoint for {site_name}')
+        actual_documents = remaining
+        total = len(actual_documents)
+    
+    logging.info(f'Processing {"streamed" if total is None else total} documents for {site_name} '
+                 f'with {max_workers} concurrent workers')
+    
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='doc-fetch') as fetch_pool, \
+         concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='doc-upload') as upload_pool:
         
-        # Phase 2: Collision detection tracking
-        filenames_generated = []
-        collision_count = 0
+        pending_fetches = collections.deque()
+        pending_uploads = collections.deque()
         
-        # Filter out non-document files (unknown extensions are likely HTML pages, not documents)
-        # BUT: Keep html_guidance type for sites with capture_html_guidance enabled
-        if site_config.get("capture_html_guidance", False):
-            # Keep all documents including HTML guidance
-            actual_documents = [doc for doc in all_documents if doc.get("extension") != "unknown" or doc.get("type") == "html_guidance"]
-            skipped_count = len(all_documents) - len(actual_documents)
-            html_guidance_count = len([doc for doc in actual_documents if doc.get("type") == "html_guidance"])
-            logging.info(f'Processing {len(actual_documents)} items (including {html_guidance_count} HTML guidance pages)')
-        else:
-            # Standard filtering - exclude unknown extensions
-            actual_documents = [doc for doc in all_documents if doc.get("extension") != "unknown"]
-            skipped_count = len(all_documents) - len(actual_documents)
-            
-            if skipped_count > 0:
-                logging.info(f'Filtered out {skipped_count} non-document links (unknown extension - likely HTML pages)')
-                logging.info(f'Processing {len(actual_documents)} actual document files')
+        def finish_upload(upload):
+            doc, unique_filename, status, future, body = upload
+            try:
+                storage_result = future.result()
+            except Exception as upload_error:
+                storage_result = {"success": False, "error": str(upload_error)}
+            finally:
+                body.close()
+            if storage_result["success"]:
+                result["documents_uploaded"] += 1
+                record_storage_change(doc["url"], unique_filename,
+                                      storage_result.get("size", current_hashes[doc["url"]].get("size", 0)))
+                if checkpoint is not None:
+                    checkpoint.record(doc["url"], current_hashes[doc["url"]])
+                logging.info(f'✅ Uploaded {unique_filename} (original: {doc["filename"]}) - Status: {status}')
+            else:
+                logging.error(f'❌ Upload failed for {doc["filename"]} - {storage_result.get("error", "Unknown")}')
         
-        # Process documents with change detection
-        for i, doc in enumerate(actual_documents):
+        def finish_fetch(index, doc, future):
+            nonlocal collision_count
+            download_result = {}
             try:
-                logging.info(f'Processing document {i+1}/{len(actual_documents)} - {doc["filename"]} ({doc.get("extension")})')
+                logging.info(f'Processing document {index+1}/{total or "?"} - {doc["filename"]} ({doc.get("extension")})')
+                download_result = future.result()
+                if download_result.get("conditional"):
+                    revalidation["conditional_requests"] += 1
                 
-                # Check if this is an HTML guidance page that needs special handling
-                if doc.get("type") == "html_guidance":
-                    logging.info(f'Capturing HTML guidance from: {doc["url"]}')
-                    download_result = capture_html_guidance(doc["url"], site_name)
-                    
-                    # If capture failed, skip this document
-                    if not download_result["success"]:
-                        logging.warning(f'Skipping {doc["url"]}: {download_result.get("error")}')
-                        continue
-                    
-                    # Use the generated filename from capture_html_guidance
-                    doc["filename"] = download_result["filename"]
-                    logging.info(f'Captured {download_result["text_length"]} chars of guidance content')
+                if download_result.get("not_modified"):
+                    # 304 (or sitemap lastmod) - carry the previous record forward without transferring the body
+                    previous_record = find_previous_record(doc["url"])
+                    doc["filename"] = previous_record.get("filename", doc["filename"])
+                    current_hash = previous_record["hash"]
+                    unique_filename = previous_record["unique_filename"]
+                    download_result["size"] = previous_record.get("size", 0)
+                    revalidation["bytes_saved"] += download_result["size"]
+                    if download_result.get("lastmod_skipped"):
+                        revalidation["lastmod_skipped"] += 1
+                        logging.info(f'Unchanged since last crawl (sitemap lastmod {doc["lastmod"]}): {doc["url"]}')
+                    else:
+                        revalidation["not_modified"] += 1
+                        logging.info(f'304 Not Modified: {doc["url"]}')
                 else:
-                    # Standard document download
-                    download_result = download_document(doc["url"])
-                
-                if download_result["success"]:
-                    current_hash = calculate_content_hash(download_result["content"])
-                    
-                    # Generate unique filename to prevent collisions
-                    unique_filename = generate_unique_filename(
-                        doc["url"],
-                        doc["filename"],
-                        site_name
-                    )
-                    
-                    # Phase 2: Detect filename collisions
-                    if unique_filename in filenames_generated:
-                        collision_count += 1
-                        logging.error(f'⚠️  COLLISION DETECTED: {unique_filename} generated twice!')
-                        logging.error(f'   URL1: {[k for k, v in current_hashes.items() if v.get("unique_filename") == unique_filename]}')
-                        logging.error(f'   URL2: {doc["url"]}')
-                        # Add collision suffix to prevent overwrite
-                        base, ext = unique_filename.rsplit('.', 1) if '.' in unique_filename else (unique_filename, 'pdf')
-                        unique_filename = f"{base}_collision_{collision_count}.{ext}"
-                        logging.info(f'   → Renamed to: {unique_filename}')
-                    
-                    filenames_generated.append(unique_filename)
-                    
-                    current_hashes[doc["url"]] = {
-                        "filename": doc["filename"],
-                        "unique_filename": unique_filename,
-                        "hash": current_hash,
-                        "last_seen": datetime.now(timezone.utc).isoformat()
-                    }
-                    
-                    # Determine document status
-                    previous_hash = previous_hashes.get(doc["url"], {}).get("hash")
+                    if doc.get("type") == "html_guidance":
+                        # If capture failed, skip this document
+                        if not download_result["success"]:
+                            logging.warning(f'Skipping {doc["url"]}: {download_result.get("error")}')
+                            return
+                        
+                        # Use the generated filename from capture_html_guidance
+                        doc["filename"] = download_result["filename"]
+                        logging.info(f'Captured {download_result["text_length"]} chars of guidance content')
                     
-                    if previous_hash is None:
-                        status = "new"
-                        result["documents_new"] += 1
-                        should_upload = True
-                    elif previous_hash != current_hash:
-                        status = "changed"
-                        result["documents_changed"] += 1
-                        should_upload = True
-                    else:
-                        status = "unchanged"
-                        result["documents_unchanged"] += 1
-                        should_upload = False
+                    if not download_result["success"]:
+                        logging.error(f'Download failed for {doc["filename"]} - {download_result["error"]}')
+                        return
                     
-                    result["documents_processed"] += 1
+                    current_hash = download_result["hash"]
                     
-                    # Upload if new or changed
-                    if should_upload:
-                        # Prepare metadata for AI search and filtering
-                        blob_metadata = {
-                            "documenttype": doc.get("type", "unknown"),
-                            "originalfilename": doc["filename"],
-                            "status": status,
-                            "documenturl": doc["url"]
-                        }
-                        
-                        storage_result = upload_to_blob_storage_real(
-                            content=download_result["content"],
-                            filename=unique_filename,  # Includes folder prefix
-                            website_id=site_config.get("id"),
-                            website_name=site_name,
-                            metadata=blob_metadata
-                        )
-                        if storage_result["success"]:
-                            result["documents_uploaded"] += 1
-                            logging.info(f'✅ Uploaded {unique_filename} (original: {doc["filename"]}) - Status: {status}')
-                        else:
-                            logging.error(f'❌ Upload failed for {doc["filename"]} - {storage_result.get("error", "Unknown")}')
-                    else:
-                        logging.info(f'⏭️  Skipped upload for {doc["filename"]} - Status: {status}')
-                        
+                    # Keep the stored blob name for a known URL, else generate a unique one
+                    unique_filename = ((find_previous_record(doc["url"]) or {}).get("unique_filename")
+                                       or generate_unique_filename(doc["url"], doc["filename"], site_name))
+                
+                # Phase 2: Detect filename collisions
+                if unique_filename in filenames_generated:
+                    collision_count += 1
+                    logging.error(f'⚠️  COLLISION DETECTED: {unique_filename} generated twice!')
+                    logging.error(f'   URL1: {[k for k, v in current_hashes.items() if v.get("unique_filename") == unique_filename]}')
+                    logging.error(f'   URL2: {doc["url"]}')
+                    # Add collision suffix to prevent overwrite
+                    base, ext = unique_filename.rsplit('.', 1) if '.' in unique_filename else (unique_filename, 'pdf')
+                    unique_filename = f"{base}_collision_{collision_count}.{ext}"
+                    logging.info(f'   → Renamed to: {unique_filename}')
+                
+                filenames_generated.add(unique_filename)
+                
+                current_hashes[doc["url"]] = {
+                    "filename": doc["filename"],
+                    "unique_filename": unique_filename,
+                    "hash": current_hash,
+                    "last_seen": datetime.now(timezone.utc).isoformat(),
+                    "size": download_result.get("size", 0),
+                    "etag": download_result.get("etag"),
+                    "last_modified": download_result.get("last_modified")
+                }
+                
+                # Determine document status
+                previous_hash = (find_previous_record(doc["url"]) or {}).get("hash")
+                
+                if previous_hash is None:
+                    status = "new"
+                    result["documents_new"] += 1
+                elif previous_hash != current_hash:
+                    status = "changed"
+                    result["documents_changed"] += 1
                 else:
-                    logging.error(f'Download failed for {doc["filename"]} - {download_result["error"]}')
+                    status = "unchanged"
+                    result["documents_unchanged"] += 1
+                
+                result["documents_processed"] += 1
+                
+                if status == "unchanged":
+                    if checkpoint is not None:
+                        checkpoint.record(doc["url"], current_hashes[doc["url"]])
+                    logging.info(f'⏭️  Skipped upload for {doc["filename"]} - Status: {status}')
+                    return
+                
+                # Upload if new or changed - prepare metadata for AI search and filtering
+                blob_metadata = {
+                    "documenttype": doc.get("type", "unknown"),
+                    "originalfilename": doc["filename"],
+                    "status": status,
+                    "documenturl": doc["url"]
+                }
+                body = download_result.pop("body")  # Ownership passes to the upload stage
+                upload_future = submit_traced(
+                    upload_pool,
+                    upload_to_blob_storage_real,
+                    content=body,
+                    filename=unique_filename,  # Includes folder prefix
+                    website_id=site_config.get("id"),
+                    website_name=site_name,
+                    metadata=blob_metadata
+                )
+                pending_uploads.append((doc, unique_filename, status, upload_future, body))
+                
+                # Keep the number of documents waiting on upload bounded
+                while len(pending_uploads) > window:
+                    finish_upload(pending_uploads.popleft())
                     
             except Exception as doc_error:
                 logging.error(f'Error processing document {doc["filename"]}: {str(doc_error)}')
+            finally:
+                # Release spooled bodies that are not being uploaded (unchanged, failed)
+                if download_result.get("body") is not None:
+                    download_result["body"].close()
+        
+        for index, doc in enumerate(actual_documents):
+            previous_record = find_previous_record(doc["url"])
+            if unchanged_since_last_seen(doc, previous_record):
+                # Sitemap says unchanged since it was last seen - no request at all
+                fetch_future = concurrent.futures.Future()
+                fetch_future.set_result({"success": True, "not_modified": True, "lastmod_skipped": True,
+                                         "etag": previous_record.get("etag"),
+                                         "last_modified": previous_record.get("last_modified")})
+            else:
+                fetch_future = submit_traced(fetch_pool, fetch_document_for_processing, doc, site_name, previous_record)
+            pending_fetches.append((index, doc, fetch_future))
+            if len(pending_fetches) >= window:
+                finish_fetch(*pending_fetches.popleft())
+        
+        while pending_fetches:
+            finish_fetch(*pending_fetches.popleft())
+        while pending_uploads:
+            finish_upload(pending_uploads.popleft())
+    
+    if checkpoint is not None:
+        checkpoint.save()
+        result["checkpoint"] = dict(checkpoint.recovered)
+    
+    # Conditional GET effectiveness for this site
+    revalidation["not_modified_rate_percent"] = (
+        round(revalidation["not_modified"] / revalidation["conditional_requests"] * 100, 2)
+        if revalidation["conditional_requests"] else 0
+    )
+    result["revalidation"] = revalidation
+    result["storage_delta"] = storage_delta
+    
+    return current_hashes, collision_count
+
+# Document counters carried by every crawl / discovery / batch result
+CRAWL_RESULT_COUNTERS = ("documents_found", "documents_processed", "documents_new",
+                         "documents_changed", "documents_unchanged", "documents_uploaded")
+
+def new_crawl_result(site_config):
+    """Empty crawl result for a site - counters at zero, status unknown"""
+    result = {
+        "site_name": site_config["name"],
+        "site_url": site_config["url"],
+        "status": "unknown"
+    }
+    result.update((counter, 0) for counter in CRAWL_RESULT_COUNTERS)
+    result["current_hashes"] = {}
+    result["error"] = None
+    return result
+
+def is_processable_document(site_config, doc):
+    """False for links that are not documents (unknown extensions are likely HTML pages),
+    except captured HTML guidance on sites with capture_html_guidance enabled"""
+    if doc.get("extension") != "unknown":
+        return True
+    return site_config.get("capture_html_guidance", False) and doc.get("type") == "html_guidance"
+
+def prepare_site_discovery(site_config):
+    """Per-site setup before discovery: storage folder, politeness budget and link rules
+    
+    Returns:
+        URLClassifier: The site's compiled link rules
+    """
+    logging.info(f'Crawling site: {site_config["name"]} ({site_config["url"]})')
+    
+    # Ensure website folder exists in storage (automatic folder creation)
+    ensure_website_folder_exists(site_config["name"])
+    
+    # Be respectful - register this site's per-host request budget (shared across concurrent fetches)
+    HOST_RATE_LIMITER.configure(
+        site_config["url"],
+        site_config.get("requests_per_second", DEFAULT_REQUESTS_PER_SECOND),
+        site_config.get("burst", DEFAULT_REQUEST_BURST)
+    )
+    
+    # Link rules for this site, compiled once and shared by every page parsed
+    return get_url_classifier(site_config)
+
+def discover_site_documents(site_config, result, seen_urls, checkpoint=None):
+    """Run a site's frontier discovery and filter the results down to processable documents
+    
+    Args:
+        site_config: Website configuration
+        result: Crawl result dict - documents_found, discovery stats and (when nothing
+                is left to process) status/error are set in place
+        seen_urls: The crawl's URLSeenSet, shared with the processing stage
+        checkpoint: CrawlCheckpoint for the discovery unit - a discovery finished by an
+                    earlier attempt is reused instead of fetching the site again
+    
+    Returns:
+        list: Documents to process, or None if the site was blocked or had no documents
+    """
+    site_name = site_config["name"]
+    url_classifier = prepare_site_discovery(site_config)
+    feed_rules = plan_feed_discovery(site_config, result)
+    
+    # Breadth-first discovery over the site's frontier rules (websites.json "discovery",
+    # or rules derived from sitemaps / capture_html_guidance / CPS A-Z / multi_level)
+    if checkpoint is not None and checkpoint.discovery:
+        discovery = checkpoint.discovery
+        checkpoint.recovered["pages_recovered"] += discovery["stats"].get("pages_fetched", 0)
+        logging.info(f'♻️  Reusing checkpointed discovery for {site_name}')
+    else:
+        frontier = FrontierCrawler(site_config, url_classifier, rules=feed_rules, seen=seen_urls)
+        try:
+            discovery = frontier.run()
+        except urllib.error.HTTPError as e:
+            if e.code == 403:
+                logging.warning(f'Site {site_name} blocked (403) - anti-bot protection')
+                result["status"] = "blocked"
+                result["error"] = "HTTP 403 - Anti-bot protection"
+                return None
+            else:
+                raise
+        if checkpoint is not None and discovery["documents"]:
+            checkpoint.save_discovery(discovery["documents"], discovery["stats"])
+    
+    all_documents = discovery["documents"]
+    result["discovery"] = discovery["stats"]
+    result["discovery_skipped"] = discovery_skipped_work(discovery["stats"])
+    guidance_count = sum(1 for doc in all_documents if doc.get("type") == "html_guidance")
+    logging.info(f'Discovered {len(all_documents)} items on {site_name} ({guidance_count} HTML guidance pages) '
+                 f'from {discovery["stats"]["pages_fetched"]} pages')
+    
+    result["documents_found"] = len(all_documents)
+    advance_feed_high_water_mark(result, all_documents)
+    
+    if not all_documents:
+        if is_incremental_crawl(result):
+            return []  # Nothing updated since the last crawl
+        result["status"] = "no_documents"
+        return None
+    
+    # Filter out non-document files - but keep html_guidance for sites with capture_html_guidance enabled
+    actual_documents = [doc for doc in all_documents if is_processable_document(site_config, doc)]
+    skipped_count = len(all_documents) - len(actual_documents)
+    if skipped_count > 0:
+        logging.info(f'Filtered out {skipped_count} non-document links (unknown extension - likely HTML pages)')
+    logging.info(f'Processing {len(actual_documents)} items')
+    
+    return actual_documents
+
+def stream_site_documents(site_config, result, seen_urls):
+    """Discover a site's documents, yielding each processable one as soon as its page is parsed
+    
+    Lets process_documents download and upload while discovery is still fetching index
+    pages (e.g. the CPS A-Z pages) instead of waiting for the whole frontier.
+    documents_found and discovery stats are set on result once the stream is exhausted.
+    
+    Raises:
+        urllib.error.HTTPError: 403 or other failures of required pages (the start page)
+    """
+    url_classifier = prepare_site_discovery(site_config)
+    frontier = FrontierCrawler(site_config, url_classifier, rules=plan_feed_discovery(site_config, result), seen=seen_urls)
+    guidance_count = 0
+    for doc in frontier.stream():
+        result["documents_found"] += 1
+        guidance_count += doc.get("type") == "html_guidance"
+        advance_feed_high_water_mark(result, [doc])
+        if is_processable_document(site_config, doc):
+            yield doc
+    
+    result["discovery"] = frontier.stats
+    result["discovery_skipped"] = discovery_skipped_work(frontier.stats)
+    logging.info(f'Discovered {result["documents_found"]} items on {site_config["name"]} ({guidance_count} HTML '
+                 f'guidance pages) from {frontier.stats["pages_fetched"]} pages')
+
+def crawl_website_core(site_config, previous_hashes=None):
+    """Core website crawling logic extracted for reusability
+    
+    Args:
+        site_config (dict): Website configuration with url, name, multi_level settings
+        previous_hashes (dict): Previously stored document hashes for change detection
+    
+    Returns:
+        dict: Crawl results including documents found, processed, new, changed, uploaded,
+              and "trace" - timing spans aggregated per phase
+    """
+    site_url = site_config["url"]
+    site_name = site_config["name"]
+    
+    result = new_crawl_result(site_config)
+    
+    # Per-phase timing for this crawl (joining the caller's trace if one is active) -
+    # spans from pipeline threads land here too
+    trace = ACTIVE_TRACE.get() or CrawlTrace()
+    trace_token = ACTIVE_TRACE.set(trace)
+    crawl_start = time.perf_counter()
+    
+    try:
+        # One seen-set per crawl: discovery pages, collected documents and downloads
+        # are deduplicated on canonical URLs
+        seen_urls = URLSeenSet()
+        
+        # Use provided hashes or load this site's manifest shards
+        if previous_hashes is None:
+            with trace_span("manifest_load"):
+                previous_hashes = load_site_document_hashes(get_site_folder(site_name))
+        
+        # Discovery streams into the processing pipeline (bounded, concurrent) - documents
+        # from the first pages download while later index pages are still being fetched
+        try:
+            current_hashes, collision_count = process_documents(
+                stream_site_documents(site_config, result, seen_urls), site_config, previous_hashes, result,
+                seen_urls=seen_urls
+            )
+        except urllib.error.HTTPError as e:
+            if e.code != 403:
+                raise
+            logging.warning(f'Site {site_name} blocked (403) - anti-bot protection')
+            result["status"] = "blocked"
+            result["error"] = "HTTP 403 - Anti-bot protection"
+            return result
+        
+        if result["documents_found"] == 0 and not is_incremental_crawl(result):
+            result["status"] = "no_documents"
+            return result
         
         result["current_hashes"] = current_hashes
         result["collision_count"] = collision_count  # Phase 2: Track collisions
+        result["http_pool"] = get_http_pool_stats(site_url)  # Connection reuse for this site's host
+        result["token_cache"] = get_token_cache_stats()  # Managed identity token hits/misses
+        result["rate_limit"] = HOST_RATE_LIMITER.get_stats(site_url)  # Politeness waits/throttling for this host
+        result["duplicates_avoided"] = seen_urls.get_stats()  # Canonical-URL duplicates not fetched/processed
         result["status"] = "success"
         
         # Phase 2: Log collision summary
@@ -1372,7 +3577,98 @@ def crawl_website_core(site_config, previous_hashes=None):
         logging.error(f'Error crawling site {site_name}: {str(site_error)}')
         result["status"] = "error"
         result["error"] = str(site_error)
+    finally:
+        trace.add("crawl", time.perf_counter() - crawl_start)
+        result["trace"] = trace.to_dict()  # {phase: {count, total_seconds, max_seconds}}
+        ACTIVE_TRACE.reset(trace_token)
+    
+    return result
+
+# Documents per process_document_batch_activity when the orchestrator fans a site out
+# Override per site with "document_batch_size" in websites.json
+DOCUMENT_BATCH_SIZE = int(os.environ.get('DOCUMENT_BATCH_SIZE', '50'))
+
+def split_document_batches(documents, batch_size=None):
+    """Split a site's discovered documents into batches for the orchestrator fan-out
+    
+    Args:
+        documents: Documents returned by discover_website_activity
+        batch_size: Documents per batch (defaults to DOCUMENT_BATCH_SIZE)
+    
+    Returns:
+        list: Lists of documents, in discovery order
+    """
+    batch_size = max(1, int(batch_size or DOCUMENT_BATCH_SIZE))
+    return [documents[start:start + batch_size] for start in range(0, len(documents), batch_size)]
+
+def merge_document_batch_results(discovery_result, batch_results):
+    """Fold a site's discovery result and its document batch results into one crawl result
     
+    The merged result has the same shape as crawl_single_website_activity's output, so
+    the orchestrator aggregates fanned-out and single-activity sites the same way. The
+    site's hash delta is only complete (removing unseen URLs and refreshing last_seen)
+    when discovery and every batch succeeded.
+    
+    Args:
+        discovery_result: Output of discover_website_activity for the site
+        batch_results: Outputs of process_document_batch_activity, in batch order
+    
+    Returns:
+        dict: Crawl result with summed counters, merged revalidation/trace and hash_delta
+    """
+    result = {key: value for key, value in discovery_result.items() if key != "documents"}
+    discovery_delta = result.get("hash_delta") or {}
+    
+    revalidation = {"conditional_requests": 0, "not_modified": 0, "lastmod_skipped": 0, "bytes_saved": 0}
+    collision_count = 0
+    errors = []
+    for batch in batch_results:
+        for counter in CRAWL_RESULT_COUNTERS[1:]:  # documents_found comes from discovery
+            result[counter] = result.get(counter, 0) + batch.get(counter, 0)
+        for key in revalidation:
+            revalidation[key] += batch.get("revalidation", {}).get(key, 0)
+        collision_count += batch.get("collision_count", 0)
+        if batch.get("status") != "success":
+            errors.append(f'batch {batch.get("batch_index")}: {batch.get("error")}')
+    
+    if result.get("status") == "discovered":
+        result["status"] = "error" if errors else "success"
+        result["error"] = "; ".join(errors) or None
+    revalidation["not_modified_rate_percent"] = (
+        round(revalidation["not_modified"] / revalidation["conditional_requests"] * 100, 2)
+        if revalidation["conditional_requests"] else 0
+    )
+    result["revalidation"] = revalidation
+    result["collision_count"] = collision_count
+    result["batches"] = len(batch_results)
+    result["storage_delta"] = merge_storage_deltas(batch.get("storage_delta") for batch in batch_results)
+    result["checkpoint"] = merge_recovered_work(
+        [discovery_result.get("checkpoint")] + [batch.get("checkpoint") for batch in batch_results]
+    )
+    result["trace"] = merge_trace_phases([discovery_result.get("trace")] + [batch.get("trace") for batch in batch_results])
+    
+    # Unique blob names are URL-hashed per document, so batch upserts never overlap
+    complete = result["status"] == "success"
+    upserts = {}
+    removed = list(discovery_delta.get("removed", [])) if complete else []
+    for batch in batch_results:
+        batch_delta = batch.get("hash_delta") or {}
+        upserts.update(batch_delta.get("upserts", {}))
+        if complete:
+            removed.extend(batch_delta.get("removed", []))
+    result["hash_delta"] = {
+        "site_folder": discovery_delta.get("site_folder", get_site_folder(result["site_name"])),
+        "base_version": discovery_delta.get("base_version"),
+        "crawled_at": discovery_delta.get("crawled_at"),
+        "complete": complete,
+        "incremental": discovery_delta.get("incremental", False),
+        "feed_state": discovery_delta.get("feed_state"),
+        "upserts": upserts,
+        "removed": sorted(removed),
+        "retained": sum((batch.get("hash_delta") or {}).get("retained", 0) for batch in batch_results),
+        # Checkpoints to delete once this delta is in the manifest
+        "checkpoint_units": ["discovery"] + [f'batch-{batch.get("batch_index")}' for batch in batch_results]
+    }
     return result
 
 def validate_storage_consistency(uploaded_count, storage_account="stbtpuksprodcrawler01", container="documents"):
@@ -1389,8 +3685,8 @@ def validate_storage_consistency(uploaded_count, storage_account="stbtpuksprodcr
     try:
         logging.info(f'📊 Phase 2: Validating storage consistency...')
         
-        # Get actual storage count
-        storage_stats = get_storage_statistics(storage_account, container)
+        # Get actual storage count from the statistics index (relisted once it is due for reconciliation)
+        storage_stats = get_indexed_storage_statistics(storage_account, container)
         actual_count = storage_stats.get("total_documents", 0)
         
         # Calculate validation metrics
@@ -1426,33 +3722,139 @@ def validate_storage_consistency(uploaded_count, storage_account="stbtpuksprodcr
             "match": False
         }
 
-def store_document_hashes_to_storage(hash_data, storage_account="stbtpuksprodcrawler01", container="crawl-metadata"):
-    """Store document hashes to Azure Storage for change detection - using crawl-metadata container"""
+def seed_legacy_document_hash_shards(skip_folders, now, storage_account="stbtpuksprodcrawler01",
+                                     container="crawl-metadata"):
+    """Write the pre-sharding manifest's records out as shards, for the first sharded write
+    
+    Once the index exists document-hashes.json is no longer read, so every folder
+    the first write does not cover has to be carried over or its records are lost.
+    
+    Args:
+        skip_folders: Site folders the caller is writing itself
+        now: Timestamp recorded on the new index entries
+    
+    Returns:
+        dict: Shard name -> index entry for the shards written, or None if a write failed
+    """
+    grouped = {}
+    for url, record in load_legacy_document_hashes(storage_account, container).items():
+        shard_name = manifest_shard_name(url, record)
+        if manifest_shard_folder(shard_name) not in skip_folders:
+            grouped.setdefault(shard_name, {})[url] = record
+    
+    entries = {}
+    for shard_name, records in grouped.items():
+        content = encode_manifest_shard(records)
+        if not write_metadata_blob(manifest_shard_blob(shard_name), content, "application/gzip",
+                                   storage_account, container):
+            logging.error(f'Failed to migrate legacy hash shard {shard_name}')
+            return None
+        entries[shard_name] = {
+            "count": len(records),
+            "fingerprint": manifest_fingerprint(records),
+            "bytes": len(content),
+            "updated": now.isoformat()
+        }
+    if entries:
+        logging.info(f'Migrated {sum(e["count"] for e in entries.values())} legacy document hashes '
+                     f'into {len(entries)} shards')
+    return entries
+
+def store_document_hashes_to_storage(hash_data, storage_account="stbtpuksprodcrawler01", container="crawl-metadata",
+                                     folders=None):
+    """Store document hashes to Azure Storage for change detection - using crawl-metadata container
+    
+    Records are grouped into shards (see manifest_shard_name) and only shards whose
+    records changed - or whose last write is older than MANIFEST_LAST_SEEN_REFRESH -
+    are rewritten. Shards of other site folders are left untouched; shards of a
+    folder present in hash_data (or listed in folders) that no longer hold records are removed.
+    
+    The index is rewritten with If-Match, so concurrent writers (timer crawls,
+    orchestrations, search_site) never drop each other's shard entries - on a
+    conflict it is re-read and this call's shard changes are applied again. The
+    first sharded write also migrates the other folders' legacy records.
+    
+    Args:
+        hash_data: URL -> hash record for the crawled sites
+        folders: Site folders whose full state hash_data represents, even if it holds no records for them
+    
+    Returns:
+        bool: Success status
+    """
     try:
-        access_token = get_managed_identity_token()
-        if not access_token:
-            logging.error('Failed to get access token for hash storage')
-            return False
+        grouped = {}
+        for url, record in hash_data.items():
+            grouped.setdefault(manifest_shard_name(url, record), {})[url] = record
+        crawled_folders = {manifest_shard_folder(name) for name in grouped} | set(folders or [])
+        
+        now = datetime.now(timezone.utc)
+        written_entries = {}  # Shards written by this call - kept across conflict retries
+        seeded = None  # Legacy shards migrated by this call, written at most once
+        for attempt in range(MANIFEST_INDEX_WRITE_ATTEMPTS):
+            index, etag = load_manifest_index_with_etag(storage_account, container)
+            if index is None:
+                # Not sharded yet - carry over the folders this write does not cover
+                if seeded is None:
+                    seeded = seed_legacy_document_hash_shards(crawled_folders, now, storage_account, container)
+                    if seeded is None:
+                        return False
+                index = {"version": 2, "shards": dict(seeded)}
+            shards = index.setdefault("shards", {})
             
-        filename = "document-hashes.json"
-        content = json.dumps(hash_data, indent=2).encode('utf-8')
-        
-        url = f"https://{storage_account}.blob.core.windows.net/{container}/{filename}"
-        
-        req = urllib.request.Request(url, data=content, method='PUT')
-        req.add_header('Authorization', f'Bearer {access_token}')
-        req.add_header('x-ms-version', '2020-04-08')
-        req.add_header('x-ms-blob-type', 'BlockBlob')
-        req.add_header('Content-Type', 'application/json')
-        req.add_header('Content-Length', str(len(content)))
+            unchanged = 0
+            for shard_name, records in grouped.items():
+                if shard_name in written_entries:
+                    shards[shard_name] = written_entries[shard_name]
+                    continue
+                fingerprint = manifest_fingerprint(records)
+                entry = shards.get(shard_name)
+                if entry and entry.get("fingerprint") == fingerprint:
+                    age = (now - datetime.fromisoformat(entry["updated"])).total_seconds()
+                    if age < MANIFEST_LAST_SEEN_REFRESH:
+                        unchanged += 1
+                        continue
+                
+                content = encode_manifest_shard(records)
+                if not write_metadata_blob(manifest_shard_blob(shard_name), content, "application/gzip",
+                                           storage_account, container):
+                    logging.error(f'Failed to store hash shard {shard_name}')
+                    return False
+                written_entries[shard_name] = shards[shard_name] = {
+                    "count": len(records),
+                    "fingerprint": fingerprint,
+                    "bytes": len(content),
+                    "updated": now.isoformat()
+                }
+            
+            # Shards of crawled folders that no longer hold any records (e.g. prefix length changed)
+            stale = [name for name in shards if manifest_shard_folder(name) in crawled_folders and name not in grouped]
+            for shard_name in stale:
+                del shards[shard_name]
+            
+            if written_entries or stale or (etag is None and seeded):
+                index["updated"] = now.isoformat()
+                index_content = json.dumps(index, separators=(',', ':'), sort_keys=True).encode('utf-8')
+                try:
+                    if not write_metadata_blob(MANIFEST_INDEX_NAME, index_content, "application/json",
+                                               storage_account, container, if_match=etag,
+                                               if_none_match=None if etag else "*"):
+                        logging.error('Failed to store hash manifest index')
+                        return False
+                except urllib.error.HTTPError as e:
+                    if e.code not in (409, 412):
+                        raise
+                    logging.info(f'Hash manifest index changed concurrently, retrying (attempt {attempt + 1})')
+                    continue
+                # Unlisted now - safe to delete
+                for shard_name in stale:
+                    delete_metadata_blob(manifest_shard_blob(shard_name), storage_account, container)
+            
+            logging.info(f'Stored {len(hash_data)} document hashes: {len(written_entries)} shards written, '
+                        f'{unchanged} unchanged, {len(stale)} removed')
+            return True
         
-        with urllib.request.urlopen(req, timeout=30) as response:
-            if response.status == 201:
-                logging.info(f'Successfully stored {len(hash_data)} document hashes to {container}/{filename}')
-                return True
-            else:
-                logging.error(f'Failed to store hashes: HTTP {response.status}')
-                return False
+        logging.error('❌ Gave up storing the hash manifest index after repeated write conflicts')
+        return False
                 
     except urllib.error.HTTPError as e:
         logging.error(f'HTTP error storing document hashes: {e.code} {e.reason}')
@@ -1461,6 +3863,89 @@ def store_document_hashes_to_storage(hash_data, storage_account="stbtpuksprodcra
         logging.error(f'Error storing document hashes: {str(e)}')
         return False
 
+def merge_document_hashes_to_storage(hash_data, storage_account="stbtpuksprodcrawler01", container="crawl-metadata"):
+    """Upsert hash records into the manifest, leaving every other stored URL in place
+    
+    Used by callers that only hold the records they just produced (search_site,
+    store_document_hashes_activity) - unlike store_document_hashes_to_storage, the
+    sites' other records are not dropped.
+    
+    Args:
+        hash_data: URL -> hash record to add or replace
+    
+    Returns:
+        bool: Success status
+    """
+    grouped = {}
+    for url, record in hash_data.items():
+        grouped.setdefault(manifest_shard_folder(manifest_shard_name(url, record)), {})[url] = record
+    deltas = [compute_hash_delta(folder, {}, records, complete=False) for folder, records in grouped.items()]
+    return apply_document_hash_deltas(deltas, storage_account, container)
+
+# Blobs per List Blobs page (the service maximum is 5000)
+BLOB_LIST_PAGE_SIZE = int(os.environ.get('BLOB_LIST_PAGE_SIZE', '5000'))
+
+def iter_blobs(storage_account="stbtpuksprodcrawler01", container="documents", prefix=None, delimiter=None,
+               page_size=None, access_token=None):
+    """Stream a container's blob listing, following NextMarker across pages
+    
+    Each page is parsed incrementally (iterparse) straight off the response and
+    parsed elements are discarded, so memory is bounded by one page however many
+    blobs the container holds.
+    
+    Args:
+        prefix: Only list blob names starting with this (e.g. a site folder + "/")
+        delimiter: Hierarchy delimiter - names containing it after the prefix are
+                   rolled up into virtual directories and not yielded
+        page_size: maxresults per request (defaults to BLOB_LIST_PAGE_SIZE)
+        access_token: Storage token (fetched when not given)
+    
+    Yields:
+        dict: name, size, last_modified, etag and content_type of each blob
+    
+    Raises:
+        RuntimeError: If no access token is available; urllib/ParseError for failed pages
+    """
+    access_token = access_token or get_managed_identity_token()
+    if not access_token:
+        raise RuntimeError('Failed to get access token')
+    
+    marker = None
+    while True:
+        params = {"restype": "container", "comp": "list", "maxresults": str(page_size or BLOB_LIST_PAGE_SIZE)}
+        if prefix:
+            params["prefix"] = prefix
+        if delimiter:
+            params["delimiter"] = delimiter
+        if marker:
+            params["marker"] = marker
+        
+        req = urllib.request.Request(f"{blob_service_url(storage_account)}/{container}?{urllib.parse.urlencode(params)}",
+                                     method='GET')
+        req.add_header('Authorization', f'Bearer {access_token}')
+        req.add_header('x-ms-version', '2020-04-08')
+        
+        marker = None
+        with pooled_urlopen(req, timeout=60) as response:
+            for _, elem in ET.iterparse(response, events=("end",)):
+                if elem.tag == "Blob":
+                    properties = elem.find("Properties")
+                    size = properties.findtext("Content-Length", "") if properties is not None else ""
+                    yield {
+                        "name": elem.findtext("Name", ""),
+                        "size": int(size) if size.isdigit() else 0,
+                        "last_modified": properties.findtext("Last-Modified") if properties is not None else None,
+                        "etag": properties.findtext("Etag") if properties is not None else None,
+                        "content_type": properties.findtext("Content-Type") if properties is not None else None
+                    }
+                    elem.clear()
+                elif elem.tag == "BlobPrefix":
+                    elem.clear()
+                elif elem.tag == "NextMarker":
+                    marker = elem.text or None
+        if not marker:
+            return
+
 def delete_uncategorized_documents(storage_account="stbtpuksprodcrawler01", container="documents", dry_run=True):
     """Delete documents that don't have a folder prefix (uncategorized documents)
     
@@ -1478,42 +3963,23 @@ def delete_uncategorized_documents(storage_account="stbtpuksprodcrawler01", cont
             logging.error('Failed to get access token for cleanup')
             return {"error": "Authentication failed"}
         
-        # List all blobs in the container
-        list_url = f"https://{storage_account}.blob.core.windows.net/{container}?restype=container&comp=list"
-        
-        req = urllib.request.Request(list_url, method='GET')
-        req.add_header('Authorization', f'Bearer {access_token}')
-        req.add_header('x-ms-version', '2021-06-08')
-        
-        with urllib.request.urlopen(req, timeout=30) as response:
-            xml_data = response.read().decode('utf-8')
-        
-        # Parse XML response
-        import xml.etree.ElementTree as ET
-        root = ET.fromstring(xml_data)
-        
         uncategorized_files = []
         system_files = ['document_hashes.json', 'crawl_history.json']
         
-        # Find all blobs without folder prefix
-        for blob in root.findall('.//Blob'):
-            name_elem = blob.find('Name')
-            if name_elem is not None:
-                name = name_elem.text or ""
-                
-                # Skip system files and folder placeholders
-                if name in system_files or name.endswith('/.folder'):
-                    continue
-                
-                # Check if document has no folder prefix
-                if '/' not in name:
-                    size_elem = blob.find('Properties/Content-Length')
-                    size = int(size_elem.text) if size_elem is not None and size_elem.text else 0
-                    uncategorized_files.append({
-                        "name": name,
-                        "size": size,
-                        "size_mb": round(size / (1024 * 1024), 2)
-                    })
+        # Documents without a folder prefix are exactly the container's top-level blobs -
+        # a delimiter listing skips everything inside site folders
+        for blob in iter_blobs(storage_account, container, delimiter='/', access_token=access_token):
+            name = blob["name"]
+            
+            # Skip system files
+            if not name or name in system_files:
+                continue
+            
+            uncategorized_files.append({
+                "name": name,
+                "size": blob["size"],
+                "size_mb": round(blob["size"] / (1024 * 1024), 2)
+            })
         
         if not uncategorized_files:
             return {
@@ -1541,13 +4007,13 @@ def delete_uncategorized_documents(storage_account="stbtpuksprodcrawler01", cont
         # Actually delete the files
         for file_info in uncategorized_files:
             try:
-                blob_url = f"https://{storage_account}.blob.core.windows.net/{container}/{file_info['name']}"
+                blob_url = f"{blob_service_url(storage_account)}/{container}/{file_info['name']}"
                 
                 del_req = urllib.request.Request(blob_url, method='DELETE')
                 del_req.add_header('Authorization', f'Bearer {access_token}')
                 del_req.add_header('x-ms-version', '2021-06-08')
                 
-                with urllib.request.urlopen(del_req, timeout=30) as response:
+                with pooled_urlopen(del_req, timeout=30) as response:
                     if response.status == 202:
                         deleted_files.append(file_info)
                         logging.info(f'✅ Deleted uncategorized file: {file_info["name"]}')
@@ -1565,6 +4031,12 @@ def delete_uncategorized_documents(storage_account="stbtpuksprodcrawler01", cont
                 })
                 logging.error(f'❌ Error deleting {file_info["name"]}: {str(del_error)}')
         
+        if deleted_files:
+            storage_delta = {}
+            for file_info in deleted_files:
+                add_storage_delta(storage_delta, file_info["name"], -1, -file_info["size"], written=False)
+            apply_storage_stats_delta(storage_delta)
+        
         return {
             "message": f"Deleted {len(deleted_files)} uncategorized documents",
             "deleted_count": len(deleted_files),
@@ -1580,103 +4052,125 @@ def delete_uncategorized_documents(storage_account="stbtpuksprodcrawler01", cont
         logging.error(f'Error in cleanup operation: {str(e)}')
         return {"error": str(e)}
 
-def get_storage_statistics(storage_account="stbtpuksprodcrawler01", container="documents"):
-    """Analyze Azure Storage to get document statistics per website"""
+SYSTEM_BLOB_NAMES = ('document_hashes.json', 'crawl_history.json')
+UNCATEGORIZED_FOLDER = "uncategorized"
+
+def storage_folder_for_blob(name):
+    """Site folder a documents blob is counted under ("uncategorized" for blobs without a folder prefix)"""
+    return name.split('/')[0].lower() if '/' in name else UNCATEGORIZED_FOLDER
+
+def is_document_blob(name):
+    """False for system files and folder placeholders, which statistics do not count"""
+    return bool(name) and name not in SYSTEM_BLOB_NAMES and not name.endswith('/.folder')
+
+def blob_modified_iso(last_modified):
+    """Listing Last-Modified (RFC 1123) as an ISO timestamp, so values compare as strings"""
+    try:
+        return email.utils.parsedate_to_datetime(last_modified).astimezone(timezone.utc).isoformat()
+    except (TypeError, ValueError):
+        return None
+
+def collect_folder_statistics(storage_account="stbtpuksprodcrawler01", container="documents", prefix=None,
+                              include_files=False, access_token=None):
+    """Stream the container listing into per-folder counts
+    
+    Returns:
+        dict: {site folder: {"count", "bytes", "last_modified"[, "files"]}}
+    """
+    folders = {}
+    for blob in iter_blobs(storage_account, container, prefix=prefix, access_token=access_token):
+        name = blob["name"]
+        if not is_document_blob(name):
+            continue
+        
+        site_folder = storage_folder_for_blob(name)
+        if site_folder == UNCATEGORIZED_FOLDER:
+            # Documents without folder prefix - log for investigation
+            logging.warning(f'⚠️  Document without folder prefix found: {name}')
+        
+        if site_folder not in folders:
+            folders[site_folder] = {"count": 0, "bytes": 0, "last_modified": None}
+            if include_files:
+                folders[site_folder]["files"] = []
+        
+        stats = folders[site_folder]
+        stats["count"] += 1
+        stats["bytes"] += blob["size"]
+        modified = blob_modified_iso(blob["last_modified"])
+        if modified and (stats["last_modified"] is None or modified > stats["last_modified"]):
+            stats["last_modified"] = modified
+        if include_files:
+            stats["files"].append({"name": name, "size": blob["size"], "last_modified": blob["last_modified"]})
+    return folders
+
+def build_storage_statistics(folders, storage_account="stbtpuksprodcrawler01", container="documents"):
+    """Shape per-folder counts as the dashboard's storage statistics
+    
+    Returns:
+        dict: total_documents, total_size_bytes/mb and site_breakdown ({display name: count, size, folder, last_modified})
+    """
+    # Load website configurations to build dynamic mapping
+    websites_data = load_websites_config()
+    site_display_names = {}
+    
+    if "error" not in websites_data:
+        for website_config in websites_data.get("websites", []):
+            # Generate folder name same way as generate_unique_filename
+            site_display_names[get_folder_name_for_website(website_config["name"])] = website_config["name"]
+    site_display_names[UNCATEGORIZED_FOLDER] = "Uncategorized (Legacy)"
+    
+    site_stats = {}
+    for site_folder, stats in sorted(folders.items()):
+        if stats["count"] <= 0:
+            continue
+        # Get display name from mapping or use prettified folder name
+        display_name = site_display_names.get(site_folder, site_folder.replace('-', ' ').title())
+        entry = site_stats.setdefault(display_name, {"count": 0, "size": 0, "folder": site_folder, "last_modified": None})
+        entry["count"] += stats["count"]
+        entry["size"] += stats["bytes"]
+        if stats.get("last_modified") and (entry["last_modified"] is None or stats["last_modified"] > entry["last_modified"]):
+            entry["last_modified"] = stats["last_modified"]
+        if "files" in stats:
+            entry.setdefault("files", []).extend(stats["files"])
+    
+    total_documents = sum(entry["count"] for entry in site_stats.values())
+    total_size = sum(entry["size"] for entry in site_stats.values())
+    return {
+        "total_documents": total_documents,
+        "total_size_bytes": total_size,
+        "total_size_mb": round(total_size / (1024 * 1024), 2),
+        "site_breakdown": site_stats,
+        "container": container,
+        "storage_account": storage_account
+    }
+
+def get_storage_statistics(storage_account="stbtpuksprodcrawler01", container="documents", prefix=None,
+                           include_files=False):
+    """Analyze Azure Storage to get document statistics per website
+    
+    Lists the whole container (streamed, see iter_blobs) - request paths should use
+    get_indexed_storage_statistics, which reads the maintained statistics index.
+    
+    Args:
+        prefix: Only count blobs under this prefix (e.g. "college-of-policing/")
+        include_files: Also return every blob's name/size/last_modified per site
+    
+    Returns:
+        dict: total_documents, total_size_bytes/mb and site_breakdown ({display name: count, size, folder})
+    """
     try:
         access_token = get_managed_identity_token()
         if not access_token:
             logging.error('Failed to get access token for storage analysis')
             return {"error": "Authentication failed"}
-            
-        # List all blobs in the container
-        url = f"https://{storage_account}.blob.core.windows.net/{container}?restype=container&comp=list&maxresults=1000"
-        
-        req = urllib.request.Request(url, method='GET')
-        req.add_header('Authorization', f'Bearer {access_token}')
-        req.add_header('x-ms-version', '2020-04-08')
-        
-        with urllib.request.urlopen(req, timeout=30) as response:
-            xml_content = response.read().decode('utf-8')
-            
-        # Parse XML to extract blob information
-        import xml.etree.ElementTree as ET
-        try:
-            root = ET.fromstring(xml_content)
-        except ET.ParseError as e:
-            logging.error(f'XML parsing error: {str(e)}')
-            return {"error": f"XML parsing failed: {str(e)}"}
-        
-        blobs = []
-        total_size = 0
-        
-        for blob in root.findall('.//Blob'):
-            try:
-                name_elem = blob.find('Name')
-                size_elem = blob.find('Properties/Content-Length')
-                modified_elem = blob.find('Properties/Last-Modified')
-                
-                if name_elem is not None and size_elem is not None:
-                    name = name_elem.text or ""
-                    size = int(size_elem.text) if size_elem.text and size_elem.text.isdigit() else 0
-                    modified = modified_elem.text if modified_elem is not None else None
-                    
-                    # Skip system files and folder placeholders
-                    if name and name not in ['document_hashes.json', 'crawl_history.json'] and not name.endswith('/.folder'):
-                        blobs.append({
-                            "name": name,
-                            "size": size,
-                            "last_modified": modified
-                        })
-                        total_size += size
-            except Exception as blob_error:
-                logging.warning(f'Error processing blob: {str(blob_error)}')
-                continue
-        
-        # Categorize documents by site (based on folder prefix in filename)
-        # The generate_unique_filename function creates files like: "site-name/hash_filename.ext"
-        site_stats = {}
-        
-        # Load website configurations to build dynamic mapping
-        websites_data = load_websites_config()
-        site_display_names = {}
-        
-        if "error" not in websites_data:
-            # websites_data["websites"] is a list, not a dict
-            for website_config in websites_data.get("websites", []):
-                # Generate folder name same way as generate_unique_filename
-                folder_name = get_folder_name_for_website(website_config["name"])
-                site_display_names[folder_name] = website_config["name"]
-        
-        for blob in blobs:
-            # Extract the site folder prefix (before the first '/')
-            if '/' in blob["name"]:
-                site_folder = blob["name"].split('/')[0].lower()
-                # Get display name from mapping or use prettified folder name
-                display_name = site_display_names.get(site_folder, site_folder.replace('-', ' ').title())
-            else:
-                # Documents without folder prefix - log for investigation
-                logging.warning(f'⚠️  Document without folder prefix found: {blob["name"]}')
-                site_folder = "uncategorized"
-                display_name = "Uncategorized (Legacy)"
-            
-            # Initialize site stats if not exists
-            if display_name not in site_stats:
-                site_stats[display_name] = {"count": 0, "size": 0, "files": [], "folder": site_folder}
-            
-            # Add blob to site stats
-            site_stats[display_name]["count"] += 1
-            site_stats[display_name]["size"] += blob["size"]
-            site_stats[display_name]["files"].append(blob)
         
-        return {
-            "total_documents": len(blobs),
-            "total_size_bytes": total_size,
-            "total_size_mb": round(total_size / (1024 * 1024), 2),
-            "site_breakdown": site_stats,
-            "container": container,
-            "storage_account": storage_account
-        }
+        folders = collect_folder_statistics(storage_account, container, prefix=prefix,
+                                            include_files=include_files, access_token=access_token)
+        return build_storage_statistics(folders, storage_account, container)
         
+    except ET.ParseError as e:
+        logging.error(f'XML parsing error: {str(e)}')
+        return {"error": f"XML parsing failed: {str(e)}"}
     except Exception as e:
         logging.error(f'Storage statistics error: {str(e)}')
         return {"error": str(e)}
@@ -1696,6 +4190,17 @@ def store_crawl_history(crawl_data, storage_account="stbtpuksprodcrawler01", con
             "documents_changed": crawl_data.get("documents_changed", 0),
             "documents_unchanged": crawl_data.get("documents_unchanged", 0),
             "documents_uploaded": crawl_data.get("documents_uploaded", 0),
+            "revalidation": crawl_data.get("revalidation", {}),
+            "duplicates_avoided": crawl_data.get("duplicates_avoided", 0),
+            "discovery_skipped": crawl_data.get("discovery_skipped", {}),
+            "durable_payload_bytes": crawl_data.get("durable_payload_bytes", {}),
+            "recovered_work": crawl_data.get("recovered_work", {}),
+            "duration_seconds": crawl_data.get("duration_seconds"),
+            "trace": crawl_data.get("trace", {}),  # Per-phase timing summed across sites
+            "site_traces": {
+                site.get("site_name"): site["trace"]
+                for site in crawl_data.get("site_summaries", []) if site.get("trace")
+            },
             "trigger_type": crawl_data.get("trigger_type", "manual")
         }
         
@@ -1714,7 +4219,7 @@ def store_crawl_history(crawl_data, storage_account="stbtpuksprodcrawler01", con
         filename = "crawl_history.json"
         content = json.dumps(history, indent=2).encode('utf-8')
         
-        url = f"https://{storage_account}.blob.core.windows.net/{container}/{filename}"
+        url = f"{blob_service_url(storage_account)}/{container}/{filename}"
         
         req = urllib.request.Request(url, data=content, method='PUT')
         req.add_header('Authorization', f'Bearer {access_token}')
@@ -1723,8 +4228,11 @@ def store_crawl_history(crawl_data, storage_account="stbtpuksprodcrawler01", con
         req.add_header('Content-Type', 'application/json')
         req.add_header('Content-Length', str(len(content)))
         
-        with urllib.request.urlopen(req, timeout=30) as response:
-            return response.status == 201
+        with pooled_urlopen(req, timeout=30) as response:
+            stored = response.status == 201
+        if stored:
+            RESPONSE_CACHE.invalidate()  # A crawl finished - cached stats are stale
+        return stored
             
     except Exception as e:
         logging.error(f'Error storing crawl history: {str(e)}')
@@ -1739,13 +4247,13 @@ def get_crawl_history(storage_account="stbtpuksprodcrawler01", container="docume
             return []
             
         filename = "crawl_history.json"
-        url = f"https://{storage_account}.blob.core.windows.net/{container}/{filename}"
+        url = f"{blob_service_url(storage_account)}/{container}/{filename}"
         
         req = urllib.request.Request(url, method='GET')
         req.add_header('Authorization', f'Bearer {access_token}')
         req.add_header('x-ms-version', '2020-04-08')
         
-        with urllib.request.urlopen(req, timeout=30) as response:
+        with pooled_urlopen(req, timeout=30) as response:
             history_data = json.loads(response.read().decode())
             return history_data
             
@@ -1760,6 +4268,278 @@ def get_crawl_history(storage_account="stbtpuksprodcrawler01", container="docume
         logging.error(f'Error retrieving crawl history: {str(e)}')
         return []
 
+# ============================================================================
+# STORAGE STATISTICS INDEX - Per-site counts maintained by upload/delete paths
+# ============================================================================
+
+STORAGE_STATS_INDEX_NAME = "storage-stats/index.json"
+STORAGE_STATS_RECONCILE_SECONDS = int(os.environ.get('STORAGE_STATS_RECONCILE_SECONDS', '86400'))  # Relist when older
+STORAGE_STATS_WRITE_ATTEMPTS = 5  # Conditional (If-Match) rewrites before giving up on a delta
+
+def add_storage_delta(delta, blob_name, count=0, size=0, written=True):
+    """Record a change to one documents blob in a storage statistics delta
+    
+    Args:
+        delta: {site folder: {"count", "bytes", "writes"}} updated in place
+        blob_name: Blob written or deleted (its folder prefix picks the index entry)
+        count: +1 for a new blob, -1 for a deleted one, 0 for an overwrite
+        size: Byte change (new size, minus the old size for overwrites and deletes)
+        written: False for deletes - writes move the folder's last_modified when applied
+    """
+    entry = delta.setdefault(storage_folder_for_blob(blob_name), {"count": 0, "bytes": 0, "writes": 0})
+    entry["count"] += count
+    entry["bytes"] += size
+    entry["writes"] += 1 if written else 0
+    return delta
+
+def merge_storage_deltas(deltas):
+    """Sum storage statistics deltas (e.g. one per document batch) into one"""
+    merged = {}
+    for delta in deltas:
+        for site_folder, change in (delta or {}).items():
+            entry = merged.setdefault(site_folder, {"count": 0, "bytes": 0, "writes": 0})
+            for key in entry:
+                entry[key] += change.get(key, 0)
+    return merged
+
+def load_storage_stats_index(storage_account="stbtpuksprodcrawler01", container="crawl-metadata"):
+    """Read the statistics index
+    
+    Returns:
+        tuple: (index dict, etag), or (None, None) if it has not been built yet
+    """
+    content, etag = read_metadata_blob_with_etag(STORAGE_STATS_INDEX_NAME, storage_account, container)
+    if content is None:
+        return None, None
+    return json.loads(content.decode('utf-8')), etag
+
+def apply_storage_stats_delta(delta, storage_account="stbtpuksprodcrawler01", container="crawl-metadata"):
+    """Fold a storage statistics delta into the index
+    
+    Uses If-Match so concurrent writers (orchestrations, cleanup) never lose each
+    other's changes. A missing index is left for the next read to build from a
+    full listing, which already includes this delta's blobs.
+    
+    Returns:
+        bool: True if the delta was applied (or there was nothing to apply)
+    """
+    if not any(change.get("count") or change.get("bytes") or change.get("writes") for change in delta.values()):
+        return True
+    try:
+        for attempt in range(STORAGE_STATS_WRITE_ATTEMPTS):
+            index, etag = load_storage_stats_index(storage_account, container)
+            if index is None:
+                logging.info('📊 Storage statistics index not built yet - next read will reconcile')
+                return True
+            
+            now = datetime.now(timezone.utc).isoformat()
+            folders = index.setdefault("folders", {})
+            for site_folder, change in delta.items():
+                entry = folders.setdefault(site_folder, {"count": 0, "bytes": 0, "last_modified": None})
+                entry["count"] = max(0, entry["count"] + change.get("count", 0))
+                entry["bytes"] = max(0, entry["bytes"] + change.get("bytes", 0))
+                if change.get("writes"):
+                    entry["last_modified"] = now
+            index["updated"] = now
+            
+            try:
+                content = json.dumps(index, separators=(',', ':')).encode('utf-8')
+                if write_metadata_blob(STORAGE_STATS_INDEX_NAME, content, storage_account=storage_account,
+                                       container=container, if_match=etag):
+                    logging.info(f'📊 Applied storage statistics delta for {len(delta)} folders')
+                    RESPONSE_CACHE.invalidate()
+                    return True
+                return False
+            except urllib.error.HTTPError as e:
+                if e.code != 412:
+                    raise
+                logging.info(f'Storage statistics index changed concurrently, retrying (attempt {attempt + 1})')
+        logging.error('❌ Gave up applying storage statistics delta after repeated write conflicts')
+        return False
+    except Exception as e:
+        logging.error(f'❌ Error applying storage statistics delta: {str(e)}')
+        return False
+
+def reconcile_storage_stats_index(storage_account="stbtpuksprodcrawler01", container="documents",
+                                  metadata_container="crawl-metadata"):
+    """Rebuild the statistics index from a full container listing
+    
+    Corrects drift from writes that bypass the deltas (debug endpoints, failed
+    delta writes, blobs changed outside the crawler).
+    
+    Returns:
+        dict: The rebuilt index, with "drift" ({site folder: listed count minus indexed count})
+    """
+    access_token = get_managed_identity_token()
+    if not access_token:
+        raise RuntimeError('Failed to get access token')
+    
+    previous, _ = load_storage_stats_index(storage_account, metadata_container)
+    folders = collect_folder_statistics(storage_account, container, access_token=access_token)
+    
+    previous_folders = (previous or {}).get("folders", {})
+    drift = {}
+    for site_folder in set(folders) | set(previous_folders):
+        difference = folders.get(site_folder, {}).get("count", 0) - previous_folders.get(site_folder, {}).get("count", 0)
+        if difference:
+            drift[site_folder] = difference
+    
+    now = datetime.now(timezone.utc).isoformat()
+    index = {"container": container, "updated": now, "reconciled_at": now, "folders": folders}
+    write_metadata_blob(STORAGE_STATS_INDEX_NAME, json.dumps(index, separators=(',', ':')).encode('utf-8'),
+                        storage_account=storage_account, container=metadata_container)
+    if previous is not None and drift:
+        logging.warning(f'⚠️  Storage statistics index drifted from listing: {drift}')
+    logging.info(f'📊 Reconciled storage statistics index: {sum(f["count"] for f in folders.values())} documents '
+                 f'in {len(folders)} folders')
+    return dict(index, drift=drift)
+
+def get_indexed_storage_statistics(storage_account="stbtpuksprodcrawler01", container="documents",
+                                   max_age=None, reconcile=False):
+    """Storage statistics from the maintained index - O(sites), no container listing
+    
+    The index is rebuilt from a listing only when it is missing, older than max_age
+    seconds since its last reconciliation, or reconcile is requested.
+    
+    Args:
+        max_age: Reconciliation age limit in seconds (default STORAGE_STATS_RECONCILE_SECONDS)
+        reconcile: Force a full relisting
+    
+    Returns:
+        dict: Same shape as get_storage_statistics, plus "index" (updated, reconciled_at, drift)
+    """
+    max_age = STORAGE_STATS_RECONCILE_SECONDS if max_age is None else max_age
+    try:
+        index, _ = (None, None) if reconcile else load_storage_stats_index(storage_account)
+        if index is not None:
+            reconciled_at = datetime.fromisoformat(index.get("reconciled_at", "1970-01-01T00:00:00+00:00"))
+            if ((datetime.now(timezone.utc) - reconciled_at).total_seconds() > max_age
+                    or index.get("container") != container):
+                index = None
+        if index is None:
+            index = reconcile_storage_stats_index(storage_account, container)
+        
+        stats = build_storage_statistics(index.get("folders", {}), storage_account, container)
+        stats["index"] = {
+            "updated": index.get("updated"),
+            "reconciled_at": index.get("reconciled_at"),
+            "drift": index.get("drift")  # Only present when this call reconciled
+        }
+        return stats
+    
+    except ET.ParseError as e:
+        logging.error(f'XML parsing error: {str(e)}')
+        return {"error": f"XML parsing failed: {str(e)}"}
+    except Exception as e:
+        logging.error(f'Storage statistics error: {str(e)}')
+        return {"error": str(e)}
+
+# ============================================================================
+# RESPONSE CACHE - Stats/diagnostic payloads with TTL and ETag revalidation
+# ============================================================================
+
+STATS_CACHE_TTL = float(os.environ.get('STATS_CACHE_TTL_SECONDS', '30'))  # 0 disables caching
+# Left out of the ETag: they change on every computation without the data changing
+RESPONSE_CACHE_VOLATILE_KEYS = ("timestamp", "http_pool", "token_cache", "response_cache")
+
+def payload_etag(payload):
+    """Strong ETag over a JSON payload, ignoring volatile keys"""
+    stable = {key: value for key, value in payload.items() if key not in RESPONSE_CACHE_VOLATILE_KEYS}
+    digest = hashlib.md5(json.dumps(stable, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+    return f'"{digest}"'
+
+def etag_matches(if_none_match, etag):
+    """True if an If-None-Match header value covers etag (weak validators compare equal)"""
+    if not if_none_match or not etag:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(',')]
+    return '*' in candidates or etag in [candidate[2:] if candidate.startswith('W/') else candidate
+                                         for candidate in candidates]
+
+class ResponseCache:
+    """Process-wide cache for computed JSON endpoint payloads
+    
+    Entries live for ttl seconds or until invalidate(), which runs when a crawl
+    finishes or the storage statistics index changes in this worker (other workers
+    pick the change up when their entry expires). The ETag ignores volatile keys, so
+    a recomputed but unchanged payload keeps its ETag and pollers keep getting 304s.
+    """
+    def __init__(self, ttl=STATS_CACHE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = {}  # key -> (body, etag, expires_at monotonic)
+        self._generation = 0
+        self._stats = {"hits": 0, "misses": 0, "not_modified": 0, "bytes_saved": 0, "invalidations": 0}
+    
+    def get(self, key, compute):
+        """Return (body, etag, hit) for key, calling compute() -> (payload, cacheable) on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and time.monotonic() < entry[2]:
+                self._stats["hits"] += 1
+                return entry[0], entry[1], True
+            self._stats["misses"] += 1
+            generation = self._generation
+        
+        payload, cacheable = compute()
+        body = json.dumps(payload, indent=2, ensure_ascii=False)
+        etag = payload_etag(payload)
+        if cacheable and self.ttl > 0:
+            with self._lock:
+                # A crawl that finished while this was computing makes the payload stale
+                if generation == self._generation:
+                    self._entries[key] = (body, etag, time.monotonic() + self.ttl)
+        return body, etag, False
+    
+    def record_not_modified(self, body_bytes):
+        """Count a 304 answered instead of sending body_bytes"""
+        with self._lock:
+            self._stats["not_modified"] += 1
+            self._stats["bytes_saved"] += body_bytes
+    
+    def invalidate(self):
+        """Drop every cached payload"""
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+            self._stats["invalidations"] += 1
+    
+    def get_stats(self):
+        """Return hit/miss/304 counters and the hit rate"""
+        with self._lock:
+            stats = dict(self._stats)
+            lookups = stats["hits"] + stats["misses"]
+            stats["hit_rate_percent"] = round(stats["hits"] / lookups * 100, 2) if lookups else 0
+            stats["entries"] = len(self._entries)
+            stats["ttl_seconds"] = self.ttl
+            return stats
+
+# Shared by the stats and diagnostic endpoints of this worker
+RESPONSE_CACHE = ResponseCache()
+
+def get_response_cache_stats():
+    """Get stats/diagnostic response cache hit/miss counters"""
+    return RESPONSE_CACHE.get_stats()
+
+def cached_json_response(req, key, compute):
+    """Serve a JSON payload from RESPONSE_CACHE, answering a matching If-None-Match with 304
+    
+    Args:
+        req: Incoming request (If-None-Match header)
+        key: Cache key - one per endpoint and parameter combination
+        compute: Callable returning (payload dict, cacheable) on a cache miss
+    
+    Returns:
+        func.HttpResponse: 200 with the payload, or 304 with no body
+    """
+    body, etag, hit = RESPONSE_CACHE.get(key, compute)
+    # no-cache: browsers keep the body but revalidate with If-None-Match on every poll
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "X-Cache": "HIT" if hit else "MISS"}
+    if etag_matches(req.headers.get('If-None-Match'), etag):
+        RESPONSE_CACHE.record_not_modified(len(body.encode('utf-8')))
+        return func.HttpResponse(status_code=304, headers=headers)
+    return func.HttpResponse(body, status_code=200, mimetype="application/json", headers=headers)
+
 # ============================================================================
 # MAIN FUNCTION APP - Initialize BEFORE function definitions
 # ============================================================================
@@ -1771,6 +4551,10 @@ app = df.DFApp(http_auth_level=func.AuthLevel.ANONYMOUS)
 # DURABLE FUNCTIONS - ORCHESTRATOR AND ACTIVITY FUNCTIONS
 # ============================================================================
 
+# Discovery and document batch activities are retried after a timeout or worker
+# recycle - the retry resumes from the unit's crawl checkpoint
+CRAWL_ACTIVITY_RETRY = df.RetryOptions(first_retry_interval_in_milliseconds=30000, max_number_of_attempts=3)
+
 @app.orchestration_trigger(context_name="context")
 def web_crawler_orchestrator(context: df.DurableOrchestrationContext):
     """
@@ -1778,10 +4562,11 @@ def web_crawler_orchestrator(context: df.DurableOrchestrationContext):
     
     This orchestrator:
     1. Loads website configurations
-    2. Fans out to multiple activity functions (one per website)
-    3. Runs crawls in parallel for maximum efficiency
-    4. Aggregates results from all crawls
-    5. Stores combined hashes and crawl history
+    2. Fans out discovery activities (one per website)
+    3. Fans out document batches from every site to process_document_batch_activity,
+       so large sites spread across all workers
+    4. Merges each site's batches and aggregates results from all crawls
+    5. Merges per-site hash deltas and stores crawl history
     
     Returns:
         dict: Aggregated results from all website crawls
@@ -1807,25 +4592,62 @@ def web_crawler_orchestrator(context: df.DurableOrchestrationContext):
             "orchestration_id": context.instance_id
         }
     
-    # Activity 2: Get previous hashes once (efficiency)
-    logging.info('🔍 Step 2: Retrieving previous document hashes for change detection')
-    previous_hashes = yield context.call_activity('get_document_hashes_activity')
+    # Activity 2: Resolve the manifest version - activities load their own site's
+    # hashes by this reference, keeping the manifest out of Durable history
+    logging.info('🔍 Step 2: Resolving document hash manifest version')
+    manifest_version = yield context.call_activity('get_manifest_version_activity')
     
-    # Step 3: Fan-out to parallel activity functions (one per website)
-    logging.info(f'🌐 Step 3: Fanning out to {len(enabled_sites)} parallel website crawl activities')
+    # Step 3: Fan-out discovery (one activity per website)
+    logging.info(f'🌐 Step 3: Fanning out to {len(enabled_sites)} parallel website discovery activities')
     
-    crawl_tasks = []
-    for site_config in enabled_sites:
-        # Prepare input for each activity (includes site config and previous hashes)
-        activity_input = {
-            "site_config": site_config,
-            "previous_hashes": previous_hashes
-        }
-        task = context.call_activity('crawl_single_website_activity', activity_input)
-        crawl_tasks.append(task)
+    discovery_inputs = [
+        # Site config plus manifest reference only - activities load their own hashes
+        {"site_config": site_config, "manifest_version": manifest_version}
+        for site_config in enabled_sites
+    ]
+    discovery_results = yield context.task_all(
+        [context.call_activity_with_retry('discover_website_activity', CRAWL_ACTIVITY_RETRY, item)
+         for item in discovery_inputs]
+    )
+    
+    # Step 3b: Fan-out document batches across every site at once - the Functions host
+    # runs at most maxConcurrentActivityFunctions per worker, so one large site can use
+    # the whole app's capacity instead of one 10-minute activity
+    batch_inputs = []
+    batch_owners = []  # Index of the site each batch belongs to
+    for site_index, (site_config, discovery_result) in enumerate(zip(enabled_sites, discovery_results)):
+        batches = split_document_batches(discovery_result.get("documents", []),
+                                         site_config.get("document_batch_size"))
+        for batch_index, documents in enumerate(batches):
+            batch_inputs.append({
+                "site_config": site_config,
+                "documents": documents,
+                "batch_index": batch_index,
+                "manifest_version": manifest_version
+            })
+            batch_owners.append(site_index)
     
-    # Wait for all parallel crawls to complete
-    crawl_results = yield context.task_all(crawl_tasks)
+    logging.info(f'📦 Step 3b: Processing {len(batch_inputs)} document batches across {len(enabled_sites)} websites')
+    batch_results = []
+    if batch_inputs:
+        # Retried batches (timeout, worker recycle) resume from their checkpoints
+        batch_results = yield context.task_all(
+            [context.call_activity_with_retry('process_document_batch_activity', CRAWL_ACTIVITY_RETRY, item)
+             for item in batch_inputs]
+        )
+    
+    # Merge each site's batches back into one crawl result
+    site_batches = [[] for _ in enabled_sites]
+    for site_index, batch_result in zip(batch_owners, batch_results):
+        site_batches[site_index].append(batch_result)
+    crawl_results = [merge_document_batch_results(discovery_result, batches)
+                     for discovery_result, batches in zip(discovery_results, site_batches)]
+    
+    # Size of what the crawl fan-out adds to orchestration history
+    durable_payload_bytes = {
+        "activity_inputs": sum(len(json.dumps(item)) for item in discovery_inputs + batch_inputs),
+        "activity_outputs": sum(len(json.dumps(item)) for item in discovery_results + batch_results)
+    }
     
     # Step 4: Aggregate results
     logging.info('📈 Step 4: Aggregating results from all website crawls')
@@ -1837,10 +4659,12 @@ def web_crawler_orchestrator(context: df.DurableOrchestrationContext):
     total_documents_unchanged = 0
     total_documents_uploaded = 0
     total_collisions = 0  # Phase 2: Track total collisions
+    total_revalidation = {"conditional_requests": 0, "not_modified": 0, "lastmod_skipped": 0, "bytes_saved": 0}
+    total_duplicates_avoided = 0
     successful_sites = 0
     failed_sites = 0
     blocked_sites = 0
-    all_current_hashes = {}
+    hash_deltas = []
     site_summaries = []
     
     for result in crawl_results:
@@ -1851,6 +4675,9 @@ def web_crawler_orchestrator(context: df.DurableOrchestrationContext):
         total_documents_unchanged += result.get("documents_unchanged", 0)
         total_documents_uploaded += result.get("documents_uploaded", 0)
         total_collisions += result.get("collision_count", 0)  # Phase 2: Aggregate collisions
+        for key in total_revalidation:
+            total_revalidation[key] += result.get("revalidation", {}).get(key, 0)
+        total_duplicates_avoided += result.get("duplicates_avoided", {}).get("total", 0)
         
         # Track status
         status = result.get("status", "unknown")
@@ -1861,8 +4688,9 @@ def web_crawler_orchestrator(context: df.DurableOrchestrationContext):
         elif status == "error":
             failed_sites += 1
         
-        # Merge hashes
-        all_current_hashes.update(result.get("current_hashes", {}))
+        # Collect manifest deltas
+        if result.get("hash_delta"):
+            hash_deltas.append(result["hash_delta"])
         
         # Track site summary
         site_summaries.append({
@@ -1872,13 +4700,32 @@ def web_crawler_orchestrator(context: df.DurableOrchestrationContext):
             "documents_found": result.get("documents_found", 0),
             "documents_uploaded": result.get("documents_uploaded", 0),
             "collision_count": result.get("collision_count", 0),  # Phase 2: Include in summary
+            "revalidation": result.get("revalidation", {}),  # Conditional GET: 304 rate and bytes saved
+            "trace": result.get("trace", {}),  # Per-phase timing spans for this site
+            "duplicates_avoided": result.get("duplicates_avoided", {}),  # Canonical-URL duplicates skipped
+            "discovery_skipped": result.get("discovery_skipped", {}),  # Index pages/links skipped once caps were met
+            "discovery_mode": (result.get("feed_state") or {}).get("mode", "full"),  # Feed-driven "incremental" or "full"
+            "batches": result.get("batches", 0),  # Document batches fanned out for this site
+            "recovered_work": result.get("checkpoint", {}),  # Work resumed from checkpoints instead of redone
             "error": result.get("error")
         })
     
-    # Activity 5: Store combined document hashes
-    if all_current_hashes:
-        logging.info(f'💾 Step 5: Storing {len(all_current_hashes)} combined document hashes')
-        yield context.call_activity('store_document_hashes_activity', all_current_hashes)
+    total_revalidation["not_modified_rate_percent"] = (
+        round(total_revalidation["not_modified"] / total_revalidation["conditional_requests"] * 100, 2)
+        if total_revalidation["conditional_requests"] else 0
+    )
+    
+    # Activity 5: Merge per-site hash deltas into the manifest
+    if hash_deltas:
+        changed_records = sum(len(delta["upserts"]) + len(delta["removed"]) for delta in hash_deltas)
+        logging.info(f'💾 Step 5: Applying {len(hash_deltas)} document hash deltas ({changed_records} changed records)')
+        yield context.call_activity('apply_document_hash_deltas_activity', hash_deltas)
+    
+    # Activity 5.25: Fold uploaded blob counts/bytes into the storage statistics index
+    storage_delta = merge_storage_deltas(result.get("storage_delta") for result in crawl_results)
+    if storage_delta:
+        logging.info(f'📊 Step 5.25: Updating storage statistics index for {len(storage_delta)} folders')
+        yield context.call_activity('apply_storage_stats_delta_activity', storage_delta)
     
     # Phase 2: Activity 5.5 - Validate storage consistency
     logging.info(f'📊 Step 5.5 (Phase 2): Validating storage consistency')
@@ -1901,6 +4748,12 @@ def web_crawler_orchestrator(context: df.DurableOrchestrationContext):
         "documents_unchanged": total_documents_unchanged,
         "documents_uploaded": total_documents_uploaded,
         "collision_count": total_collisions,  # Phase 2: Include collision count
+        "revalidation": total_revalidation,  # Conditional GET totals (304s, bytes saved)
+        "duplicates_avoided": total_duplicates_avoided,  # Duplicate page fetches/downloads skipped via canonical URLs
+        "discovery_skipped": merge_skipped_work(result.get("discovery_skipped") for result in crawl_results),
+        "durable_payload_bytes": durable_payload_bytes,  # Crawl fan-out inputs/outputs kept in orchestration history
+        "recovered_work": merge_recovered_work(result.get("checkpoint") for result in crawl_results),  # Resumed from checkpoints
+        "trace": merge_trace_phases(result.get("trace") for result in crawl_results),  # Per-phase timing across sites
         "validation": validation_result,  # Phase 2: Include validation results
         "trigger_type": "orchestrated",
         "start_time": orchestration_start.isoformat(),
@@ -1946,24 +4799,57 @@ def get_document_hashes_activity(input: None) -> dict:
     logging.info('Activity: Retrieving document hashes from storage')
     return get_document_hashes_from_storage()
 
+@app.activity_trigger(input_name="input")
+def get_manifest_version_activity(input: None) -> str:
+    """
+    Activity Function: Resolve the current document hash manifest version
+    
+    Returns:
+        str: Manifest index ETag (None before the first sharded write)
+    """
+    logging.info('Activity: Resolving document hash manifest version')
+    return get_manifest_version()
+
 @app.activity_trigger(input_name="input")
 def crawl_single_website_activity(input: dict) -> dict:
     """
-    Activity Function: Crawl a single website
+    Activity Function: Crawl a single website (discovery and processing in one activity)
+    
+    The orchestrator fans sites out with discover_website_activity and
+    process_document_batch_activity instead; this remains for single-activity callers.
     
     Args:
-        input: Dict with site_config and previous_hashes
+        input: Dict with site_config and manifest_version (optionally previous_hashes -
+               otherwise the site's manifest shards are loaded here)
     
     Returns:
-        dict: Crawl results for this website
+        dict: Crawl results for this website, with hash_delta in place of current_hashes
     """
     site_config = input["site_config"]
-    previous_hashes = input["previous_hashes"]
-    
-    logging.info(f'Activity: Crawling website - {site_config["name"]}')
+    site_folder = get_site_folder(site_config["name"])
+    trace = CrawlTrace()
+    trace_token = ACTIVE_TRACE.set(trace)
+    try:
+        previous_hashes = input.get("previous_hashes")
+        if previous_hashes is None:
+            with trace.span("manifest_load"):
+                previous_hashes = load_site_document_hashes(site_folder)
+        
+        logging.info(f'Activity: Crawling website - {site_config["name"]}')
+        
+        # Use the refactored core crawling function (records into this activity's trace)
+        result = crawl_website_core(site_config, previous_hashes)
+    finally:
+        ACTIVE_TRACE.reset(trace_token)
     
-    # Use the refactored core crawling function
-    result = crawl_website_core(site_config, previous_hashes)
+    # Return only the manifest changes - unchanged records stay out of Durable history
+    with trace.span("hash_delta"):
+        result["hash_delta"] = compute_hash_delta(
+            site_folder, previous_hashes, result.pop("current_hashes", {}),
+            complete=result.get("status") == "success",
+            base_version=input.get("manifest_version"), feed_state=result.get("feed_state")
+        )
+    result["trace"] = trace.to_dict()
     
     logging.info(f'Activity: Completed crawl for {site_config["name"]} - '
                 f'Status: {result["status"]}, Documents: {result["documents_found"]}, '
@@ -1971,10 +4857,155 @@ def crawl_single_website_activity(input: dict) -> dict:
     
     return result
 
+@app.activity_trigger(input_name="input")
+def discover_website_activity(input: dict) -> dict:
+    """
+    Activity Function: Discover a website's documents without processing them
+    
+    First half of the orchestrator's per-site fan-out - the returned documents are
+    split into batches for process_document_batch_activity.
+    
+    Args:
+        input: Dict with site_config and manifest_version
+    
+    Returns:
+        dict: Crawl result with status "discovered" (or blocked/no_documents/error),
+              "documents" (canonically deduplicated) and a hash_delta removing
+              previous records for URLs no longer discovered
+    """
+    site_config = input["site_config"]
+    site_folder = get_site_folder(site_config["name"])
+    result = new_crawl_result(site_config)
+    del result["current_hashes"]
+    result["documents"] = []
+    trace = CrawlTrace()
+    trace_token = ACTIVE_TRACE.set(trace)
+    checkpoint = None
+    try:
+        logging.info(f'Activity: Discovering documents - {site_config["name"]}')
+        checkpoint = open_crawl_checkpoint(site_folder, "discovery")
+        seen_urls = URLSeenSet()
+        documents = discover_site_documents(site_config, result, seen_urls, checkpoint=checkpoint)
+        if documents is not None:
+            # Batches are processed independently - drop canonical duplicates up front
+            result["documents"] = [doc for doc in documents if seen_urls.add(doc["url"], "download")]
+            result["status"] = "discovered"
+            with trace.span("manifest_load"):
+                previous_hashes = load_site_document_hashes(site_folder)
+            discovered = {doc["url"] for doc in result["documents"]}
+            result["hash_delta"] = compute_hash_delta(
+                site_folder, {url: record for url, record in previous_hashes.items() if url not in discovered}, {},
+                base_version=input.get("manifest_version"), feed_state=result.get("feed_state")
+            )
+        result["duplicates_avoided"] = seen_urls.get_stats()
+    except Exception as discovery_error:
+        logging.error(f'Error discovering site {site_config["name"]}: {str(discovery_error)}')
+        result["status"] = "error"
+        result["error"] = str(discovery_error)
+    finally:
+        ACTIVE_TRACE.reset(trace_token)
+    if checkpoint is not None:
+        result["checkpoint"] = dict(checkpoint.recovered)  # Pages not re-fetched thanks to a checkpoint
+    result["trace"] = trace.to_dict()
+    
+    logging.info(f'Activity: Discovered {len(result["documents"])} documents for {site_config["name"]} - '
+                f'Status: {result["status"]}')
+    return result
+
+@app.activity_trigger(input_name="input")
+def process_document_batch_activity(input: dict) -> dict:
+    """
+    Activity Function: Download, hash and upload one batch of a site's documents
+    
+    Args:
+        input: Dict with site_config, documents, batch_index and manifest_version
+    
+    Returns:
+        dict: Batch counters, revalidation, collision_count, checkpoint recovery counters,
+              trace and a hash_delta covering only this batch's documents
+    """
+    site_config = input["site_config"]
+    documents = input["documents"]
+    site_folder = get_site_folder(site_config["name"])
+    result = new_crawl_result(site_config)
+    del result["current_hashes"]
+    result["batch_index"] = input.get("batch_index", 0)
+    previous_hashes, current_hashes = {}, {}
+    checkpoint = None
+    trace = CrawlTrace()
+    trace_token = ACTIVE_TRACE.set(trace)
+    try:
+        logging.info(f'Activity: Processing batch {result["batch_index"]} of {site_config["name"]} '
+                     f'({len(documents)} documents)')
+        # Batches may land on a different worker than discovery - register the host budget here too
+        HOST_RATE_LIMITER.configure(
+            site_config["url"],
+            site_config.get("requests_per_second", DEFAULT_REQUESTS_PER_SECOND),
+            site_config.get("burst", DEFAULT_REQUEST_BURST)
+        )
+        with trace.span("manifest_load"):
+            previous_hashes = load_site_document_hashes(site_folder)
+        # Resume a retried/interrupted batch - documents it completed are not fetched again
+        checkpoint = open_crawl_checkpoint(site_folder, f'batch-{result["batch_index"]}')
+        current_hashes, collision_count = process_documents(documents, site_config, previous_hashes, result,
+                                                            checkpoint=checkpoint)
+        result["collision_count"] = collision_count
+        result["status"] = "success"
+    except Exception as batch_error:
+        logging.error(f'Error processing batch {result["batch_index"]} of {site_config["name"]}: {str(batch_error)}')
+        result["status"] = "error"
+        result["error"] = str(batch_error)
+        if checkpoint is not None:
+            checkpoint.save()
+    finally:
+        ACTIVE_TRACE.reset(trace_token)
+    
+    # Delta against this batch's previous records only - discovery covers URLs no longer found
+    batch_urls = {doc["url"] for doc in documents}
+    with trace.span("hash_delta"):
+        result["hash_delta"] = compute_hash_delta(
+            site_folder, {url: record for url, record in previous_hashes.items() if url in batch_urls},
+            current_hashes, complete=result["status"] == "success",
+            base_version=input.get("manifest_version")
+        )
+    result["trace"] = trace.to_dict()
+    
+    logging.info(f'Activity: Completed batch {result["batch_index"]} of {site_config["name"]} - '
+                f'Processed: {result["documents_processed"]}, Uploaded: {result["documents_uploaded"]}')
+    return result
+
+@app.activity_trigger(input_name="input")
+def apply_document_hash_deltas_activity(input: list) -> bool:
+    """
+    Activity Function: Merge per-site hash deltas into the sharded manifest
+    
+    Args:
+        input: List of per-site hash deltas (merged document batch deltas)
+    
+    Returns:
+        bool: Success status
+    """
+    logging.info(f'Activity: Applying {len(input)} document hash deltas')
+    return apply_document_hash_deltas(input)
+
+@app.activity_trigger(input_name="input")
+def apply_storage_stats_delta_activity(input: dict) -> bool:
+    """
+    Activity Function: Fold the crawl's uploaded blob counts/bytes into the storage statistics index
+    
+    Args:
+        input: Merged storage delta ({site folder: count, bytes, last_modified})
+    
+    Returns:
+        bool: Success status
+    """
+    logging.info(f'Activity: Applying storage statistics delta for {len(input)} folders')
+    return apply_storage_stats_delta(input)
+
 @app.activity_trigger(input_name="input")
 def store_document_hashes_activity(input: dict) -> bool:
     """
-    Activity Function: Store combined document hashes to Azure Storage
+    Activity Function: Merge combined document hashes into Azure Storage (other stored URLs are kept)
     
     Args:
         input: Combined document hashes from all websites
@@ -1982,8 +5013,8 @@ def store_document_hashes_activity(input: dict) -> bool:
     Returns:
         bool: Success status
     """
-    logging.info(f'Activity: Storing {len(input)} document hashes to Azure Storage')
-    return store_document_hashes_to_storage(input)
+    logging.info(f'Activity: Merging {len(input)} document hashes into Azure Storage')
+    return merge_document_hashes_to_storage(input)
 
 @app.activity_trigger(input_name="input")
 def store_crawl_history_activity(input: dict) -> bool:
@@ -2072,7 +5103,8 @@ def scheduled_crawler(mytimer: func.TimerRequest) -> None:
     
     # Get hashes once for all sites (efficiency improvement)
     previous_hashes = get_document_hashes_from_storage()
-    all_current_hashes = {}
+    hash_deltas = []
+    storage_deltas = []
     
     # Process each enabled website
     for site_config in enabled_sites:
@@ -2089,8 +5121,14 @@ def scheduled_crawler(mytimer: func.TimerRequest) -> None:
         total_unchanged += crawl_result["documents_unchanged"]
         total_uploaded += crawl_result["documents_uploaded"]
         
-        # Merge current hashes
-        all_current_hashes.update(crawl_result["current_hashes"])
+        # Manifest changes for this site - unvisited URLs keep their records
+        site_folder = get_site_folder(site_config["name"])
+        site_previous = {url: record for url, record in previous_hashes.items()
+                         if manifest_shard_folder(manifest_shard_name(url, record)) == site_folder}
+        hash_deltas.append(compute_hash_delta(site_folder, site_previous, crawl_result["current_hashes"],
+                                              complete=crawl_result["status"] == "success",
+                                              feed_state=crawl_result.get("feed_state")))
+        storage_deltas.append(crawl_result.get("storage_delta"))
         
         # Track site results
         site_results.append({
@@ -2100,20 +5138,26 @@ def scheduled_crawler(mytimer: func.TimerRequest) -> None:
             "documents_found": crawl_result["documents_found"],
             "documents_processed": crawl_result["documents_processed"],
             "documents_uploaded": crawl_result["documents_uploaded"],
+            "trace": crawl_result.get("trace", {}),
+            "discovery_skipped": crawl_result.get("discovery_skipped", {}),
+            "discovery_mode": (crawl_result.get("feed_state") or {}).get("mode", "full"),
             "error": crawl_result.get("error")
         })
         
         logging.info(f'Site {site_config["name"]} complete - Found: {crawl_result["documents_found"]}, '
                     f'Processed: {crawl_result["documents_processed"]}, Uploaded: {crawl_result["documents_uploaded"]}')
     
-    # Store all updated hashes once at the end (efficiency improvement)
-    if all_current_hashes:
-        store_success = store_document_hashes_to_storage(all_current_hashes)
+    # Merge all site deltas into the manifest once at the end (efficiency improvement)
+    if hash_deltas:
+        store_success = apply_document_hash_deltas(hash_deltas)
         if store_success:
-            logging.info(f'Successfully stored {len(all_current_hashes)} document hashes for all sites')
+            logging.info(f'Successfully merged document hashes for {len(hash_deltas)} sites')
         else:
             logging.error('Failed to store document hashes')
     
+    # Uploaded blob counts/bytes for the storage statistics index
+    apply_storage_stats_delta(merge_storage_deltas(storage_deltas))
+    
     # Log comprehensive summary and store history
     crawl_summary = {
         "sites_processed": total_sites_processed,
@@ -2122,6 +5166,9 @@ def scheduled_crawler(mytimer: func.TimerRequest) -> None:
         "documents_changed": total_changed,
         "documents_unchanged": total_unchanged,
         "documents_uploaded": total_uploaded,
+        "trace": merge_trace_phases(site["trace"] for site in site_results),
+        "discovery_skipped": merge_skipped_work(site["discovery_skipped"] for site in site_results),
+        "site_summaries": site_results,
         "trigger_type": "scheduled"
     }
     
@@ -2360,7 +5407,7 @@ def manual_crawl(req: func.HttpRequest) -> func.HttpResponse:
         
         req = urllib.request.Request(url, headers=headers)
         try:
-            with urllib.request.urlopen(req, timeout=15) as response:
+            with pooled_urlopen(req, timeout=15) as response:
                 # Handle gzipped responses properly
                 raw_content = response.read()
                 if response.info().get('Content-Encoding') == 'gzip':
@@ -2523,7 +5570,7 @@ def search_site(req: func.HttpRequest) -> func.HttpResponse:
         )
     
     try:
-        with urllib.request.urlopen(url, timeout=15) as response:
+        with pooled_urlopen(url, timeout=15) as response:
             # Handle gzipped responses properly
             raw_content = response.read()
             if response.info().get('Content-Encoding') == 'gzip':
@@ -2624,9 +5671,9 @@ def search_site(req: func.HttpRequest) -> func.HttpResponse:
                         "change_status": "error"
                     })
             
-            # Store updated hashes for next run
+            # Merge updated hashes for next run (other stored URLs are kept)
             if current_hashes:
-                store_document_hashes_to_storage(current_hashes)
+                merge_document_hashes_to_storage(current_hashes)
             
         return func.HttpResponse(
             json.dumps({
@@ -2664,78 +5711,88 @@ def search_site(req: func.HttpRequest) -> func.HttpResponse:
             mimetype="application/json"
         )
 
+def build_stats_payload():
+    """Compute the dashboard statistics payload served by api_stats
+    
+    Returns:
+        tuple: (stats dict, cacheable - False when storage could not be read)
+    """
+    # Get website configurations
+    enabled_sites = get_enabled_websites()
+    
+    # Get storage statistics from the maintained index (no container listing)
+    storage_stats = get_indexed_storage_statistics()
+    
+    # Get crawl history
+    crawl_history = get_crawl_history()
+    
+    # Calculate recent activity (last 24 hours)
+    recent_crawls = []
+    if crawl_history:
+        cutoff_time = datetime.now(timezone.utc) - timedelta(hours=24)
+        for crawl in crawl_history:
+            try:
+                crawl_time = datetime.fromisoformat(crawl["timestamp"].replace('Z', '+00:00'))
+                if crawl_time >= cutoff_time:
+                    recent_crawls.append(crawl)
+            except:
+                continue
+    
+    # Get system status
+    system_status = {
+        "status": "operational",
+        "version": "v2.2.0",
+        "uptime_check": "OK",
+        "storage_accessible": storage_stats.get("error") is None,
+        "last_scheduled_run": crawl_history[-1]["timestamp"] if crawl_history else "Never",
+        "next_scheduled_run": "Every 4 hours"
+    }
+    
+    # Compile comprehensive statistics
+    # Phase 2: Calculate collision and validation metrics
+    total_collisions_24h = sum(c.get("collision_count", 0) for c in recent_crawls)
+    last_validation = crawl_history[-1].get("validation") if crawl_history else None
+    
+    stats = {
+        "system": system_status,
+        "websites": {
+            "total_configured": len(enabled_sites),
+            "enabled_count": len(enabled_sites),
+            "sites": enabled_sites
+        },
+        "storage": storage_stats,
+        "recent_activity": {
+            "crawls_last_24h": len(recent_crawls),
+            "documents_processed_24h": sum(c.get("documents_found", 0) for c in recent_crawls),
+            "documents_uploaded_24h": sum(c.get("documents_uploaded", 0) for c in recent_crawls),
+            "collisions_detected_24h": total_collisions_24h,  # Phase 2
+            "last_crawl": crawl_history[-1] if crawl_history else None
+        },
+        "validation": {  # Phase 2: Storage validation metrics
+            "last_check": last_validation.get("timestamp") if last_validation else "Never",
+            "status": last_validation.get("status") if last_validation else "unknown",
+            "uploaded_count": last_validation.get("uploaded_count") if last_validation else 0,
+            "storage_count": last_validation.get("storage_count") if last_validation else 0,
+            "accuracy_percentage": last_validation.get("accuracy_percentage") if last_validation else 0,
+            "match": last_validation.get("match") if last_validation else False  # Include match for backward compatibility
+        },
+        "crawl_history": crawl_history[-10:],  # Last 10 crawls
+        "timestamp": datetime.now(timezone.utc).isoformat()
+    }
+    return stats, storage_stats.get("error") is None
+
 @app.route(route="api/stats", methods=["GET"], auth_level=func.AuthLevel.ANONYMOUS)
 def api_stats(req: func.HttpRequest) -> func.HttpResponse:
-    """Comprehensive statistics API for dashboard"""
+    """Comprehensive statistics API for dashboard
+    
+    Served from RESPONSE_CACHE for STATS_CACHE_TTL seconds; polls sending the last
+    ETag as If-None-Match get 304 with no body while the statistics are unchanged.
+    """
     logging.info('Statistics API called')
     
     try:
-        # Get website configurations
-        enabled_sites = get_enabled_websites()
-        
-        # Get storage statistics
-        storage_stats = get_storage_statistics()
-        
-        # Get crawl history
-        crawl_history = get_crawl_history()
-        
-        # Calculate recent activity (last 24 hours)
-        recent_crawls = []
-        if crawl_history:
-            cutoff_time = datetime.now(timezone.utc) - timedelta(hours=24)
-            for crawl in crawl_history:
-                try:
-                    crawl_time = datetime.fromisoformat(crawl["timestamp"].replace('Z', '+00:00'))
-                    if crawl_time >= cutoff_time:
-                        recent_crawls.append(crawl)
-                except:
-                    continue
-        
-        # Get system status
-        system_status = {
-            "status": "operational",
-            "version": "v2.2.0",
-            "uptime_check": "OK",
-            "storage_accessible": storage_stats.get("error") is None,
-            "last_scheduled_run": crawl_history[-1]["timestamp"] if crawl_history else "Never",
-            "next_scheduled_run": "Every 4 hours"
-        }
-        
-        # Compile comprehensive statistics
-        # Phase 2: Calculate collision and validation metrics
-        total_collisions_24h = sum(c.get("collision_count", 0) for c in recent_crawls)
-        last_validation = crawl_history[-1].get("validation") if crawl_history else None
-        
-        stats = {
-            "system": system_status,
-            "websites": {
-                "total_configured": len(enabled_sites),
-                "enabled_count": len(enabled_sites),
-                "sites": enabled_sites
-            },
-            "storage": storage_stats,
-            "recent_activity": {
-                "crawls_last_24h": len(recent_crawls),
-                "documents_processed_24h": sum(c.get("documents_found", 0) for c in recent_crawls),
-                "documents_uploaded_24h": sum(c.get("documents_uploaded", 0) for c in recent_crawls),
-                "collisions_detected_24h": total_collisions_24h,  # Phase 2
-                "last_crawl": crawl_history[-1] if crawl_history else None
-            },
-            "validation": {  # Phase 2: Storage validation metrics
-                "last_check": last_validation.get("timestamp") if last_validation else "Never",
-                "status": last_validation.get("status") if last_validation else "unknown",
-                "uploaded_count": last_validation.get("uploaded_count") if last_validation else 0,
-                "storage_count": last_validation.get("storage_count") if last_validation else 0,
-                "accuracy_percentage": last_validation.get("accuracy_percentage") if last_validation else 0,
-                "match": last_validation.get("match") if last_validation else False  # Include match for backward compatibility
-            },
-            "crawl_history": crawl_history[-10:],  # Last 10 crawls
-            "timestamp": datetime.now(timezone.utc).isoformat()
-        }
-        
-        # Ensure JSON serialization works
         try:
-            json_response = json.dumps(stats, indent=2, ensure_ascii=False)
+            return cached_json_response(req, "api_stats", build_stats_payload)
         except (TypeError, ValueError) as json_error:
             logging.error(f'JSON serialization error: {str(json_error)}')
             # Return minimal safe response
@@ -2744,13 +5801,11 @@ def api_stats(req: func.HttpRequest) -> func.HttpResponse:
                 "error": str(json_error),
                 "timestamp": datetime.now(timezone.utc).isoformat()
             }
-            json_response = json.dumps(safe_stats, indent=2)
-        
-        return func.HttpResponse(
-            json_response,
-            status_code=200,
-            mimetype="application/json"
-        )
+            return func.HttpResponse(
+                json.dumps(safe_stats, indent=2),
+                status_code=200,
+                mimetype="application/json"
+            )
         
     except Exception as e:
         logging.error(f'Statistics API error: {str(e)}')
@@ -3594,58 +6649,80 @@ def manage_websites(req: func.HttpRequest) -> func.HttpResponse:
 # SIMPLE TEST ENDPOINT - VERIFY DEPLOYMENT
 # ============================================================================
 
+def build_diagnostic_payload(reconcile=False):
+    """Compute the diagnostic payload: storage statistics beside the tracked document hashes
+    
+    Args:
+        reconcile: Relist the container into the statistics index first
+    
+    Returns:
+        tuple: (payload dict, cacheable)
+    
+    Raises:
+        RuntimeError: If storage statistics could not be read
+    """
+    # Get storage statistics from the index
+    storage_stats = get_indexed_storage_statistics(reconcile=reconcile)
+    if "error" in storage_stats:
+        raise RuntimeError(storage_stats["error"])
+    
+    # Get document hashes to check what we think is stored
+    doc_hashes = get_document_hashes_from_storage()
+    
+    # Organize hashes by website
+    hashes_by_site = {}
+    for url, hash_info in doc_hashes.items():
+        unique_filename = hash_info.get("unique_filename", "")
+        if '/' in unique_filename:
+            site_folder = unique_filename.split('/')[0]
+            if site_folder not in hashes_by_site:
+                hashes_by_site[site_folder] = []
+            hashes_by_site[site_folder].append({
+                "url": url,
+                "filename": hash_info.get("filename"),
+                "unique_filename": unique_filename,
+                "last_seen": hash_info.get("last_seen"),
+                "tombstoned_at": hash_info.get("tombstoned_at")
+            })
+    
+    payload = {
+        "message": "Diagnostic information",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "storage_stats": {
+            "total_documents": storage_stats.get("total_documents", 0),
+            "total_size_mb": storage_stats.get("total_size_mb", 0),
+            "site_breakdown": storage_stats.get("site_breakdown", {}),
+            "index": storage_stats.get("index")
+        },
+        "document_hashes": {
+            "total_tracked": len(doc_hashes),
+            "by_site_folder": {k: len(v) for k, v in hashes_by_site.items()},
+            "sample_per_site": {k: v[:3] for k, v in hashes_by_site.items()}  # First 3 from each site
+        },
+        "http_pool": get_http_pool_stats(),  # Keep-alive connection reuse per host
+        "token_cache": get_token_cache_stats(),  # Managed identity token hits/misses
+        "response_cache": get_response_cache_stats()  # Stats/diagnostic cache hit rate and 304s
+    }
+    return payload, True
+
 @app.route(route="diagnostic", methods=["GET"], auth_level=func.AuthLevel.ANONYMOUS)
 def diagnostic(req: func.HttpRequest) -> func.HttpResponse:
-    """Diagnostic endpoint to check storage folders and document counts"""
+    """Diagnostic endpoint to check storage folders and document counts
+    
+    Cached like api_stats; ?reconcile=true relists the container, bypassing the cache.
+    """
     logging.info('Diagnostic endpoint called')
     
     try:
-        # Get storage statistics
-        storage_stats = get_storage_statistics()
-        
-        if "error" in storage_stats:
+        if req.params.get('reconcile', '').lower() == 'true':
+            payload, _ = build_diagnostic_payload(reconcile=True)
+            RESPONSE_CACHE.invalidate()  # Cached payloads predate the rebuilt index
             return func.HttpResponse(
-                json.dumps({"error": storage_stats["error"]}),
-                status_code=500,
+                json.dumps(payload, indent=2),
+                status_code=200,
                 mimetype="application/json"
             )
-        
-        # Get document hashes to check what we think is stored
-        doc_hashes = get_document_hashes_from_storage()
-        
-        # Organize hashes by website
-        hashes_by_site = {}
-        for url, hash_info in doc_hashes.items():
-            unique_filename = hash_info.get("unique_filename", "")
-            if '/' in unique_filename:
-                site_folder = unique_filename.split('/')[0]
-                if site_folder not in hashes_by_site:
-                    hashes_by_site[site_folder] = []
-                hashes_by_site[site_folder].append({
-                    "url": url,
-                    "filename": hash_info.get("filename"),
-                    "unique_filename": unique_filename,
-                    "last_seen": hash_info.get("last_seen")
-                })
-        
-        return func.HttpResponse(
-            json.dumps({
-                "message": "Diagnostic information",
-                "timestamp": datetime.now(timezone.utc).isoformat(),
-                "storage_stats": {
-                    "total_documents": storage_stats.get("total_documents", 0),
-                    "total_size_mb": storage_stats.get("total_size_mb", 0),
-                    "site_breakdown": storage_stats.get("site_breakdown", {})
-                },
-                "document_hashes": {
-                    "total_tracked": len(doc_hashes),
-                    "by_site_folder": {k: len(v) for k, v in hashes_by_site.items()},
-                    "sample_per_site": {k: v[:3] for k, v in hashes_by_site.items()}  # First 3 from each site
-                }
-            }, indent=2),
-            status_code=200,
-            mimetype="application/json"
-        )
+        return cached_json_response(req, "diagnostic", build_diagnostic_payload)
         
     except Exception as e:
         logging.error(f'Diagnostic error: {str(e)}')
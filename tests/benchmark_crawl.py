@@ -0,0 +1,253 @@
+"""
+Offline crawl benchmark: end-to-end crawls against local stand-in servers
+
+Starts a synthetic College of Policing / CPS / legislation site server and a blob
+storage + managed identity emulator (tests/stand_in_servers.py), routes the crawler's
+hostnames to them with HTTP_POOL host overrides, then runs crawl_website_core for
+each synthetic site and the Durable orchestrator through a local in-process driver.
+
+Reports pages/sec, bytes/sec, peak RSS and time-in-phase as JSON, so optimisation
+changes can be compared run-to-run without touching the real sites or storage.
+
+Usage:
+    python tests/benchmark_crawl.py [--runs N] [--latency-ms MS] [--document-kb KB]
+                                    [--failure-rate F] [--output results.json]
+"""
+import sys
+import os
+import json
+import time
+import logging
+import resource
+import argparse
+import tempfile
+import threading
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+
+# Add parent directory to path to import function_app
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import function_app
+from stand_in_servers import SyntheticSiteServer, StorageEmulator, host_overrides, identity_environment
+
+
+class PhaseTimer:
+    """Accumulate time spent inside wrapped function_app functions, keyed by phase"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.seconds = {}
+        self.calls = {}
+        self._originals = []
+
+    def wrap(self, phase, name):
+        original = getattr(function_app, name)
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                with self.lock:
+                    self.seconds[phase] = self.seconds.get(phase, 0.0) + elapsed
+                    self.calls[phase] = self.calls.get(phase, 0) + 1
+
+        self._originals.append((name, original))
+        setattr(function_app, name, timed)
+
+    def restore(self):
+        for name, original in reversed(self._originals):
+            setattr(function_app, name, original)
+        self._originals = []
+
+    def snapshot(self):
+        with self.lock:
+            return {phase: {"seconds": round(seconds, 4), "calls": self.calls[phase]}
+                    for phase, seconds in sorted(self.seconds.items())}
+
+
+class _Task:
+    def __init__(self, name, payload=None, children=None):
+        self.name = name
+        self.payload = payload
+        self.children = children
+
+
+class LocalOrchestrationContext:
+    """Just enough of DurableOrchestrationContext to replay the orchestrator in-process"""
+
+    def __init__(self, instance_id):
+        self.instance_id = instance_id
+        self.current_utc_datetime = datetime.now(timezone.utc)
+
+    def call_activity(self, name, input_=None):
+        return _Task(name, input_)
+
+    def call_activity_with_retry(self, name, retry_options, input_=None):
+        return _Task(name, input_)
+
+    def task_all(self, tasks):
+        return _Task("task_all", children=tasks)
+
+
+def run_orchestrator(instance_id="benchmark", max_workers=8):
+    """Drive web_crawler_orchestrator to completion, running activities in this process
+
+    Returns:
+        tuple: (orchestrator output, {activity name: seconds})
+    """
+    orchestrator = function_app.web_crawler_orchestrator._function.get_user_function().orchestrator_function
+    context = LocalOrchestrationContext(instance_id)
+    activity_seconds = {}
+
+    def run_activity(task):
+        start = time.perf_counter()
+        output = getattr(function_app, task.name)(task.payload)
+        activity_seconds[task.name] = activity_seconds.get(task.name, 0.0) + time.perf_counter() - start
+        return output
+
+    generator = orchestrator(context)
+    value = None
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while True:
+            try:
+                task = generator.send(value)
+            except StopIteration as done:
+                return done.value, {name: round(seconds, 4) for name, seconds in activity_seconds.items()}
+            if task.children is not None:
+                value = list(executor.map(run_activity, task.children))
+            else:
+                value = run_activity(task)
+            context.current_utc_datetime = datetime.now(timezone.utc)
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process (includes the in-process stand-in servers)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def run_once(site_server, storage, site_configs, label):
+    """One crawl_website_core pass over every site followed by one orchestrated pass"""
+    timer = PhaseTimer()
+    timer.wrap("process_documents", "process_documents")
+    timer.wrap("document_fetch", "fetch_document_for_processing")
+    timer.wrap("blob_upload", "upload_to_blob_storage_real")
+    timer.wrap("manifest_load", "load_site_document_hashes")
+    requests_before = site_server.stats["requests"]
+    bytes_before = site_server.stats["bytes_sent"]
+
+    try:
+        sites = []
+        start = time.perf_counter()
+        for site_config in site_configs:
+            site_start = time.perf_counter()
+            result = function_app.crawl_website_core(site_config)
+            sites.append({
+                "site_name": site_config["name"],
+                "status": result["status"],
+                "documents_found": result["documents_found"],
+                "documents_uploaded": result["documents_uploaded"],
+                "documents_unchanged": result["documents_unchanged"],
+                "seconds": round(time.perf_counter() - site_start, 4),
+                "trace": result.get("trace", {}),
+                "error": result.get("error"),
+            })
+        core_seconds = time.perf_counter() - start
+        core_requests = site_server.stats["requests"] - requests_before
+        core_bytes = site_server.stats["bytes_sent"] - bytes_before
+        core_phases = timer.snapshot()
+
+        start = time.perf_counter()
+        summary, activity_seconds = run_orchestrator(f"benchmark-{label}")
+        orchestrator_seconds = time.perf_counter() - start
+    finally:
+        timer.restore()
+
+    all_phases = timer.snapshot()
+    process_seconds = core_phases.get("process_documents", {}).get("seconds", 0.0)
+    return {
+        "label": label,
+        "crawl_website_core": {
+            "seconds": round(core_seconds, 4),
+            "pages": core_requests,
+            "bytes": core_bytes,
+            "pages_per_second": round(core_requests / core_seconds, 2) if core_seconds else 0,
+            "bytes_per_second": round(core_bytes / core_seconds, 1) if core_seconds else 0,
+            "time_in_phase": dict(core_phases, discovery={"seconds": round(core_seconds - process_seconds, 4)}),
+            "sites": sites,
+        },
+        "orchestrator": {
+            "seconds": round(orchestrator_seconds, 4),
+            "pages": site_server.stats["requests"] - requests_before - core_requests,
+            "pages_per_second": round((site_server.stats["requests"] - requests_before - core_requests)
+                                      / orchestrator_seconds, 2) if orchestrator_seconds else 0,
+            "documents_uploaded": summary.get("documents_uploaded", 0),
+            "documents_unchanged": summary.get("documents_unchanged", 0),
+            "sites_successful": summary.get("sites_successful", 0),
+            "activity_seconds": activity_seconds,
+            "durable_payload_bytes": summary.get("durable_payload_bytes"),
+            "trace": summary.get("trace"),
+        },
+        "time_in_phase_total": all_phases,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--runs', type=int, default=2, help='Runs against the same storage (first cold, rest warm)')
+    arg_parser.add_argument('--categories', type=int, default=8, help='College of Policing category pages')
+    arg_parser.add_argument('--topics', type=int, default=10, help='Guidance pages per category')
+    arg_parser.add_argument('--cps-topics', type=int, default=4, help='CPS guidance pages per A-Z letter')
+    arg_parser.add_argument('--legislation-items', type=int, default=40, help='Legislation items (2 documents each)')
+    arg_parser.add_argument('--document-kb', type=int, default=64, help='Size of each legislation document')
+    arg_parser.add_argument('--latency-ms', type=float, default=5, help='Delay added to every site response')
+    arg_parser.add_argument('--failure-rate', type=float, default=0.0, help='Fraction of page/document requests failing with 500')
+    arg_parser.add_argument('--requests-per-second', type=float, default=200, help='Per-host politeness budget')
+    arg_parser.add_argument('--seed', type=int, default=1)
+    arg_parser.add_argument('--output', help='Write the JSON report to this file as well as stdout')
+    arg_parser.add_argument('--verbose', action='store_true', help='Show crawler logging')
+    args = arg_parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.CRITICAL)
+
+    site_server = SyntheticSiteServer(
+        categories=args.categories, topics_per_category=args.topics, cps_topics_per_letter=args.cps_topics,
+        legislation_items=args.legislation_items, document_kb=args.document_kb,
+        latency_ms=args.latency_ms, failure_rate=args.failure_rate, seed=args.seed
+    )
+    with site_server, StorageEmulator() as storage, tempfile.TemporaryDirectory() as config_dir:
+        site_configs = site_server.site_configs(requests_per_second=args.requests_per_second)
+        config_path = os.path.join(config_dir, 'websites.json')
+        with open(config_path, 'w', encoding='utf-8') as f:
+            json.dump({"version": "benchmark", "websites": site_configs}, f)
+
+        os.environ.update(identity_environment(storage))
+        os.environ['WEBSITES_CONFIG_PATH'] = config_path
+        function_app.HTTP_POOL.host_overrides = function_app.parse_host_overrides(host_overrides(site_server, storage))
+        function_app.TOKEN_CACHE.clear()
+
+        runs = [run_once(site_server, storage, site_configs, "cold" if i == 0 else f"warm-{i}")
+                for i in range(args.runs)]
+
+        report = {
+            "parameters": vars(args),
+            "runs": runs,
+            "site_server": dict(site_server.stats),
+            "storage": dict(storage.stats, documents_bytes=storage.container_bytes("documents")),
+            "peak_rss_mb": peak_rss_mb(),
+        }
+
+    output = json.dumps(report, indent=2, default=str)
+    print(output)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+    return 0 if all(site["status"] == "success" for run in runs for site in run["crawl_website_core"]["sites"]) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,142 @@
+"""
+Micro-benchmark: precompiled URLClassifier vs the original per-pattern link checks
+
+Runs both implementations over the link sets in tests/fixtures/recorded_links.json,
+verifies they agree on every link, and reports links/sec for each.
+
+Usage:
+    python tests/benchmark_url_classifier.py [--repeat N]
+"""
+import sys
+import os
+import re
+import json
+import time
+import argparse
+import urllib.parse
+
+# Add parent directory to path to import function_app
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from function_app import get_url_classifier, is_guidance_page, is_cps_guidance_page
+
+FIXTURE_PATH = os.path.join(os.path.dirname(__file__), 'fixtures', 'recorded_links.json')
+
+BASE_URLS = {
+    "cps_prosecution_guidance_a_z": "https://www.cps.gov.uk/prosecution-guidance",
+    "college_of_policing_app": "https://www.college.police.uk/app",
+    "legislation_new": "https://www.legislation.gov.uk/new",
+    "npcc_publications": "https://www.npcc.police.uk/publications",
+}
+
+# ----------------------------------------------------------------------------
+# Copies of the original implementations (before precompiled classification)
+# ----------------------------------------------------------------------------
+
+LEGACY_DOCUMENT_EXTENSIONS = {'.pdf', '.doc', '.docx', '.txt', '.xls', '.xlsx', '.xml', '.csv', '.rtf'}
+LEGACY_DOC_PATTERNS = [
+    r'/data/', r'/documents?/', r'/publications?/', r'/files?/', r'\.pdf\?',
+    r'download', r'/pdfs/', r'/data\.xml', r'/data\.akn', r'/data\.htm',
+]
+
+def legacy_is_document(url):
+    """Copy of EnhancedDocumentLinkParser.handle_starttag link test"""
+    lower_url = url.lower()
+    if any(lower_url.endswith(ext) for ext in LEGACY_DOCUMENT_EXTENSIONS):
+        return True
+    return any(re.search(pattern, lower_url) for pattern in LEGACY_DOC_PATTERNS)
+
+def legacy_is_guidance_page(url, min_depth=2):
+    """Copy of the original is_guidance_page"""
+    app_guidance_patterns = [r'/app/[^/]+/[^/]+', r'/app/[^/]+/[^/]+/[^/]+']
+    navigation_indicators = ['/app/search', '/app/categories', '/app/?$', '/app$']
+    for pattern in navigation_indicators:
+        if re.search(pattern, url, re.IGNORECASE):
+            return False
+    parsed = urllib.parse.urlparse(url)
+    path_parts = [p for p in parsed.path.split('/') if p]
+    if min_depth >= 2 and len(path_parts) < 3:
+        return False
+    for pattern in app_guidance_patterns:
+        if re.search(pattern, url, re.IGNORECASE):
+            return True
+    return False
+
+def legacy_is_cps_guidance_page(url):
+    """Copy of the original is_cps_guidance_page"""
+    exclusion_patterns = [
+        r'/prosecution-guidance/?$', r'/prosecution-guidance-search',
+        r'/prosecution-guidance-library', r'/node/',
+    ]
+    for pattern in exclusion_patterns:
+        if re.search(pattern, url, re.IGNORECASE):
+            return False
+    return bool(re.search(r'/prosecution-guidance/[a-z0-9-]+$', url, re.IGNORECASE))
+
+def legacy_is_category_page(url):
+    """Copy of the College of Policing category test from crawl_website_core"""
+    parsed = urllib.parse.urlparse(url)
+    path_parts = [p for p in parsed.path.split('/') if p]
+    return len(path_parts) == 2 and '/app/' in url.lower()
+
+def legacy_checks(url):
+    """Every check the crawler ran per link before this change"""
+    return (legacy_is_document(url), legacy_is_guidance_page(url), legacy_is_cps_guidance_page(url),
+            legacy_is_category_page(url))
+
+# ----------------------------------------------------------------------------
+
+def load_link_sets():
+    """Absolute URLs for each recorded link set"""
+    with open(FIXTURE_PATH, 'r', encoding='utf-8') as f:
+        link_sets = json.load(f)["link_sets"]
+    return {
+        name: [urllib.parse.urljoin(BASE_URLS[name], link) for link in links]
+        for name, links in link_sets.items()
+    }
+
+def find_mismatches(urls):
+    """Links where the compiled predicates disagree with the original functions"""
+    classifier = get_url_classifier()
+    mismatches = []
+    for url in urls:
+        compiled = (classifier.is_document(url), is_guidance_page(url), is_cps_guidance_page(url))
+        if compiled != legacy_checks(url)[:3]:
+            mismatches.append(url)
+    return mismatches
+
+def time_links_per_second(check, urls, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for url in urls:
+            check(url)
+    return len(urls) * repeat / (time.perf_counter() - start)
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--repeat', type=int, default=20, help='Passes over each link set')
+    args = arg_parser.parse_args()
+
+    classifier = get_url_classifier()
+    print("=" * 80)
+    print("URL CLASSIFIER MICRO-BENCHMARK")
+    print("=" * 80)
+
+    exit_code = 0
+    for name, urls in load_link_sets().items():
+        mismatches = find_mismatches(urls)
+        legacy_rate = time_links_per_second(legacy_checks, urls, args.repeat)
+        compiled_rate = time_links_per_second(classifier.classify, urls, args.repeat)
+        print(f"\n{name} ({len(urls)} links)")
+        print(f"  original checks:   {legacy_rate:>12,.0f} links/sec")
+        print(f"  classify():        {compiled_rate:>12,.0f} links/sec  ({compiled_rate / legacy_rate:.1f}x)")
+        if mismatches:
+            exit_code = 1
+            print(f"  ❌ {len(mismatches)} links classified differently, e.g. {mismatches[:3]}")
+        else:
+            print("  ✅ Predicates match the original functions on every link")
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,451 @@
+"""
+Local stand-in servers for offline crawl benchmarks and end-to-end tests
+
+- SyntheticSiteServer: College of Policing / CPS / legislation-style page trees and
+  documents served by Host header, with configurable latency, sizes and failure rate
+- StorageEmulator: the blob REST calls the crawler makes (Put Blob, Put Block,
+  Put Block List, Get/Head/Delete Blob, List Blobs, Create Container) plus a
+  managed identity token endpoint
+
+Point the crawler at them with HTTP_HOST_OVERRIDES (see host_overrides()) and
+IDENTITY_ENDPOINT / IDENTITY_HEADER (see identity_environment()).
+"""
+import gzip
+import hashlib
+import json
+import random
+import threading
+import time
+import urllib.parse
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from xml.sax.saxutils import escape
+
+COLLEGE_OF_POLICING_HOST = "www.college.police.uk"
+CPS_HOST = "www.cps.gov.uk"
+LEGISLATION_HOST = "www.legislation.gov.uk"
+STORAGE_HOST = "stbtpuksprodcrawler01.blob.core.windows.net"
+
+LAST_MODIFIED = format_datetime(datetime(2025, 1, 1, tzinfo=timezone.utc), usegmt=True)
+SITEMAP_LASTMOD = "2025-01-01"
+SITEMAP_NS = "http://www.sitemaps.org/schemas/sitemap/0.9"
+FEED_UPDATED = "2025-01-01T00:00:00Z"
+FEED_PAGE_SIZE = 10
+
+PARAGRAPH = ("This synthetic guidance paragraph stands in for authorised professional practice content. "
+             "It is long enough to count as substantial guidance when extracted by the crawler. ")
+
+
+class _QuietServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Many crawler threads connect at once - don't drop connections under load
+    request_queue_size = 128
+
+
+class _StandInServer:
+    """Run a handler on an ephemeral local port in a background thread"""
+    handler_class = None
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "bytes_sent": 0, "bytes_received": 0, "failures_injected": 0, "not_modified": 0}
+        handler = type(self.handler_class.__name__, (self.handler_class,), {"stand_in": self})
+        self.server = _QuietServer(('127.0.0.1', 0), handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def address(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def count(self, **increments):
+        with self.lock:
+            for key, value in increments.items():
+                self.stats[key] = self.stats.get(key, 0) + value
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+        return False
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    stand_in = None
+
+    def send_body(self, status, body, content_type, extra_headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (extra_headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+        self.stand_in.count(requests=1, bytes_sent=len(body))
+
+    def log_message(self, format, *args):
+        pass
+
+
+# ============================================================================
+# SYNTHETIC WEBSITES
+# ============================================================================
+
+class _SiteHandler(_StandInHandler):
+
+    def do_GET(self):
+        site = self.stand_in
+        if site.latency:
+            time.sleep(site.latency)
+        parsed = urllib.parse.urlsplit(self.path)
+        host = (self.headers.get('Host') or '').split(':')[0].lower()
+
+        if site.should_fail(self.path):
+            site.count(failures_injected=1)
+            self.send_body(500, b"Injected failure", 'text/plain')
+            return
+
+        page = site.render(host, parsed.path, urllib.parse.parse_qs(parsed.query))
+        if page is None:
+            self.send_body(404, b"Not found", 'text/plain')
+            return
+
+        body, content_type = page
+        etag = '"%s"' % hashlib.md5(body).hexdigest()
+        if self.headers.get('If-None-Match') == etag:
+            site.count(not_modified=1)
+            self.send_body(304, b"", content_type, {'ETag': etag})
+            return
+
+        headers = {'ETag': etag, 'Last-Modified': LAST_MODIFIED}
+        if content_type.startswith('text/html') and 'gzip' in (self.headers.get('Accept-Encoding') or ''):
+            body = gzip.compress(body, mtime=0)
+            headers['Content-Encoding'] = 'gzip'
+        self.send_body(200, body, content_type, headers)
+
+
+class SyntheticSiteServer(_StandInServer):
+    """Synthetic College of Policing, CPS and legislation-style sites on one local port
+
+    Args:
+        categories: College of Policing /app/{category} pages
+        topics_per_category: Guidance pages linked from each category
+        cps_topics_per_letter: CPS guidance pages listed on each A-Z index page
+        legislation_items: Items on the legislation listing, each with data.pdf and data.xml -
+                           also listed by /sitemap.xml, an index of a gzipped PDF sitemap
+                           and a plain XML sitemap, and by the Atom feed /new/data.feed
+                           (newest first, FEED_PAGE_SIZE entries per page)
+        document_kb: Size of each generated document
+        latency_ms: Delay added to every response
+        failure_rate: Fraction of document/guidance requests answered with HTTP 500
+        seed: Seed for failure injection and document content
+    """
+    handler_class = _SiteHandler
+
+    def __init__(self, categories=8, topics_per_category=10, cps_topics_per_letter=4, legislation_items=40,
+                 document_kb=64, latency_ms=0, failure_rate=0.0, seed=1):
+        super().__init__()
+        self.categories = categories
+        self.topics_per_category = topics_per_category
+        self.cps_topics_per_letter = cps_topics_per_letter
+        self.legislation_items = legislation_items
+        self.document_bytes = document_kb * 1024
+        self.latency = latency_ms / 1000.0
+        self.failure_rate = failure_rate
+        self.seed = seed
+        self.sitemap_lastmod = {}  # Document path -> <lastmod> override (default SITEMAP_LASTMOD)
+        self.feed_updated = {}  # Legislation item number -> Atom <updated> override (default FEED_UPDATED)
+
+    def should_fail(self, path):
+        """Deterministic per-URL failures so repeated runs fail the same requests"""
+        if not self.failure_rate or not (path.startswith('/app/') or '/data.' in path
+                                         or path.startswith('/prosecution-guidance/')):
+            return False
+        return random.Random(f"{self.seed}:{path}").random() < self.failure_rate
+
+    def document(self, path):
+        """Deterministic pseudo-random document body for a path"""
+        rng = random.Random(f"{self.seed}:{path}")
+        return rng.randbytes(self.document_bytes) if hasattr(rng, 'randbytes') else bytes(
+            rng.getrandbits(8) for _ in range(self.document_bytes))
+
+    @staticmethod
+    def html(title, links=(), paragraphs=0):
+        nav = ''.join(f'<li><a href="{href}">{escape(text)}</a></li>' for href, text in links)
+        main = ''.join(f'<p>{PARAGRAPH * 2}</p>' for _ in range(paragraphs))
+        page = (f'<!DOCTYPE html><html><head><title>{escape(title)}</title></head><body>'
+                f'<header><a href="/">Home</a> <a href="/search">Search</a></header>'
+                f'<nav><ul>{nav}</ul></nav><main><h1>{escape(title)}</h1>{main}</main>'
+                f'<footer><a href="/cookies">Cookies</a> <a href="/accessibility">Accessibility</a></footer>'
+                f'</body></html>')
+        return page.encode('utf-8'), 'text/html; charset=utf-8'
+
+    def render(self, host, path, query):
+        if host == COLLEGE_OF_POLICING_HOST:
+            return self.render_college_of_policing(path)
+        if host == CPS_HOST:
+            return self.render_cps(path, query)
+        if host == LEGISLATION_HOST:
+            return self.render_legislation(path, query)
+        return None
+
+    def render_college_of_policing(self, path):
+        parts = [part for part in path.split('/') if part]
+        if parts == ['app']:
+            links = [(f"/app/category-{i}", f"Category {i}") for i in range(self.categories)]
+            return self.html("APP", links + [("/app/search", "Search APP")])
+        if len(parts) == 2 and parts[0] == 'app' and parts[1].startswith('category-'):
+            links = [(f"/{parts[0]}/{parts[1]}/topic-{j}", f"Topic {j}") for j in range(self.topics_per_category)]
+            return self.html(parts[1], links)
+        if len(parts) == 3 and parts[0] == 'app':
+            return self.html(f"{parts[1]} {parts[2]}", paragraphs=3)
+        return None
+
+    def render_cps(self, path, query):
+        if path.rstrip('/') == '/prosecution-guidance':
+            return self.html("Prosecution guidance", [("/prosecution-guidance-search?subject_area=2343", "A")])
+        if path == '/prosecution-guidance-search':
+            letter = int(query.get('subject_area', ['2343'])[0]) - 2343
+            links = [(f"/prosecution-guidance/topic-{letter}-{j}", f"Topic {letter}-{j}")
+                     for j in range(self.cps_topics_per_letter)]
+            return self.html(f"Guidance {letter}", links + [("/prosecution-guidance-library", "Library")])
+        if path.startswith('/prosecution-guidance/'):
+            return self.html(path.rsplit('/', 1)[-1], paragraphs=4)
+        return None
+
+    def render_legislation(self, path, query=None):
+        if path == '/new/data.feed':
+            return self.feed(int((query or {}).get('page', ['1'])[0]))
+        if path == '/new':
+            links = []
+            for i in range(self.legislation_items):
+                links += [(f"/uksi/2025/{i}/contents", f"SI {i}"), (f"/uksi/2025/{i}/data.pdf", f"SI {i} PDF"),
+                          (f"/uksi/2025/{i}/data.xml", f"SI {i} XML")]
+            return self.html("New legislation", links)
+        if path == '/sitemap.xml':
+            entries = ''.join(f'<sitemap><loc>https://{LEGISLATION_HOST}{child}</loc></sitemap>'
+                              for child in ('/sitemap-pdf.xml.gz', '/sitemap-xml.xml'))
+            return f'<?xml version="1.0" encoding="UTF-8"?><sitemapindex xmlns="{SITEMAP_NS}">{entries}</sitemapindex>'.encode(), 'application/xml'
+        if path == '/sitemap-pdf.xml.gz':
+            return gzip.compress(self.sitemap('pdf'), mtime=0), 'application/gzip'
+        if path == '/sitemap-xml.xml':
+            return self.sitemap('xml'), 'application/xml'
+        if path.endswith('/data.pdf'):
+            return self.document(path), 'application/pdf'
+        if path.endswith('/data.xml'):
+            return self.document(path), 'application/xml'
+        return None
+
+    def sitemap(self, extension):
+        """<urlset> of every legislation item's data.{extension}, with <lastmod> dates"""
+        entries = []
+        for i in range(self.legislation_items):
+            path = f"/uksi/2025/{i}/data.{extension}"
+            entries.append(f'<url><loc>https://{LEGISLATION_HOST}{path}</loc>'
+                           f'<lastmod>{self.sitemap_lastmod.get(path, SITEMAP_LASTMOD)}</lastmod></url>')
+        return f'<?xml version="1.0" encoding="UTF-8"?><urlset xmlns="{SITEMAP_NS}">{"".join(entries)}</urlset>'.encode()
+
+    def feed(self, page):
+        """Atom feed page of legislation items, most recently updated first"""
+        items = sorted(range(self.legislation_items), key=lambda i: (self.feed_updated.get(i, FEED_UPDATED), -i), reverse=True)
+        entries = []
+        for i in items[(page - 1) * FEED_PAGE_SIZE:page * FEED_PAGE_SIZE]:
+            base = f"https://{LEGISLATION_HOST}/uksi/2025/{i}"
+            entries.append(f'<entry><id>{base}</id><title>SI {i}</title>'
+                           f'<updated>{self.feed_updated.get(i, FEED_UPDATED)}</updated>'
+                           f'<link rel="self" href="{base}/contents"/>'
+                           f'<link rel="alternate" type="application/pdf" href="{base}/data.pdf"/>'
+                           f'<link rel="alternate" type="application/xml" href="{base}/data.xml"/></entry>')
+        next_link = (f'<link rel="next" href="/new/data.feed?page={page + 1}"/>'
+                     if page * FEED_PAGE_SIZE < self.legislation_items else '')
+        return (f'<?xml version="1.0" encoding="UTF-8"?><feed xmlns="http://www.w3.org/2005/Atom">'
+                f'<title>New legislation</title>{next_link}{"".join(entries)}</feed>').encode(), 'application/atom+xml'
+
+    def site_configs(self, requests_per_second=50, burst=10, max_concurrent_documents=4):
+        """websites.json entries for the synthetic sites"""
+        common = {"enabled": True, "multi_level": False, "max_depth": 1,
+                  "requests_per_second": requests_per_second, "burst": burst,
+                  "max_concurrent_documents": max_concurrent_documents}
+        return [
+            dict(common, id="bench_college_of_policing", name="Bench College of Policing",
+                 url=f"https://{COLLEGE_OF_POLICING_HOST}/app", capture_html_guidance=True,
+                 max_guidance_pages=self.categories * self.topics_per_category, guidance_min_depth=2),
+            dict(common, id="bench_cps", name="Bench Crown Prosecution Service",
+                 url=f"https://{CPS_HOST}/prosecution-guidance", capture_html_guidance=True,
+                 max_guidance_pages=26 * self.cps_topics_per_letter, guidance_min_depth=1),
+            dict(common, id="bench_legislation", name="Bench Legislation",
+                 url=f"https://{LEGISLATION_HOST}/new"),
+        ]
+
+
+# ============================================================================
+# BLOB STORAGE AND MANAGED IDENTITY EMULATOR
+# ============================================================================
+
+class _StorageHandler(_StandInHandler):
+
+    def _split(self):
+        parsed = urllib.parse.urlsplit(self.path)
+        return parsed.path, urllib.parse.parse_qs(parsed.query)
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        self.stand_in.count(bytes_received=len(body))
+        return body
+
+    def do_GET(self):
+        path, query = self._split()
+        storage = self.stand_in
+        if path == '/msi/token':
+            token = {"access_token": "stand-in-token", "expires_on": str(int(time.time()) + 3600),
+                     "resource": "https://storage.azure.com/", "token_type": "Bearer"}
+            storage.count(token_requests=1)
+            self.send_body(200, json.dumps(token).encode('utf-8'), 'application/json')
+            return
+        if query.get('comp') == ['list']:
+            self.send_body(200, storage.list_xml(path.strip('/'), query), 'application/xml')
+            return
+        blob = storage.get(path)
+        if blob is None:
+            self.send_body(404, b'BlobNotFound', 'application/xml')
+            return
+        self.send_body(200, blob["content"], blob["content_type"], {'ETag': blob["etag"]})
+
+    def do_HEAD(self):
+        path, _ = self._split()
+        blob = self.stand_in.get(path)
+        if blob is None:
+            self.send_body(404, b'', 'application/xml')
+            return
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(blob["content"])))
+        self.send_header('ETag', blob["etag"])
+        self.end_headers()
+        self.stand_in.count(requests=1)
+
+    def do_PUT(self):
+        path, query = self._split()
+        body = self._read_body()
+        storage = self.stand_in
+        if query.get('restype') == ['container']:
+            self.send_body(201, b'', 'application/xml')
+        elif query.get('comp') == ['block']:
+            storage.put_block(path, query['blockid'][0], body)
+            self.send_body(201, b'', 'application/xml')
+        elif query.get('comp') == ['blocklist']:
+            storage.commit_blocks(path, body, self.headers.get('x-ms-blob-content-type'))
+            self.send_body(201, b'', 'application/xml')
+        elif not storage.put(path, body, self.headers.get('Content-Type'), if_match=self.headers.get('If-Match'),
+                             if_none_match=self.headers.get('If-None-Match')):
+            self.send_body(409 if self.headers.get('If-None-Match') else 412, b'ConditionNotMet', 'application/xml')
+        else:
+            self.send_body(201, b'', 'application/xml')
+
+    def do_DELETE(self):
+        path, _ = self._split()
+        self.send_body(202 if self.stand_in.delete(path) else 404, b'', 'application/xml')
+
+
+class StorageEmulator(_StandInServer):
+    """In-memory blob service plus managed identity endpoint"""
+    handler_class = _StorageHandler
+
+    def __init__(self):
+        super().__init__()
+        self.blobs = {}    # "/container/name" -> {"content", "content_type", "etag", "last_modified"}
+        self.blocks = {}   # ("/container/name", block_id) -> bytes
+
+    def put(self, path, content, content_type, if_match=None, if_none_match=None):
+        """Store a blob; with if_match, only if the current blob has that ETag, and with
+        if_none_match="*" only if it does not exist yet (returns False otherwise)"""
+        with self.lock:
+            path = urllib.parse.unquote(path)
+            if if_match and (path not in self.blobs or self.blobs[path]["etag"] != if_match):
+                return False
+            if if_none_match == "*" and path in self.blobs:
+                return False
+            self.blobs[path] = {
+                "content": content,
+                "content_type": content_type or 'application/octet-stream',
+                "etag": '"0x%s"' % hashlib.md5(content + str(time.time_ns()).encode()).hexdigest()[:16].upper(),
+                "last_modified": format_datetime(datetime.now(timezone.utc), usegmt=True),
+            }
+            return True
+
+    def get(self, path):
+        with self.lock:
+            return self.blobs.get(urllib.parse.unquote(path))
+
+    def delete(self, path):
+        with self.lock:
+            return self.blobs.pop(urllib.parse.unquote(path), None) is not None
+
+    def put_block(self, path, block_id, content):
+        with self.lock:
+            self.blocks[(urllib.parse.unquote(path), block_id)] = content
+
+    def commit_blocks(self, path, block_list_xml, content_type):
+        import re
+        path = urllib.parse.unquote(path)
+        block_ids = re.findall(r'<Latest>([^<]+)</Latest>', block_list_xml.decode('utf-8'))
+        with self.lock:
+            content = b''.join(self.blocks.pop((path, block_id)) for block_id in block_ids)
+        self.put(path, content, content_type)
+
+    def list_xml(self, container, query):
+        """List Blobs page honouring prefix, delimiter, maxresults and marker (the next blob name)"""
+        root = f"/{container}/"
+        prefix = query.get('prefix', [''])[0]
+        delimiter = query.get('delimiter', [None])[0]
+        marker = query.get('marker', [''])[0]
+        max_results = int(query.get('maxresults', ['5000'])[0])
+        with self.lock:
+            names = sorted(path[len(root):] for path in self.blobs if path.startswith(root + prefix))
+            entries, prefixes, next_marker = [], [], None
+            for name in names:
+                if name < marker:
+                    continue
+                if delimiter and delimiter in name[len(prefix):]:
+                    virtual = name[:name.index(delimiter, len(prefix)) + len(delimiter)]
+                    if virtual not in prefixes:
+                        prefixes.append(virtual)
+                    continue
+                if len(entries) == max_results:
+                    next_marker = name
+                    break
+                entries.append((name, self.blobs[root + name]))
+        items = ''.join(
+            f'<Blob><Name>{escape(name)}</Name><Properties>'
+            f'<Last-Modified>{blob["last_modified"]}</Last-Modified>'
+            f'<Etag>{blob["etag"]}</Etag>'
+            f'<Content-Length>{len(blob["content"])}</Content-Length>'
+            f'<Content-Type>{escape(blob["content_type"])}</Content-Type>'
+            f'</Properties></Blob>'
+            for name, blob in entries
+        ) + ''.join(f'<BlobPrefix><Name>{escape(name)}</Name></BlobPrefix>' for name in prefixes)
+        self.count(list_requests=1)
+        return (f'<?xml version="1.0" encoding="utf-8"?><EnumerationResults ContainerName="{escape(container)}">'
+                f'<Prefix>{escape(prefix)}</Prefix><Blobs>{items}</Blobs>'
+                f'<NextMarker>{escape(next_marker or "")}</NextMarker></EnumerationResults>').encode('utf-8')
+
+    def container_bytes(self, container):
+        with self.lock:
+            return sum(len(blob["content"]) for path, blob in self.blobs.items() if path.startswith(f"/{container}/"))
+
+
+def host_overrides(site_server, storage):
+    """HTTP_HOST_OVERRIDES value routing the synthetic hosts and blob account to the stand-ins"""
+    sites = [COLLEGE_OF_POLICING_HOST, CPS_HOST, LEGISLATION_HOST]
+    entries = [f"{host}={site_server.address}" for host in sites] + [f"{STORAGE_HOST}={storage.address}"]
+    return ','.join(entries)
+
+
+def identity_environment(storage):
+    """IDENTITY_ENDPOINT / IDENTITY_HEADER values for the emulated managed identity endpoint"""
+    return {"IDENTITY_ENDPOINT": f"{storage.address}/msi/token", "IDENTITY_HEADER": "stand-in"}
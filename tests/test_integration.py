@@ -22,7 +22,7 @@ class TestEndToEndWorkflow(unittest.TestCase):
     @patch('function_app.store_document_hashes_to_storage')
     @patch('function_app.get_document_hashes_from_storage')
     @patch('function_app.load_websites_config')
-    @patch('function_app.urllib.request.urlopen')
+    @patch('function_app.pooled_urlopen')
     def test_full_crawl_workflow(
         self,
         mock_urlopen,
@@ -283,7 +283,7 @@ class TestErrorRecovery(unittest.TestCase):
 class TestDocumentProcessing(unittest.TestCase):
     """Test document detection and processing integration"""
     
-    @patch('function_app.urllib.request.urlopen')
+    @patch('function_app.pooled_urlopen')
     def test_document_detection_and_hashing(self, mock_urlopen):
         """Test finding documents and calculating hashes"""
         from function_app import find_documents_in_html, calculate_content_hash
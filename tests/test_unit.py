@@ -8,7 +8,7 @@ Tests orchestrator logic, activity functions, and core business logic
 import unittest
 from unittest.mock import Mock, patch, MagicMock, AsyncMock
 import json
-from datetime import datetime, timezone
+from datetime import datetime, timezone, timedelta
 import sys
 import os
 
@@ -26,8 +26,108 @@ from function_app import (
     get_document_hashes_activity,
     crawl_single_website_activity,
     store_document_hashes_activity,
-    store_crawl_history_activity
+    store_crawl_history_activity,
+    HTTPConnectionPool,
+    ManagedIdentityTokenCache,
+    parse_token_expiry,
+    process_documents,
+    HostRateLimiter,
+    parse_retry_after,
+    spool_response_body,
+    get_body_length,
+    upload_to_blob_storage_real,
+    store_document_hashes_to_storage,
+    get_document_hashes_from_storage,
+    load_site_document_hashes,
+    compute_hash_delta,
+    apply_document_hash_deltas,
+    get_url_classifier
 )
+import hashlib
+import http.client
+import io
+import itertools
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+import urllib.parse
+import re
+import function_app
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import xml.etree.ElementTree as ET
+
+
+class _KeepAliveHandler(BaseHTTPRequestHandler):
+    """Minimal HTTP/1.1 handler for exercising the connection pool locally"""
+    protocol_version = 'HTTP/1.1'
+    
+    def do_GET(self):
+        status = 404 if self.path.startswith('/missing') else 200
+        if self.path.startswith('/throttled'):
+            status = 429
+        body = f"path={self.path}".encode('utf-8')
+        self.send_response(status)
+        if status == 429:
+            self.send_header('Retry-After', '0.2')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def do_PUT(self):
+        received = self.rfile.read(int(self.headers['Content-Length']))
+        body = hashlib.md5(received).hexdigest().encode('utf-8')
+        self.send_response(201)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        pass
+
+
+class _BlobStandInHandler(BaseHTTPRequestHandler):
+    """Stand-in blob endpoint implementing Put Blob, Put Block and Put Block List"""
+    protocol_version = 'HTTP/1.1'
+    blocks = {}
+    blobs = {}
+    properties = {}
+    fail_once = set()
+    
+    def do_PUT(self):
+        parsed = urllib.parse.urlparse(self.path)
+        query = urllib.parse.parse_qs(parsed.query)
+        received = self.rfile.read(int(self.headers['Content-Length']))
+        status = 201
+        if query.get('comp') == ['block']:
+            block_id = query['blockid'][0]
+            if block_id in self.fail_once:
+                self.fail_once.discard(block_id)
+                status = 503
+            else:
+                self.blocks[(parsed.path, block_id)] = received
+        elif query.get('comp') == ['blocklist']:
+            block_ids = re.findall(r'<Latest>([^<]+)</Latest>', received.decode('utf-8'))
+            self.blobs[parsed.path] = b''.join(self.blocks.pop((parsed.path, block_id)) for block_id in block_ids)
+            self.properties[parsed.path] = self.headers.get('x-ms-blob-content-type')
+        else:
+            self.blobs[parsed.path] = received
+            self.properties[parsed.path] = self.headers.get('Content-Type')
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+    
+    def log_message(self, format, *args):
+        pass
+
+
+def check_blob_conditions(etags, name, if_match=None, if_none_match=None):
+    """Raise the HTTP errors blob storage returns for failed conditional writes"""
+    if if_match and etags.get(name) != if_match:
+        raise urllib.error.HTTPError(name, 412, "Condition not met", {}, None)
+    if if_none_match == "*" and name in etags:
+        raise urllib.error.HTTPError(name, 409, "Blob already exists", {}, None)
 
 
 class TestConfigurationManagement(unittest.TestCase):
@@ -179,7 +279,7 @@ class TestHashingAndChangeDetection(unittest.TestCase):
 class TestCoreWebsiteCrawling(unittest.TestCase):
     """Test core website crawling logic"""
     
-    @patch('function_app.urllib.request.urlopen')
+    @patch('function_app.pooled_urlopen')
     @patch('function_app.find_documents_in_html')
     def test_crawl_website_core_success(self, mock_find_docs, mock_urlopen):
         """Test successful website crawl"""
@@ -216,7 +316,7 @@ class TestCoreWebsiteCrawling(unittest.TestCase):
         self.assertEqual(result["site_url"], "https://example.com")
         self.assertIn(result["status"], ["success", "no_documents"])
     
-    @patch('function_app.urllib.request.urlopen')
+    @patch('function_app.pooled_urlopen')
     def test_crawl_website_core_http_403(self, mock_urlopen):
         """Test handling of HTTP 403 (blocked)"""
         # Arrange
@@ -245,6 +345,1497 @@ class TestCoreWebsiteCrawling(unittest.TestCase):
         self.assertIn("403", result["error"])
 
 
+class TestHTTPConnectionPool(unittest.TestCase):
+    """Test keep-alive connection reuse in the shared HTTP pool"""
+    
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _KeepAliveHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.pool = HTTPConnectionPool(pool_size=2, max_per_host=2, idle_timeout=30)
+    
+    def tearDown(self):
+        self.pool.close_all()
+        self.server.shutdown()
+        self.server.server_close()
+    
+    def test_sequential_requests_reuse_one_connection(self):
+        """Test that requests to the same host share a single socket"""
+        # Act
+        bodies = []
+        for i in range(3):
+            with self.pool.urlopen(f"{self.base_url}/page{i}", timeout=5) as response:
+                bodies.append(response.read())
+        stats = self.pool.get_stats(self.base_url)
+        
+        # Assert
+        self.assertEqual(bodies[2], b"path=/page2")
+        self.assertEqual(stats["requests"], 3)
+        self.assertEqual(stats["connections_opened"], 1)
+        self.assertEqual(stats["connections_reused"], 2)
+    
+    def test_http_error_raised_and_connection_kept(self):
+        """Test that 4xx responses raise HTTPError without losing the socket"""
+        # Act
+        with self.assertRaises(urllib.error.HTTPError) as ctx:
+            self.pool.urlopen(f"{self.base_url}/missing", timeout=5)
+        with self.pool.urlopen(f"{self.base_url}/ok", timeout=5) as response:
+            response.read()
+        
+        # Assert
+        self.assertEqual(ctx.exception.code, 404)
+        self.assertEqual(self.pool.get_stats(self.base_url)["connections_opened"], 1)
+    
+    def test_idle_timeout_discards_connection(self):
+        """Test that connections idle past the timeout are not reused"""
+        # Arrange
+        self.pool.idle_timeout = 0
+        
+        # Act
+        for _ in range(2):
+            with self.pool.urlopen(f"{self.base_url}/page", timeout=5) as response:
+                response.read()
+        stats = self.pool.get_stats(self.base_url)
+        
+        # Assert
+        self.assertEqual(stats["connections_opened"], 2)
+        self.assertEqual(stats["connections_discarded"], 1)
+    
+    def test_throttle_retry_sleeps_for_unconfigured_host(self):
+        """Test that Retry-After is honoured for a host the rate limiter has no budget for"""
+        # Arrange
+        pool = HTTPConnectionPool(pool_size=2, max_per_host=2, idle_timeout=30, rate_limiter=HostRateLimiter())
+        
+        # Act
+        try:
+            with patch('function_app.time.sleep') as mock_sleep:
+                with self.assertRaises(urllib.error.HTTPError) as ctx:
+                    pool.urlopen(f"{self.base_url}/throttled", timeout=5)
+            stats = pool.get_stats(self.base_url)
+        finally:
+            pool.close_all()
+        
+        # Assert - slept once for the server's delay, then gave up on the second 429
+        self.assertEqual(ctx.exception.code, 429)
+        mock_sleep.assert_called_once_with(0.2)
+        self.assertEqual(stats["requests"], 2)
+    
+    def test_throttle_retry_waits_in_limiter_for_configured_host(self):
+        """Test that a budgeted host's Retry-After is enforced by the limiter, not slept twice"""
+        # Arrange
+        limiter = HostRateLimiter()
+        limiter.configure(self.base_url, requests_per_second=100, burst=10)
+        pool = HTTPConnectionPool(pool_size=2, max_per_host=2, idle_timeout=30, rate_limiter=limiter)
+        
+        # Act
+        started = time.monotonic()
+        try:
+            with self.assertRaises(urllib.error.HTTPError):
+                pool.urlopen(f"{self.base_url}/throttled", timeout=5)
+        finally:
+            pool.close_all()
+        elapsed = time.monotonic() - started
+        
+        # Assert
+        self.assertGreaterEqual(elapsed, 0.2)
+        self.assertGreaterEqual(limiter.get_stats(self.base_url)["wait_seconds"], 0.2)
+    
+    def _stale_connection(self, **failures):
+        """A pooled connection the server has already closed"""
+        stale = MagicMock()
+        stale.getresponse.side_effect = failures.get("on_response", http.client.RemoteDisconnected("closed"))
+        stale.request.side_effect = failures.get("on_send")
+        return patch.object(self.pool, '_checkout', return_value=(stale, True))
+    
+    def test_stale_connection_retries_get(self):
+        """Test that a GET on a closed keep-alive connection is resent on a fresh one"""
+        # Act
+        with self._stale_connection():
+            with self.pool.urlopen(f"{self.base_url}/page", timeout=5) as response:
+                body = response.read()
+        
+        # Assert
+        self.assertEqual(body, b"path=/page")
+        self.assertEqual(self.pool.get_stats(self.base_url)["stale_retries"], 1)
+    
+    def test_stale_connection_does_not_resend_sent_put(self):
+        """Test that a PUT the server may have received is not sent a second time"""
+        # Arrange
+        req = urllib.request.Request(f"{self.base_url}/blob", data=b"content", method='PUT')
+        
+        # Act / Assert
+        with self._stale_connection(), patch.object(self.pool, '_new_connection') as mock_new:
+            with self.assertRaises(urllib.error.URLError):
+                self.pool.urlopen(req, timeout=5)
+        mock_new.assert_not_called()
+    
+    def test_stale_connection_resends_put_that_never_left(self):
+        """Test that a PUT failing while being sent is retried on a fresh connection"""
+        # Arrange
+        req = urllib.request.Request(f"{self.base_url}/blob", data=b"content", method='PUT')
+        
+        # Act
+        with self._stale_connection(on_send=BrokenPipeError("closed")):
+            with self.pool.urlopen(req, timeout=5) as response:
+                body = response.read()
+        
+        # Assert
+        self.assertEqual(body, hashlib.md5(b"content").hexdigest().encode('utf-8'))
+        self.assertEqual(self.pool.get_stats(self.base_url)["stale_retries"], 1)
+
+
+class TestManagedIdentityTokenCache(unittest.TestCase):
+    """Test expiry-aware caching of managed identity tokens"""
+    
+    def test_token_reused_until_refresh_margin(self):
+        """Test that a valid token is served from cache"""
+        # Arrange
+        cache = ManagedIdentityTokenCache(refresh_margin=300)
+        fetch = Mock(return_value=("token-1", time.time() + 3600))
+        
+        # Act
+        tokens = [cache.get_token(fetch) for _ in range(5)]
+        stats = cache.get_stats()
+        
+        # Assert
+        self.assertEqual(tokens, ["token-1"] * 5)
+        fetch.assert_called_once()
+        self.assertEqual(stats["hits"], 4)
+        self.assertEqual(stats["misses"], 1)
+    
+    def test_token_refreshed_inside_margin(self):
+        """Test proactive refresh when the token is close to expiry"""
+        # Arrange
+        cache = ManagedIdentityTokenCache(refresh_margin=300)
+        fetch = Mock(side_effect=[("old", time.time() + 120), ("new", time.time() + 3600)])
+        
+        # Act
+        first = cache.get_token(fetch)
+        second = cache.get_token(fetch)
+        
+        # Assert
+        self.assertEqual((first, second), ("old", "new"))
+        self.assertEqual(fetch.call_count, 2)
+    
+    def test_failed_refresh_falls_back_to_unexpired_token(self):
+        """Test that a failed proactive refresh still returns the current token"""
+        # Arrange
+        cache = ManagedIdentityTokenCache(refresh_margin=300)
+        fetch = Mock(side_effect=[("old", time.time() + 120), (None, 0.0)])
+        
+        # Act
+        cache.get_token(fetch)
+        token = cache.get_token(fetch)
+        
+        # Assert
+        self.assertEqual(token, "old")
+        self.assertEqual(cache.get_stats()["refresh_failures"], 1)
+    
+    def test_concurrent_refreshes_deduplicated(self):
+        """Test that concurrent callers trigger only one token request"""
+        # Arrange
+        cache = ManagedIdentityTokenCache(refresh_margin=300)
+        calls = []
+        
+        def slow_fetch():
+            calls.append(1)
+            time.sleep(0.2)
+            return "shared", time.time() + 3600
+        
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get_token(slow_fetch))) for _ in range(8)]
+        
+        # Act
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        # Assert
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ["shared"] * 8)
+    
+    def test_parse_token_expiry_formats(self):
+        """Test epoch and legacy date string expiry formats"""
+        # Act / Assert
+        self.assertEqual(parse_token_expiry({"expires_on": "1700000000"}), 1700000000.0)
+        self.assertEqual(parse_token_expiry({"expires_on": "11/14/2023 22:13:20 +00:00"}), 1700000000.0)
+        self.assertAlmostEqual(parse_token_expiry({"expires_in": "3600"}), time.time() + 3600, delta=5)
+
+
+class TestConcurrentDocumentPipeline(unittest.TestCase):
+    """Test the bounded concurrent download/upload pipeline"""
+    
+    def _run(self, concurrency):
+        documents = [
+            {"url": f"https://example.com/doc{i}.pdf", "filename": f"doc{i}.pdf", "extension": "pdf"}
+            for i in range(12)
+        ]
+        # Canonical duplicate of doc3 is dropped before download
+        documents.append({"url": "https://EXAMPLE.com/doc3.pdf#page=2", "filename": "doc3.pdf", "extension": "pdf"})
+        # Two URLs whose stored records share a blob name force a filename collision
+        documents.append({"url": "https://example.com/doc12.pdf", "filename": "doc12.pdf", "extension": "pdf"})
+        previous_hashes = {
+            "https://example.com/doc0.pdf": {"hash": calculate_content_hash(b"content-doc0.pdf")},
+            "https://example.com/doc1.pdf": {"hash": "stale"},
+            "https://example.com/doc11.pdf": {"hash": "stale", "unique_filename": "test-site/shared.pdf"},
+            "https://example.com/doc12.pdf": {"hash": "stale", "unique_filename": "test-site/shared.pdf"}
+        }
+        site_config = {"id": "test", "name": "Test Site", "max_concurrent_documents": concurrency}
+        result = {"documents_processed": 0, "documents_new": 0, "documents_changed": 0,
+                  "documents_unchanged": 0, "documents_uploaded": 0}
+        
+        def fake_download(url, etag=None, last_modified=None, stream=False):
+            time.sleep(random.uniform(0, 0.01))
+            content = f"content-{url.split('/')[-1]}".encode('utf-8')
+            return {"success": True, "body": io.BytesIO(content), "hash": calculate_content_hash(content),
+                    "content_type": "application/pdf", "size": len(content)}
+        
+        seen_urls = function_app.URLSeenSet()
+        
+        with patch('function_app.download_document', side_effect=fake_download), \
+             patch('function_app.upload_to_blob_storage_real', return_value={"success": True}) as mock_upload:
+            current_hashes, collisions = process_documents(documents, site_config, previous_hashes, result, seen_urls)
+        
+        for entry in current_hashes.values():
+            entry.pop("last_seen")
+        return current_hashes, collisions, result, mock_upload.call_count, seen_urls.get_stats()
+    
+    def test_concurrent_results_match_sequential(self):
+        """Test that concurrency does not change counts, hashes or collision handling"""
+        # Act
+        sequential = self._run(concurrency=1)
+        concurrent = self._run(concurrency=6)
+        
+        # Assert
+        self.assertEqual(sequential, concurrent)
+        current_hashes, collisions, result, uploads, duplicates = concurrent
+        self.assertEqual(collisions, 1)
+        self.assertEqual(duplicates, {"download": 1, "total": 1})
+        self.assertEqual(result["documents_processed"], 13)
+        self.assertEqual(result["documents_unchanged"], 1)
+        self.assertEqual(result["documents_changed"], 3)
+        self.assertEqual(result["documents_uploaded"], uploads)
+        self.assertEqual(current_hashes["https://example.com/doc11.pdf"]["unique_filename"], "test-site/shared.pdf")
+        self.assertEqual(current_hashes["https://example.com/doc12.pdf"]["unique_filename"], "test-site/shared_collision_1.pdf")
+
+
+class TestStreamingDocumentBodies(unittest.TestCase):
+    """Test chunked download spooling and streamed upload bodies"""
+    
+    def test_large_body_spools_to_disk_with_incremental_hash(self):
+        """Test that bodies past the threshold roll over to a temp file and hash correctly"""
+        # Arrange
+        data = os.urandom(300 * 1024)
+        
+        # Act
+        body, size, content_hash = spool_response_body(io.BytesIO(data), chunk_size=16 * 1024,
+                                                       spool_threshold=64 * 1024)
+        
+        # Assert
+        with body:
+            self.assertTrue(body._rolled)
+            self.assertEqual(size, len(data))
+            self.assertEqual(content_hash, calculate_content_hash(data))
+            self.assertEqual(body.read(), data)
+    
+    def test_small_body_stays_in_memory(self):
+        """Test that bodies under the threshold are not written to disk"""
+        # Act
+        body, size, content_hash = spool_response_body(io.BytesIO(b"small"), spool_threshold=1024)
+        
+        # Assert
+        self.assertFalse(body._rolled)
+        self.assertEqual(size, 5)
+        self.assertEqual(get_body_length(body), 5)
+    
+    def test_file_body_streamed_through_pool(self):
+        """Test that a file object PUT through the pool arrives intact"""
+        # Arrange
+        server = ThreadingHTTPServer(('127.0.0.1', 0), _KeepAliveHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        pool = HTTPConnectionPool(pool_size=2, max_per_host=2, idle_timeout=30)
+        data = os.urandom(200 * 1024)
+        body = io.BytesIO(data)
+        req = urllib.request.Request(f"http://127.0.0.1:{server.server_address[1]}/blob", data=body, method='PUT')
+        req.add_header("Content-Length", str(get_body_length(body)))
+        
+        # Act
+        try:
+            with pool.urlopen(req, timeout=5) as response:
+                echoed = response.read().decode('utf-8')
+        finally:
+            pool.close_all()
+            server.shutdown()
+            server.server_close()
+        
+        # Assert
+        self.assertEqual(echoed, hashlib.md5(data).hexdigest())
+
+
+class TestBlockBlobUpload(unittest.TestCase):
+    """Test chunked Put Block uploads against a stand-in blob endpoint"""
+    
+    def setUp(self):
+        _BlobStandInHandler.blocks.clear()
+        _BlobStandInHandler.blobs.clear()
+        _BlobStandInHandler.fail_once.clear()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _BlobStandInHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        endpoint = f"http://127.0.0.1:{self.server.server_address[1]}/{{account}}"
+        self.patches = [
+            patch('function_app.BLOB_ENDPOINT_URL', endpoint),
+            patch('function_app.BLOB_SINGLE_PUT_THRESHOLD', 64 * 1024),
+            patch('function_app.BLOB_BLOCK_SIZE', 32 * 1024),
+            patch('function_app.BLOB_BLOCK_RETRY_BACKOFF', 0),
+            patch('function_app.get_managed_identity_token', return_value="token")
+        ]
+        for active in self.patches:
+            active.start()
+    
+    def tearDown(self):
+        for active in self.patches:
+            active.stop()
+        self.server.shutdown()
+        self.server.server_close()
+    
+    def test_large_body_uploaded_as_parallel_blocks_with_retry(self):
+        """Test that a large file body is split, a failed block retried and the list committed"""
+        # Arrange
+        data = os.urandom(300 * 1024)
+        _BlobStandInHandler.fail_once.add(function_app.make_block_id(3))
+        
+        # Act
+        result = upload_to_blob_storage_real(io.BytesIO(data), "site/large.pdf", storage_account="acct")
+        
+        # Assert
+        self.assertTrue(result["success"])
+        self.assertEqual(result["upload_mode"], "blocks")
+        self.assertEqual(result["blocks"], 10)
+        self.assertEqual(result["block_retries"], 1)
+        self.assertEqual(_BlobStandInHandler.blobs["/acct/documents/site/large.pdf"], data)
+        self.assertEqual(_BlobStandInHandler.properties["/acct/documents/site/large.pdf"], "application/pdf")
+    
+    def test_small_body_uses_single_put(self):
+        """Test that bodies under the threshold fall back to one Put Blob"""
+        # Act
+        result = upload_to_blob_storage_real(b"small document", "site/small.pdf", storage_account="acct")
+        
+        # Assert
+        self.assertTrue(result["success"])
+        self.assertEqual(result["upload_mode"], "single")
+        self.assertEqual(_BlobStandInHandler.blobs["/acct/documents/site/small.pdf"], b"small document")
+
+
+class TestShardedHashManifest(unittest.TestCase):
+    """Test per-site manifest shards and change-only writes"""
+    
+    def setUp(self):
+        self.blobs = {}
+        self.etags = {}
+        versions = itertools.count(1)
+        self.writes = []
+        
+        def write_blob(name, content, content_type="application/json", *args, if_match=None, if_none_match=None):
+            check_blob_conditions(self.etags, name, if_match, if_none_match)
+            self.etags[name] = f'"v{next(versions)}"'
+            self.writes.append(name)
+            self.blobs[name] = content
+            return True
+        
+        self.patches = [
+            patch('function_app.read_metadata_blob', side_effect=lambda name, *args: self.blobs.get(name)),
+            patch('function_app.read_metadata_blob_with_etag',
+                  side_effect=lambda name, *args: (self.blobs.get(name), self.etags.get(name))),
+            patch('function_app.write_metadata_blob', side_effect=write_blob),
+            patch('function_app.delete_metadata_blob', side_effect=lambda name, *args: self.blobs.pop(name, None) or True)
+        ]
+        for active in self.patches:
+            active.start()
+        self.hashes = {
+            "https://a.example/1.pdf": {"hash": "h1", "unique_filename": "site-a/1_doc.pdf", "last_seen": "t1"},
+            "https://a.example/2.pdf": {"hash": "h2", "unique_filename": "site-a/2_doc.pdf", "last_seen": "t1"},
+            "https://b.example/1.pdf": {"hash": "h3", "unique_filename": "site-b/1_doc.pdf", "last_seen": "t1"}
+        }
+    
+    def tearDown(self):
+        for active in self.patches:
+            active.stop()
+    
+    def test_only_changed_shards_rewritten(self):
+        """Test that unchanged shards are skipped and changed ones rewritten"""
+        # Act
+        self.assertTrue(store_document_hashes_to_storage(self.hashes))
+        first_writes = list(self.writes)
+        self.writes.clear()
+        self.hashes["https://a.example/1.pdf"] = dict(self.hashes["https://a.example/1.pdf"], last_seen="t2")
+        self.assertTrue(store_document_hashes_to_storage(self.hashes))
+        unchanged_writes = list(self.writes)
+        self.writes.clear()
+        self.hashes["https://b.example/1.pdf"] = dict(self.hashes["https://b.example/1.pdf"], hash="h4")
+        self.assertTrue(store_document_hashes_to_storage(self.hashes))
+        
+        # Assert
+        self.assertEqual(sorted(first_writes), ["document-hashes/index.json", "document-hashes/site-a.json.gz",
+                                                "document-hashes/site-b.json.gz"])
+        self.assertEqual(unchanged_writes, [])
+        self.assertEqual(self.writes, ["document-hashes/site-b.json.gz", "document-hashes/index.json"])
+    
+    def test_concurrent_index_writers_keep_each_others_shards(self):
+        """Test that an index write losing an If-Match race re-reads and keeps the other writer's entries"""
+        # Arrange
+        store_document_hashes_to_storage({"https://c.example/1.pdf": {"hash": "h0", "unique_filename": "site-c/1_doc.pdf"}})
+        write_blob = function_app.write_metadata_blob.side_effect
+        raced = []
+        
+        def racing_write(name, *args, **kwargs):
+            if name == "document-hashes/index.json" and not raced:
+                raced.append(name)  # Another writer lands between this writer's read and write
+                store_document_hashes_to_storage({url: record for url, record in self.hashes.items() if "b.example" in url})
+            return write_blob(name, *args, **kwargs)
+        
+        # Act
+        with patch('function_app.write_metadata_blob', side_effect=racing_write):
+            stored = store_document_hashes_to_storage({url: record for url, record in self.hashes.items() if "a.example" in url})
+        
+        # Assert
+        self.assertTrue(stored)
+        self.assertEqual(sorted(json.loads(self.blobs["document-hashes/index.json"])["shards"]), ["site-a", "site-b", "site-c"])
+        self.assertEqual(get_document_hashes_from_storage()["https://c.example/1.pdf"]["hash"], "h0")
+        self.assertEqual(len(get_document_hashes_from_storage()), 4)
+    
+    def test_site_load_reads_only_its_shard(self):
+        """Test lazy per-site loading and full reads across shards"""
+        # Arrange
+        store_document_hashes_to_storage(self.hashes)
+        
+        # Act
+        site_a = load_site_document_hashes("site-a")
+        everything = get_document_hashes_from_storage()
+        
+        # Assert
+        self.assertEqual(sorted(site_a), ["https://a.example/1.pdf", "https://a.example/2.pdf"])
+        self.assertEqual(everything, self.hashes)
+    
+    def test_legacy_manifest_filtered_per_site(self):
+        """Test that an unsharded document-hashes.json is still readable per site"""
+        # Arrange
+        self.blobs["document-hashes.json"] = json.dumps(self.hashes).encode('utf-8')
+        
+        # Act
+        site_b = load_site_document_hashes("site-b")
+        
+        # Assert
+        self.assertEqual(list(site_b), ["https://b.example/1.pdf"])
+    
+    def test_partial_first_sharded_write_migrates_other_sites(self):
+        """Test that the first sharded write carries over legacy records of sites it does not touch"""
+        # Arrange
+        self.blobs["document-hashes.json"] = json.dumps(self.hashes).encode('utf-8')
+        
+        # Act - upsert one unrelated URL, the first write to create the index
+        merged = function_app.merge_document_hashes_to_storage(
+            {"https://c.example/1.pdf": {"hash": "h5", "unique_filename": "site-c/1_doc.pdf"}})
+        site_a = load_site_document_hashes("site-a")
+        site_b = load_site_document_hashes("site-b")
+        
+        # Assert
+        self.assertTrue(merged)
+        self.assertEqual(sorted(json.loads(self.blobs["document-hashes/index.json"])["shards"]),
+                         ["site-a", "site-b", "site-c"])
+        self.assertEqual(sorted(site_a), ["https://a.example/1.pdf", "https://a.example/2.pdf"])
+        self.assertEqual(site_b, {"https://b.example/1.pdf": self.hashes["https://b.example/1.pdf"]})
+        self.assertEqual(len(get_document_hashes_from_storage()), 4)
+
+
+class TestHashDeltas(unittest.TestCase):
+    """Test delta-only manifest updates from crawl activities"""
+    
+    def setUp(self):
+        self.blobs = {}
+        self.etags = {}
+        versions = itertools.count(1)
+        
+        def write_blob(name, content, content_type="application/json", *args, if_match=None, if_none_match=None):
+            check_blob_conditions(self.etags, name, if_match, if_none_match)
+            self.etags[name] = f'"v{next(versions)}"'
+            self.blobs[name] = content
+            return True
+        
+        self.patches = [
+            patch('function_app.read_metadata_blob', side_effect=lambda name, *args: self.blobs.get(name)),
+            patch('function_app.read_metadata_blob_with_etag',
+                  side_effect=lambda name, *args: (self.blobs.get(name), self.etags.get(name))),
+            patch('function_app.write_metadata_blob', side_effect=write_blob),
+            patch('function_app.delete_metadata_blob', return_value=True),
+            patch('function_app.get_manifest_version', return_value='"v1"')
+        ]
+        for active in self.patches:
+            active.start()
+    
+    def tearDown(self):
+        for active in self.patches:
+            active.stop()
+    
+    def _records(self, site, count, version="h"):
+        return {
+            f"https://{site}.example/{i}.pdf": {"hash": f"{version}{i}", "unique_filename": f"{site}/{i}_doc.pdf",
+                                                "last_seen": "2025-01-01T00:00:00+00:00"}
+            for i in range(count)
+        }
+    
+    def test_delta_contains_only_changes(self):
+        """Test that unchanged records are not shipped back to the orchestrator"""
+        # Arrange
+        previous = self._records("site-a", 5)
+        current = {url: dict(record, last_seen="later") for url, record in previous.items()}
+        current["https://site-a.example/0.pdf"]["hash"] = "changed"
+        del current["https://site-a.example/4.pdf"]
+        current["https://site-a.example/new.pdf"] = {"hash": "n", "unique_filename": "site-a/n_new.pdf"}
+        
+        # Act
+        delta = compute_hash_delta("site-a", previous, current, base_version='"v1"')
+        partial = compute_hash_delta("site-a", previous, {}, complete=False)
+        
+        # Assert
+        self.assertEqual(sorted(delta["upserts"]), ["https://site-a.example/0.pdf", "https://site-a.example/new.pdf"])
+        self.assertEqual(delta["removed"], ["https://site-a.example/4.pdf"])
+        self.assertEqual(delta["retained"], 3)
+        self.assertEqual(partial["removed"], [])
+    
+    def test_apply_deltas_merges_into_site_shards(self):
+        """Test that deltas update one site while other sites' records survive"""
+        # Arrange
+        from function_app import store_document_hashes_to_storage
+        store_document_hashes_to_storage({**self._records("site-a", 3), **self._records("site-b", 2)})
+        delta = compute_hash_delta("site-a", self._records("site-a", 3),
+                                   {**self._records("site-a", 2), "https://site-a.example/0.pdf": {
+                                       "hash": "x", "unique_filename": "site-a/0_doc.pdf"}},
+                                   base_version='"v1"', crawled_at="2025-02-01T00:00:00+00:00")
+        
+        # Act
+        self.assertTrue(apply_document_hash_deltas([delta]))
+        everything = get_document_hashes_from_storage()
+        
+        # Assert
+        self.assertEqual(everything["https://site-a.example/2.pdf"]["tombstoned_at"], "2025-02-01T00:00:00+00:00")
+        self.assertEqual(everything["https://site-a.example/2.pdf"]["last_seen"], "2025-01-01T00:00:00+00:00")
+        self.assertEqual(everything["https://site-a.example/0.pdf"]["hash"], "x")
+        self.assertEqual(everything["https://site-a.example/1.pdf"]["last_seen"], "2025-02-01T00:00:00+00:00")
+        self.assertEqual(len([url for url in everything if "site-b" in url]), 2)
+    
+    def test_unvisited_urls_survive_and_tombstones_revive(self):
+        """Test that partial crawls keep unvisited records and returning URLs are not re-uploaded"""
+        # Arrange
+        from function_app import store_document_hashes_to_storage
+        store_document_hashes_to_storage(self._records("site-a", 4))
+        partial = compute_hash_delta("site-a", self._records("site-a", 4), self._records("site-a", 1),
+                                     complete=False, crawled_at="2025-02-01T00:00:00+00:00")
+        complete = compute_hash_delta("site-a", self._records("site-a", 4), self._records("site-a", 3),
+                                      crawled_at="2025-02-02T00:00:00+00:00")
+        
+        # Act
+        apply_document_hash_deltas([partial])
+        after_partial = load_site_document_hashes("site-a")
+        apply_document_hash_deltas([complete])
+        tombstoned = load_site_document_hashes("site-a")
+        revived = compute_hash_delta("site-a", tombstoned, self._records("site-a", 4),
+                                     crawled_at="2025-02-03T00:00:00+00:00")
+        apply_document_hash_deltas([revived])
+        after_revival = load_site_document_hashes("site-a")
+        expired = compute_hash_delta("site-a", self._records("site-a", 4), self._records("site-a", 3),
+                                     crawled_at="2025-02-04T00:00:00+00:00")
+        apply_document_hash_deltas([expired])
+        with patch('function_app.MANIFEST_TOMBSTONE_RETENTION', 3600):
+            purge = compute_hash_delta("site-a", {}, {}, crawled_at="2025-02-05T00:00:00+00:00")
+            apply_document_hash_deltas([purge])
+        
+        # Assert
+        self.assertEqual(len(after_partial), 4)
+        self.assertEqual(tombstoned["https://site-a.example/3.pdf"]["tombstoned_at"], "2025-02-02T00:00:00+00:00")
+        self.assertEqual(tombstoned["https://site-a.example/3.pdf"]["hash"], "h3")
+        self.assertEqual(list(revived["upserts"]), ["https://site-a.example/3.pdf"])
+        self.assertNotIn("tombstoned_at", after_revival["https://site-a.example/3.pdf"])
+        self.assertEqual(sorted(load_site_document_hashes("site-a")),
+                         [f"https://site-a.example/{i}.pdf" for i in range(3)])
+    
+    def test_unreadable_site_records_abort_the_merge(self):
+        """Test that a failed shard read leaves the stored manifest, checkpoints and feed state untouched"""
+        # Arrange
+        from function_app import store_document_hashes_to_storage
+        store_document_hashes_to_storage(self._records("site-a", 4))
+        stored = dict(self.blobs)
+        delta = compute_hash_delta("site-a", {}, {"https://site-a.example/new.pdf": {"hash": "n", "unique_filename": "site-a/n.pdf"}},
+                                   feed_state={"mode": "incremental", "high_water_mark": "2025-02-01T00:00:00+00:00"})
+        delta["checkpoint_units"] = ["discovery"]
+        
+        # Act
+        def flaky_read(name, *args):
+            if name == function_app.manifest_shard_blob("site-a"):
+                raise urllib.error.URLError("timed out")  # Index reads fine, the site's shard does not
+            return self.blobs.get(name)
+        
+        with patch('function_app.read_metadata_blob', side_effect=flaky_read), \
+             patch('function_app.clear_crawl_checkpoints') as mock_clear, \
+             patch('function_app.save_feed_state') as mock_save_feed:
+            applied = apply_document_hash_deltas([delta])
+        
+        # Assert
+        self.assertFalse(applied)
+        self.assertEqual(self.blobs, stored)
+        self.assertEqual(len(load_site_document_hashes("site-a")), 4)
+        mock_clear.assert_not_called()
+        mock_save_feed.assert_not_called()
+    
+    def test_history_payload_constant_size(self):
+        """Measure crawl fan-out payloads: embedded manifest vs manifest reference plus deltas"""
+        # Arrange - 5 sites x 2000 tracked URLs, 1% changed per crawl
+        sites = [f"site-{i}" for i in range(5)]
+        previous = {site: self._records(site, 2000) for site in sites}
+        current = {}
+        for site in sites:
+            current[site] = {url: dict(record) for url, record in previous[site].items()}
+            for url in list(current[site])[:20]:
+                current[site][url]["hash"] = "changed"
+        manifest = {url: record for site in sites for url, record in previous[site].items()}
+        
+        # Act
+        legacy_bytes = sum(len(json.dumps({"site_config": {"name": site}, "previous_hashes": manifest})) +
+                           len(json.dumps({"current_hashes": current[site]})) for site in sites)
+        delta_bytes = sum(len(json.dumps({"site_config": {"name": site}, "manifest_version": '"v1"'})) +
+                          len(json.dumps({"hash_delta": compute_hash_delta(site, previous[site], current[site])}))
+                          for site in sites)
+        
+        # Assert - reference inputs are constant-size, outputs scale with churn not manifest size
+        self.assertLess(delta_bytes * 50, legacy_bytes)
+
+
+class TestURLClassifier(unittest.TestCase):
+    """Test the precompiled link classifier"""
+    
+    def test_matches_original_checks_on_recorded_links(self):
+        """Test predicate equivalence with the original functions on every recorded link"""
+        from tests.benchmark_url_classifier import load_link_sets, find_mismatches
+        
+        # Act / Assert
+        for name, urls in load_link_sets().items():
+            self.assertEqual(find_mismatches(urls), [], name)
+    
+    def test_classify_precedence(self):
+        """Test document / guidance / category / navigation labels"""
+        # Arrange
+        classifier = get_url_classifier()
+        
+        # Act / Assert
+        self.assertEqual(classifier.classify("https://www.college.police.uk/app/armed-policing/legal.pdf"), "document")
+        self.assertEqual(classifier.classify("https://www.college.police.uk/app/armed-policing/legal-framework"), "guidance")
+        self.assertEqual(classifier.classify("https://www.cps.gov.uk/prosecution-guidance/bail-applications"), "guidance")
+        self.assertEqual(classifier.classify("https://www.college.police.uk/app/armed-policing"), "category")
+        self.assertEqual(classifier.classify("https://www.college.police.uk/app/search"), "navigation")
+        self.assertEqual(classifier.classify("https://example.com/publications/annual-report"), "document")
+        self.assertEqual(classifier.classify("https://example.com/about"), "navigation")
+    
+    def test_site_rules_override_defaults(self):
+        """Test per-site url_rules and classifier caching"""
+        # Arrange
+        site_config = {"url_rules": {"document_extensions": [".odt"], "guidance": [r"/guides/[^/]+$"]}}
+        
+        # Act
+        classifier = get_url_classifier(site_config)
+        
+        # Assert
+        self.assertIs(classifier, get_url_classifier(dict(site_config)))
+        self.assertEqual(classifier.document_extension("https://example.com/a.ODT"), "odt")
+        self.assertIsNone(classifier.document_extension("https://example.com/a.pdf"))
+        self.assertEqual(classifier.classify("https://example.com/guides/bail"), "guidance")
+
+
+class TestOfflineCrawlHarness(unittest.TestCase):
+    """Test end-to-end crawls against the local stand-in site and blob servers"""
+
+    def test_parse_host_overrides(self):
+        """Test host override parsing with and without explicit schemes"""
+        # Act
+        overrides = function_app.parse_host_overrides("www.cps.gov.uk=http://127.0.0.1:8080, Blob.Example=localhost:9000,bad")
+
+        # Assert
+        self.assertEqual(overrides, {
+            "www.cps.gov.uk": ("http", "127.0.0.1", 8080),
+            "blob.example": ("http", "localhost", 9000)
+        })
+
+    def test_crawl_website_core_against_stand_in_servers(self):
+        """Test a full legislation crawl, upload and revalidation with no network access"""
+        from tests.stand_in_servers import SyntheticSiteServer, StorageEmulator, host_overrides, identity_environment
+
+        # Arrange
+        with SyntheticSiteServer(legislation_items=3, document_kb=4) as site_server, StorageEmulator() as storage:
+            site_config = site_server.site_configs(requests_per_second=100)[2]
+            overrides = function_app.parse_host_overrides(host_overrides(site_server, storage))
+            with patch.object(function_app.HTTP_POOL, 'host_overrides', overrides), \
+                 patch.dict(os.environ, identity_environment(storage)):
+                function_app.TOKEN_CACHE.clear()
+                self.addCleanup(function_app.HTTP_POOL.close_all)  # Idle sockets point at this test's servers
+
+                # Act
+                first = crawl_website_core(site_config, previous_hashes={})
+                second = crawl_website_core(site_config, previous_hashes=first["current_hashes"])
+                function_app.TOKEN_CACHE.clear()
+
+        # Assert
+        self.assertEqual(first["status"], "success")
+        self.assertEqual(first["documents_uploaded"], 6)
+        documents = [blob for path, blob in storage.blobs.items() if path.endswith(('.pdf', '.xml'))]
+        self.assertEqual(sum(len(blob["content"]) for blob in documents), 6 * 4096)
+        self.assertEqual(second["documents_unchanged"], 6)
+        self.assertEqual(site_server.stats["not_modified"], 6)
+
+
+class TestPaginatedBlobListing(unittest.TestCase):
+    """Test streaming, paginated List Blobs against the storage emulator"""
+    
+    def _storage(self):
+        from tests.stand_in_servers import StorageEmulator
+        storage = StorageEmulator()
+        storage.__enter__()
+        self.addCleanup(storage.__exit__, None, None, None)
+        for i in range(2300):
+            folder = "college-of-policing" if i % 2 else "crown-prosecution-service"
+            storage.put(f"/documents/{folder}/{i:05d}_doc.pdf", b"x" * 10, "application/pdf")
+        storage.put("/documents/college-of-policing/.folder", b"", "text/plain")
+        storage.put("/documents/legacy.pdf", b"y" * 5, "application/pdf")
+        storage.put("/documents/crawl_history.json", b"[]", "application/json")
+        patches = [
+            patch.object(function_app, 'BLOB_ENDPOINT_URL', storage.address),
+            patch.object(function_app, 'get_managed_identity_token', return_value="stand-in-token")
+        ]
+        for active in patches:
+            active.start()
+            self.addCleanup(active.stop)
+        self.addCleanup(function_app.HTTP_POOL.close_all)
+        return storage
+    
+    def test_listing_follows_continuation_markers(self):
+        """Test that listings past 1000 blobs are complete, and prefix listings stay in one folder"""
+        # Arrange
+        storage = self._storage()
+        
+        # Act
+        names = [blob["name"] for blob in function_app.iter_blobs(container="documents", page_size=1000)]
+        pages = storage.stats["list_requests"]
+        site = list(function_app.iter_blobs(container="documents", prefix="college-of-policing/", page_size=1000))
+        top_level = [blob["name"] for blob in function_app.iter_blobs(container="documents", delimiter="/")]
+        
+        # Assert
+        self.assertEqual(len(names), 2303)
+        self.assertEqual(len(set(names)), 2303)
+        self.assertEqual(pages, 3)
+        self.assertEqual(len(site), 1151)
+        self.assertTrue(all(blob["name"].startswith("college-of-policing/") for blob in site))
+        self.assertEqual(site[0]["size"], 0)  # .folder placeholder sorts first
+        self.assertEqual(top_level, ["crawl_history.json", "legacy.pdf"])
+    
+    def test_statistics_and_cleanup_see_every_blob(self):
+        """Test storage statistics, validation and cleanup beyond the first listing page"""
+        # Arrange
+        self._storage()
+        
+        # Act
+        with patch.object(function_app, 'BLOB_LIST_PAGE_SIZE', 1000):
+            stats = function_app.get_storage_statistics()
+            validation = function_app.validate_storage_consistency(2301)
+            cleanup = function_app.delete_uncategorized_documents(dry_run=True)
+        
+        # Assert
+        self.assertEqual(stats["total_documents"], 2301)
+        self.assertEqual(stats["total_size_bytes"], 2300 * 10 + 5)
+        self.assertEqual(stats["site_breakdown"]["Uncategorized (Legacy)"]["count"], 1)
+        self.assertNotIn("files", stats["site_breakdown"]["Uncategorized (Legacy)"])
+        self.assertTrue(validation["match"])
+        self.assertEqual([f["name"] for f in cleanup["files"]], ["legacy.pdf"])
+
+
+class TestStorageStatsIndex(unittest.TestCase):
+    """Test the maintained storage statistics index"""
+    
+    def _storage(self):
+        from tests.stand_in_servers import StorageEmulator
+        storage = StorageEmulator()
+        storage.__enter__()
+        self.addCleanup(storage.__exit__, None, None, None)
+        for i in range(6):
+            folder = "college-of-policing" if i % 2 else "crown-prosecution-service"
+            storage.put(f"/documents/{folder}/{i:05d}_doc.pdf", b"x" * 10, "application/pdf")
+        storage.put("/documents/legacy.pdf", b"y" * 5, "application/pdf")
+        patches = [
+            patch.object(function_app, 'BLOB_ENDPOINT_URL', storage.address),
+            patch.object(function_app, 'get_managed_identity_token', return_value="stand-in-token"),
+            patch('function_app.load_websites_config', return_value={"websites": [{"name": "College of Policing"}]})
+        ]
+        for active in patches:
+            active.start()
+            self.addCleanup(active.stop)
+        self.addCleanup(function_app.HTTP_POOL.close_all)
+        return storage
+    
+    def test_stats_read_index_after_first_reconcile(self):
+        """Test that only the first read lists the container and deltas keep the index current"""
+        # Arrange
+        storage = self._storage()
+        
+        # Act
+        first = function_app.get_indexed_storage_statistics()
+        listings = storage.stats["list_requests"]
+        storage.put("/documents/college-of-policing/new_doc.pdf", b"z" * 7, "application/pdf")
+        storage.delete("/documents/legacy.pdf")
+        delta = function_app.add_storage_delta({}, "college-of-policing/new_doc.pdf", 1, 7)
+        function_app.add_storage_delta(delta, "legacy.pdf", -1, -5, written=False)
+        applied = function_app.apply_storage_stats_delta(delta)
+        second = function_app.get_indexed_storage_statistics()
+        reconciled = function_app.get_indexed_storage_statistics(reconcile=True)
+        
+        # Assert
+        self.assertEqual(first["total_documents"], 7)
+        self.assertEqual(first["site_breakdown"]["College of Policing"]["count"], 3)
+        self.assertTrue(applied)
+        self.assertEqual(storage.stats["list_requests"], listings + 1)  # Only the forced reconcile relisted
+        self.assertEqual(second["total_documents"], 7)
+        self.assertEqual(second["total_size_bytes"], 6 * 10 + 7)
+        self.assertEqual(second["site_breakdown"]["College of Policing"]["count"], 4)
+        self.assertNotIn("Uncategorized (Legacy)", second["site_breakdown"])
+        self.assertEqual(reconciled["index"]["drift"], {})
+    
+    def test_concurrent_index_write_is_retried(self):
+        """Test that a delta written against a stale ETag is reapplied to the latest index"""
+        # Arrange
+        self._storage()
+        function_app.reconcile_storage_stats_index()
+        real_load = function_app.load_storage_stats_index
+        stale = [real_load()]
+        function_app.apply_storage_stats_delta(function_app.add_storage_delta({}, "college-of-policing/a.pdf", 1, 1))
+        
+        def load_once_stale(*args, **kwargs):
+            return stale.pop() if stale else real_load(*args, **kwargs)
+        
+        # Act
+        with patch('function_app.load_storage_stats_index', side_effect=load_once_stale):
+            applied = function_app.apply_storage_stats_delta(
+                function_app.add_storage_delta({}, "college-of-policing/b.pdf", 1, 1))
+        index, _ = function_app.load_storage_stats_index()
+        
+        # Assert
+        self.assertTrue(applied)
+        self.assertEqual(index["folders"]["college-of-policing"]["count"], 5)
+    
+    def test_process_documents_reports_blob_changes(self):
+        """Test that new blobs add to the count and rewritten blobs only change bytes"""
+        # Arrange
+        documents = [{"url": f"https://example.com/doc{i}.pdf", "filename": f"doc{i}.pdf", "extension": "pdf"}
+                     for i in range(3)]
+        previous_hashes = {
+            "https://example.com/doc1.pdf": {"hash": "stale", "unique_filename": "test-site/doc1.pdf", "size": 100},
+            "https://example.com/doc2.pdf": {"hash": calculate_content_hash(b"content-doc2.pdf"),
+                                             "unique_filename": "test-site/doc2.pdf", "size": 16}
+        }
+        result = {"documents_processed": 0, "documents_new": 0, "documents_changed": 0,
+                  "documents_unchanged": 0, "documents_uploaded": 0}
+        
+        def fake_download(url, etag=None, last_modified=None, stream=False):
+            content = f"content-{url.split('/')[-1]}".encode('utf-8')
+            return {"success": True, "body": io.BytesIO(content), "hash": calculate_content_hash(content),
+                    "content_type": "application/pdf", "size": len(content)}
+        
+        # Act
+        with patch('function_app.download_document', side_effect=fake_download), \
+             patch('function_app.upload_to_blob_storage_real', return_value={"success": True, "size": 16}):
+            process_documents(documents, {"id": "test", "name": "Test Site"}, previous_hashes, result)
+        
+        # Assert
+        self.assertEqual(result["storage_delta"], {"test-site": {"count": 1, "bytes": 16 + (16 - 100), "writes": 2}})
+
+
+class TestResponseCache(unittest.TestCase):
+    """Test TTL caching and ETag revalidation for the stats endpoint"""
+    
+    def _request(self, etag=None):
+        import azure.functions as func
+        headers = {"If-None-Match": etag} if etag else {}
+        return func.HttpRequest(method='GET', url='/api/api/stats', headers=headers, body=b'')
+    
+    def setUp(self):
+        cache = function_app.ResponseCache(ttl=60)
+        active = patch.object(function_app, 'RESPONSE_CACHE', cache)
+        active.start()
+        self.addCleanup(active.stop)
+        self.cache = cache
+    
+    @patch('function_app.get_crawl_history', return_value=[])
+    @patch('function_app.get_indexed_storage_statistics', return_value={"total_documents": 3})
+    @patch('function_app.get_enabled_websites', return_value=[])
+    def test_polls_hit_cache_and_revalidate_with_304(self, mock_sites, mock_storage, mock_history):
+        """Test that repeat polls are served from cache and a matching ETag gets an empty 304"""
+        # Act
+        first = function_app.api_stats(self._request())
+        etag = first.headers["ETag"]
+        second = function_app.api_stats(self._request())
+        revalidated = function_app.api_stats(self._request(etag))
+        stats = self.cache.get_stats()
+        
+        # Assert
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.headers["X-Cache"], "MISS")
+        self.assertEqual(second.headers["X-Cache"], "HIT")
+        self.assertEqual(second.get_body(), first.get_body())
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(revalidated.get_body(), b'')
+        self.assertEqual(mock_storage.call_count, 1)
+        self.assertEqual(stats["hits"], 2)
+        self.assertEqual(stats["not_modified"], 1)
+        self.assertEqual(stats["hit_rate_percent"], 66.67)
+    
+    @patch('function_app.get_crawl_history', return_value=[])
+    @patch('function_app.get_enabled_websites', return_value=[])
+    def test_crawl_completion_invalidates(self, mock_sites, mock_history):
+        """Test that invalidation recomputes, keeping the ETag while the data is unchanged"""
+        # Arrange
+        with patch('function_app.get_indexed_storage_statistics', return_value={"total_documents": 3}):
+            etag = function_app.api_stats(self._request()).headers["ETag"]
+            
+            # Act - recomputed payload differs only in its timestamp
+            self.cache.invalidate()
+            unchanged = function_app.api_stats(self._request(etag))
+        with patch('function_app.get_indexed_storage_statistics', return_value={"total_documents": 4}):
+            self.cache.invalidate()
+            changed = function_app.api_stats(self._request(etag))
+        
+        # Assert
+        self.assertEqual(unchanged.status_code, 304)
+        self.assertEqual(unchanged.headers["X-Cache"], "MISS")
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed.headers["ETag"], etag)
+        self.assertEqual(json.loads(changed.get_body())["storage"]["total_documents"], 4)
+    
+    @patch('function_app.get_crawl_history', return_value=[])
+    @patch('function_app.get_indexed_storage_statistics', return_value={"error": "Authentication failed"})
+    @patch('function_app.get_enabled_websites', return_value=[])
+    def test_storage_errors_are_not_cached(self, mock_sites, mock_storage, mock_history):
+        """Test that a payload built without storage access is recomputed on the next poll"""
+        # Act
+        function_app.api_stats(self._request())
+        function_app.api_stats(self._request())
+        
+        # Assert
+        self.assertEqual(mock_storage.call_count, 2)
+
+
+class TestFrontierCrawler(unittest.TestCase):
+    """Test rule-driven frontier discovery"""
+
+    def test_websites_json_rules_match_legacy_flags(self):
+        """Test that each site's declarative rules equal the rules derived from its legacy flags"""
+        # Arrange
+        with open(os.path.join(os.path.dirname(__file__), '..', 'websites.json'), 'r', encoding='utf-8') as f:
+            sites = [site for site in json.load(f)["websites"] if "discovery" in site]
+
+        # Act / Assert
+        self.assertTrue(sites)
+        for site in sites:
+            legacy = {key: value for key, value in site.items() if key != "discovery"}
+            self.assertEqual(function_app.get_discovery_rules(legacy), site["discovery"], site["id"])
+
+    def test_discovery_order_limits_and_seeds(self):
+        """Test guidance cap enforced on the fly, A-Z seeds and discovery-order output"""
+        from tests.stand_in_servers import SyntheticSiteServer, StorageEmulator, host_overrides
+
+        # Arrange
+        with SyntheticSiteServer(categories=25, topics_per_category=4, cps_topics_per_letter=2) as site_server, \
+             StorageEmulator() as storage:
+            college, cps, _ = site_server.site_configs(requests_per_second=1000)
+            college["max_guidance_pages"] = 30
+            overrides = function_app.parse_host_overrides(host_overrides(site_server, storage))
+            with patch.object(function_app.HTTP_POOL, 'host_overrides', overrides):
+                self.addCleanup(function_app.HTTP_POOL.close_all)
+
+                # Act
+                college_result = function_app.FrontierCrawler(college).run()
+                college_requests = site_server.stats["requests"]
+                cps_result = function_app.FrontierCrawler(cps).run()
+
+        # Assert
+        college_urls = [doc["url"] for doc in college_result["documents"]]
+        # 30 guidance pages at 4 per category: the cap is met on the 8th of 20 category pages
+        self.assertEqual(college_result["stats"]["pages_by_kind"], {"start": 1, "category": 8})
+        self.assertEqual(college_result["stats"]["pages_cancelled"], 12)
+        self.assertLessEqual(college_requests, 1 + 8 + 4)  # At most one concurrency window past the cap
+        self.assertEqual(len(college_urls), 30)
+        self.assertEqual(college_urls[:5], [f"https://www.college.police.uk/app/category-0/topic-{j}" for j in range(4)]
+                         + ["https://www.college.police.uk/app/category-1/topic-0"])
+        self.assertEqual(cps_result["stats"]["pages_by_kind"], {"start": 1, "index": 26})
+        self.assertEqual(len(cps_result["documents"]), 52)
+        self.assertTrue(all(doc["type"] == "html_guidance" for doc in cps_result["documents"]))
+
+
+class TestStreamedDiscovery(unittest.TestCase):
+    """Test discovery streaming into the document pipeline"""
+
+    def test_cps_guidance_processing_starts_before_index_pages_finish(self):
+        """Test that A-Z index results are captured while later index pages are still being fetched"""
+        from tests.stand_in_servers import SyntheticSiteServer, StorageEmulator, host_overrides, identity_environment
+
+        # Arrange
+        page_done, capture_started = [], []
+        fetch_page = function_app.FrontierCrawler._fetch_page
+        fetch_document = function_app.fetch_document_for_processing
+
+        def timed_fetch_page(crawler, url, kind):
+            links = fetch_page(crawler, url, kind)
+            page_done.append(time.perf_counter())
+            return links
+
+        def timed_fetch_document(*args, **kwargs):
+            capture_started.append(time.perf_counter())
+            return fetch_document(*args, **kwargs)
+
+        with SyntheticSiteServer(cps_topics_per_letter=2, latency_ms=20) as site_server, StorageEmulator() as storage:
+            cps = site_server.site_configs(requests_per_second=1000, max_concurrent_documents=2)[1]
+            overrides = function_app.parse_host_overrides(host_overrides(site_server, storage))
+            with patch.object(function_app.HTTP_POOL, 'host_overrides', overrides), \
+                 patch.dict(os.environ, identity_environment(storage)), \
+                 patch.object(function_app.FrontierCrawler, '_fetch_page', timed_fetch_page), \
+                 patch('function_app.fetch_document_for_processing', side_effect=timed_fetch_document):
+                function_app.TOKEN_CACHE.clear()
+                self.addCleanup(function_app.HTTP_POOL.close_all)
+
+                # Act
+                result = crawl_website_core(cps, previous_hashes={})
+                function_app.TOKEN_CACHE.clear()
+
+        # Assert
+        self.assertEqual(result["status"], "success")
+        self.assertEqual(result["documents_found"], 52)
+        self.assertEqual(result["documents_uploaded"], 52)
+        self.assertEqual(result["discovery"]["pages_by_kind"], {"start": 1, "index": 26})
+        self.assertLess(min(capture_started), max(page_done))
+
+
+class TestDiscoveryBudget(unittest.TestCase):
+    """Test that discovery stops fetching once caps are met and reports the skipped work"""
+
+    def _servers(self, **site_options):
+        from tests.stand_in_servers import SyntheticSiteServer, StorageEmulator, host_overrides, identity_environment
+        site_server = SyntheticSiteServer(**site_options)
+        storage = StorageEmulator()
+        for server in (site_server, storage):
+            server.__enter__()
+            self.addCleanup(server.__exit__, None, None, None)
+        overrides = function_app.parse_host_overrides(host_overrides(site_server, storage))
+        for active in (patch.object(function_app.HTTP_POOL, 'host_overrides', overrides),
+                       patch.dict(os.environ, identity_environment(storage))):
+            active.start()
+            self.addCleanup(active.stop)
+        function_app.TOKEN_CACHE.clear()
+        self.addCleanup(function_app.TOKEN_CACHE.clear)
+        self.addCleanup(function_app.HTTP_POOL.close_all)
+        return site_server
+
+    def test_capped_az_index_skips_remaining_letters(self):
+        """Test that CPS A-Z pages past the guidance cap are not fetched and are reported"""
+        # Arrange
+        site_server = self._servers(cps_topics_per_letter=2)
+        cps = site_server.site_configs(requests_per_second=1000)[1]
+        cps["max_guidance_pages"] = 5
+
+        # Act
+        result = crawl_website_core(cps, previous_hashes={})
+
+        # Assert
+        self.assertEqual(result["status"], "success")
+        self.assertEqual(result["documents_found"], 5)
+        self.assertEqual(result["discovery"]["pages_by_kind"], {"start": 1, "index": 3})
+        self.assertEqual(result["discovery_skipped"],
+                         {"pages_cancelled": 23, "pages_over_max_pages": 0, "items_over_limit": 1})
+        self.assertLessEqual(site_server.stats["requests"], 1 + 3 + 4 + 5)  # Pages, one look-ahead window, captures
+
+    def test_follow_links_into_exhausted_kind_are_not_scheduled(self):
+        """Test that pages of a kind whose budget is already met are counted instead of queued"""
+        # Arrange
+        self._servers(categories=25, topics_per_category=4)
+        site_config = {"url": "https://www.college.police.uk/app", "name": "Budget Test", "capture_html_guidance": True,
+                       "discovery": {
+                           "seeds": [{"url": "{site_url}/category-0", "page": "category"},
+                                     {"url": "{site_url}", "page": "start"}],
+                           "pages": {
+                               "category": {"guidance": True, "max_items": 4},
+                               "start": {"documents": True, "required": True,
+                                         "follow": [{"links": "category", "page": "category", "limit": 20}]}
+                           }
+                       }}
+
+        # Act
+        crawler = function_app.FrontierCrawler(site_config)
+        documents = crawler.run()["documents"]
+
+        # Assert
+        self.assertEqual(len(documents), 4)
+        self.assertEqual(crawler.stats["pages_by_kind"], {"category": 1, "start": 1})
+        self.assertEqual(function_app.discovery_skipped_work(crawler.stats)["pages_cancelled"], 20)
+
+
+class TestSitemapDiscovery(unittest.TestCase):
+    """Test sitemap-driven discovery and lastmod-based download skipping"""
+
+    def setUp(self):
+        from tests.stand_in_servers import SyntheticSiteServer, StorageEmulator, host_overrides, identity_environment, LEGISLATION_HOST
+        self.site_server = SyntheticSiteServer(legislation_items=5, document_kb=1)
+        storage = StorageEmulator()
+        for server in (self.site_server, storage):
+            server.__enter__()
+            self.addCleanup(server.__exit__, None, None, None)
+        overrides = function_app.parse_host_overrides(host_overrides(self.site_server, storage))
+        for active in (patch.object(function_app.HTTP_POOL, 'host_overrides', overrides),
+                       patch.dict(os.environ, identity_environment(storage))):
+            active.start()
+            self.addCleanup(active.stop)
+        function_app.TOKEN_CACHE.clear()
+        self.addCleanup(function_app.TOKEN_CACHE.clear)
+        self.addCleanup(function_app.HTTP_POOL.close_all)
+        self.site_config = {"id": "sitemap_test", "name": "Sitemap Legislation", "requests_per_second": 1000, "burst": 10,
+                            "url": f"https://{LEGISLATION_HOST}/new",
+                            "sitemaps": [f"https://{LEGISLATION_HOST}/sitemap.xml"]}
+
+    def test_sitemap_index_and_gzipped_sitemaps_are_discovered(self):
+        """Test that a sitemap index is followed into plain and gzipped sitemaps, keeping lastmod"""
+        # Act
+        documents = function_app.FrontierCrawler(self.site_config).run()["documents"]
+
+        # Assert
+        self.assertEqual(len(documents), 10)
+        self.assertEqual({doc["extension"] for doc in documents}, {"pdf", "xml"})
+        self.assertTrue(all(doc["lastmod"] == "2025-01-01" for doc in documents))
+
+    def test_urls_unmodified_since_last_seen_are_not_downloaded(self):
+        """Test that only URLs whose lastmod is newer than the manifest's last_seen are fetched"""
+        # Arrange
+        first = crawl_website_core(self.site_config, previous_hashes={})
+        self.site_server.sitemap_lastmod["/uksi/2025/3/data.pdf"] = "2099-01-01T00:00:00Z"
+        requests_before = self.site_server.stats["requests"]
+
+        # Act
+        second = crawl_website_core(self.site_config, previous_hashes=first["current_hashes"])
+
+        # Assert
+        self.assertEqual(first["documents_uploaded"], 10)
+        self.assertEqual(second["status"], "success")
+        self.assertEqual(second["documents_unchanged"], 10)
+        self.assertEqual(second["revalidation"]["lastmod_skipped"], 9)
+        self.assertEqual(set(second["current_hashes"]), set(first["current_hashes"]))
+        self.assertEqual(self.site_server.stats["requests"] - requests_before, 3 + 1)  # Sitemaps + one document
+
+    def test_date_only_lastmod_covers_the_whole_day(self):
+        """Test that a date-only lastmod is not treated as older than a visit later that day"""
+        # Arrange
+        record = {"hash": "abc", "unique_filename": "site/doc.pdf", "last_seen": "2025-01-01T10:00:00+00:00"}
+
+        # Act / Assert
+        self.assertFalse(function_app.unchanged_since_last_seen({"lastmod": "2025-01-01"}, record))
+        self.assertTrue(function_app.unchanged_since_last_seen({"lastmod": "2024-12-31"}, record))
+        self.assertTrue(function_app.unchanged_since_last_seen({"lastmod": "2025-01-01T09:00Z"}, record))
+        self.assertFalse(function_app.unchanged_since_last_seen({}, record))
+        self.assertFalse(function_app.unchanged_since_last_seen({"lastmod": "2024-12-31"}, dict(record, tombstoned_at="x")))
+
+
+class TestFeedDiscovery(unittest.TestCase):
+    """Test feed-driven incremental discovery with a periodic full-crawl fallback"""
+
+    def setUp(self):
+        from tests.stand_in_servers import SyntheticSiteServer, StorageEmulator, host_overrides, identity_environment, LEGISLATION_HOST
+        self.site_server = SyntheticSiteServer(legislation_items=25, document_kb=1)
+        storage = StorageEmulator()
+        for server in (self.site_server, storage):
+            server.__enter__()
+            self.addCleanup(server.__exit__, None, None, None)
+        overrides = function_app.parse_host_overrides(host_overrides(self.site_server, storage))
+        for active in (patch.object(function_app.HTTP_POOL, 'host_overrides', overrides),
+                       patch.dict(os.environ, identity_environment(storage))):
+            active.start()
+            self.addCleanup(active.stop)
+        function_app.TOKEN_CACHE.clear()
+        self.addCleanup(function_app.TOKEN_CACHE.clear)
+        self.addCleanup(function_app.HTTP_POOL.close_all)
+        self.site_config = {"id": "feed_test", "name": "Feed Legislation", "requests_per_second": 1000, "burst": 10,
+                            "url": f"https://{LEGISLATION_HOST}/new", "feeds": ["{site_url}/data.feed"]}
+
+    def _crawl_and_apply(self):
+        result = function_app.crawl_single_website_activity({"site_config": self.site_config})
+        self.assertTrue(function_app.apply_document_hash_deltas([result["hash_delta"]]))
+        return result
+
+    def test_incremental_crawl_fetches_only_items_updated_since_high_water_mark(self):
+        """Test that after a full crawl only newly updated feed items are fetched, and nothing is tombstoned"""
+        # Arrange
+        full = self._crawl_and_apply()
+        updated_at = (datetime.now(timezone.utc) + timedelta(minutes=5)).isoformat()
+        self.site_server.feed_updated[7] = updated_at
+        requests_before = self.site_server.stats["requests"]
+
+        # Act
+        incremental = self._crawl_and_apply()
+
+        # Assert
+        self.assertEqual(full["feed_state"]["mode"], "full")
+        self.assertEqual(full["documents_uploaded"], 50)
+        self.assertEqual(incremental["status"], "success")
+        self.assertEqual(incremental["feed_state"]["mode"], "incremental")
+        self.assertEqual(incremental["documents_found"], 2)
+        self.assertEqual(incremental["hash_delta"]["removed"], [])
+        self.assertEqual(self.site_server.stats["requests"] - requests_before, 1 + 2)  # First feed page + two documents
+        state = function_app.load_feed_state(function_app.get_site_folder(self.site_config["name"]))
+        self.assertEqual(state["high_water_mark"], datetime.fromisoformat(updated_at).isoformat())
+        self.assertEqual(len(function_app.load_site_document_hashes(function_app.get_site_folder(self.site_config["name"]))), 50)
+
+    def test_no_updates_is_a_successful_empty_crawl(self):
+        """Test that an incremental crawl with nothing new succeeds without fetching documents"""
+        # Arrange
+        self._crawl_and_apply()
+
+        # Act
+        result = self._crawl_and_apply()
+
+        # Assert
+        self.assertEqual(result["status"], "success")
+        self.assertEqual(result["documents_found"], 0)
+        self.assertEqual(result["discovery"]["feed_entries_old"], 10)
+
+    def test_full_crawl_runs_again_once_interval_has_passed(self):
+        """Test the scheduled fallback to a full crawl"""
+        # Arrange
+        self.site_config["full_crawl_interval_hours"] = 0
+        self._crawl_and_apply()
+
+        # Act
+        result = self._crawl_and_apply()
+
+        # Assert
+        self.assertEqual(result["feed_state"]["mode"], "full")
+        self.assertEqual(result["documents_found"], 50)  # Every item from the listing page, not the feed
+
+    def test_undated_and_badly_dated_entries_are_kept(self):
+        """Test that entries without a readable date count as updated instead of failing the feed page"""
+        # Arrange
+        feed = ('<feed xmlns="http://www.w3.org/2005/Atom" xmlns:dc="http://purl.org/dc/elements/1.1/">'
+                '<link rel="next" href="/feed?page=2"/>'
+                '<entry><title>Undated</title><link href="https://example.org/undated.pdf"/></entry>'
+                '<entry><dc:date>2024</dc:date><link href="https://example.org/year-only.pdf"/></entry>'
+                '<entry><updated>01/02/2025</updated><link href="https://example.org/not-iso.pdf"/></entry>'
+                '<entry><updated>2024-06-01T00:00:00Z</updated><link href="https://example.org/old.pdf"/></entry>'
+                '</feed>').encode('utf-8')
+        response = MagicMock()
+        response.read.side_effect = io.BytesIO(feed).read
+        response.info.return_value = {}
+        crawler = function_app.FrontierCrawler({"url": "https://example.org/feed", "name": "Dates"})
+        
+        # Act
+        links = crawler._extract_feed_links("https://example.org/feed", response, since="2025-01-01T00:00:00+00:00")
+        
+        # Assert
+        self.assertEqual([link["url"] for link in links],
+                         ["https://example.org/undated.pdf", "https://example.org/year-only.pdf", "https://example.org/not-iso.pdf"])
+        self.assertEqual(crawler.stats["feed_entries_old"], 1)
+    
+    def test_rss_items_use_link_enclosure_and_pub_date(self):
+        """Test RSS item parsing"""
+        # Arrange
+        item = ET.fromstring('<item><title>A</title><link>https://example.org/a</link>'
+                             '<enclosure url="https://example.org/a.pdf" type="application/pdf"/>'
+                             '<pubDate>Wed, 01 Jan 2025 10:00:00 GMT</pubDate></item>')
+
+        # Act / Assert
+        self.assertEqual(function_app.feed_entry_links(item), ["https://example.org/a", "https://example.org/a.pdf"])
+        self.assertEqual(function_app.feed_entry_updated(item), "2025-01-01T10:00:00+00:00")
+
+
+class TestURLCanonicalization(unittest.TestCase):
+    """Test canonical URLs and the per-crawl seen-set"""
+
+    def test_canonicalize_url_variants(self):
+        """Test that case, default port, fragment, dot segments, slash and query order collapse"""
+        # Arrange
+        variants = [
+            "https://www.cps.gov.uk/prosecution-guidance/bail?b=2&a=1",
+            "HTTPS://WWW.CPS.GOV.UK:443/prosecution-guidance/bail/?a=1&b=2",
+            "https://www.cps.gov.uk/prosecution-guidance/./x/../bail?a=1&b=2#section-3",
+        ]
+
+        # Act
+        canonical = {function_app.canonicalize_url(url) for url in variants}
+
+        # Assert
+        self.assertEqual(canonical, {"https://www.cps.gov.uk/prosecution-guidance/bail?a=1&b=2"})
+        self.assertEqual(function_app.canonicalize_url("https://example.com"), "https://example.com/")
+        self.assertEqual(function_app.canonicalize_url("mailto:someone@example.com"), "mailto:someone@example.com")
+
+    def test_sub_documents_deduplicated_against_level_one(self):
+        """Test one seen-set across page kinds, with duplicates avoided reported"""
+        # Arrange
+        pages = {
+            "https://example.com/publications": '<a href="/files/a.pdf">A</a><a href="/files/a.pdf#p2">A</a>'
+                                                '<a href="/report/download">Report</a>',
+            "https://example.com/report/download": '<a href="https://EXAMPLE.com/files/a.pdf">A</a>'
+                                                   '<a href="/files/b.pdf">B</a>',
+        }
+
+        class StubFrontier(function_app.FrontierCrawler):
+            def _fetch_page(self, url, kind):
+                return self._extract_links(url, pages.get(url, ""))  # PDFs have no links
+
+        site_config = {"url": "https://example.com/publications", "multi_level": True, "max_depth": 2}
+
+        # Act
+        discovery = StubFrontier(site_config).run()
+
+        # Assert
+        self.assertEqual([doc["url"] for doc in discovery["documents"]],
+                         ["https://example.com/files/a.pdf", "https://example.com/report/download",
+                          "https://example.com/files/b.pdf"])
+        self.assertEqual(discovery["stats"]["pages_by_kind"], {"start": 1, "document_page": 2})
+        self.assertEqual(discovery["stats"]["duplicates_avoided"], {"document": 2, "page": 1, "total": 3})
+
+
+class TestCrawlTrace(unittest.TestCase):
+    """Test per-phase timing spans recorded during a crawl"""
+
+    def test_spans_aggregate_per_phase_and_merge_across_sites(self):
+        """Test count/total/max aggregation and cross-site merging"""
+        # Arrange
+        trace = function_app.CrawlTrace()
+
+        # Act
+        trace.add("upload", 0.5)
+        trace.add("upload", 1.5)
+        with function_app.trace_span("download"):
+            pass  # No active trace - not recorded anywhere
+        merged = function_app.merge_trace_phases([trace.to_dict(), {"upload": {"count": 1, "total_seconds": 1.0, "max_seconds": 1.0}}])
+
+        # Assert
+        self.assertEqual(trace.to_dict(), {"upload": {"count": 2, "total_seconds": 2.0, "max_seconds": 1.5}})
+        self.assertEqual(merged["upload"], {"count": 3, "total_seconds": 3.0, "max_seconds": 1.5})
+
+    def test_crawl_result_includes_phase_spans(self):
+        """Test that pipeline-thread spans (download, hash, upload, HTTP) reach the site trace"""
+        from tests.stand_in_servers import SyntheticSiteServer, StorageEmulator, host_overrides, identity_environment
+
+        # Arrange
+        with SyntheticSiteServer(legislation_items=2, document_kb=4) as site_server, StorageEmulator() as storage:
+            site_config = site_server.site_configs(requests_per_second=100)[2]
+            overrides = function_app.parse_host_overrides(host_overrides(site_server, storage))
+            with patch.object(function_app.HTTP_POOL, 'host_overrides', overrides), \
+                 patch.dict(os.environ, identity_environment(storage)):
+                function_app.TOKEN_CACHE.clear()
+                self.addCleanup(function_app.HTTP_POOL.close_all)  # Idle sockets point at this test's servers
+
+                # Act
+                result = crawl_website_core(site_config, previous_hashes={})
+                function_app.TOKEN_CACHE.clear()
+
+        # Assert
+        trace = result["trace"]
+        for phase in ("crawl", "discovery.start", "parse", "download", "hash", "upload",
+                      "token_request", "http.ttfb", "http.body", "process_documents"):
+            self.assertIn(phase, trace)
+        self.assertEqual(trace["download"]["count"], 4)
+        self.assertEqual(trace["upload"]["count"], 4)
+        self.assertIsNone(function_app.ACTIVE_TRACE.get())
+
+
+class TestHostRateLimiter(unittest.TestCase):
+    """Test per-host token-bucket politeness scheduling"""
+    
+    def test_burst_then_rate_limited(self):
+        """Test that requests beyond the burst wait for the refill rate"""
+        # Arrange
+        limiter = HostRateLimiter()
+        limiter.configure("https://slow.example.com/", requests_per_second=10, burst=2)
+        
+        # Act
+        started = time.monotonic()
+        for _ in range(4):
+            limiter.acquire("https://slow.example.com/page")
+        elapsed = time.monotonic() - started
+        
+        # Assert - 2 immediate, then 2 more at 10 req/s
+        self.assertGreaterEqual(elapsed, 0.18)
+        self.assertEqual(limiter.get_stats("https://slow.example.com/")["requests"], 4)
+    
+    def test_hosts_are_independent_and_unconfigured_hosts_unlimited(self):
+        """Test that one host's budget does not delay another host"""
+        # Arrange
+        limiter = HostRateLimiter()
+        limiter.configure("https://a.example.com/", requests_per_second=0.5, burst=1)
+        limiter.acquire("https://a.example.com/1")
+        
+        # Act
+        waited_other = limiter.acquire("https://b.example.com/1")
+        
+        # Assert
+        self.assertEqual(waited_other, 0.0)
+        self.assertEqual(limiter.get_stats("https://b.example.com/"), {})
+    
+    def test_throttle_response_backs_off(self):
+        """Test that 429 halves the rate and honours Retry-After"""
+        # Arrange
+        limiter = HostRateLimiter()
+        limiter.configure("https://busy.example.com/", requests_per_second=4, burst=4)
+        
+        # Act
+        limiter.record_response("https://busy.example.com/x", 429, "0.2")
+        waited = limiter.acquire("https://busy.example.com/y")
+        stats = limiter.get_stats("https://busy.example.com/")
+        
+        # Assert
+        self.assertGreaterEqual(waited, 0.2)
+        self.assertEqual(stats["requests_per_second"], 2.0)
+        self.assertEqual(stats["throttled_responses"], 1)
+        self.assertEqual(parse_retry_after("120"), 120.0)
+        self.assertIsNone(parse_retry_after("not-a-date"))
+
+
+class TestConditionalRevalidation(unittest.TestCase):
+    """Test ETag / Last-Modified revalidation of previously seen documents"""
+    
+    def test_not_modified_carries_previous_record_forward(self):
+        """Test that a 304 is treated as unchanged without downloading the body"""
+        # Arrange
+        url = "https://example.com/doc.pdf"
+        previous_hashes = {
+            url: {"filename": "doc.pdf", "unique_filename": "test-site/abc_doc.pdf", "hash": "h1",
+                  "size": 2048, "etag": '"v1"', "last_modified": "Mon, 01 Jan 2024 00:00:00 GMT"}
+        }
+        documents = [{"url": url, "filename": "doc.pdf", "extension": "pdf"}]
+        result = {"documents_processed": 0, "documents_new": 0, "documents_changed": 0,
+                  "documents_unchanged": 0, "documents_uploaded": 0}
+        
+        not_modified = MagicMock()
+        not_modified.status = 304
+        not_modified.headers = {}
+        
+        # Act
+        with patch('function_app.pooled_urlopen') as mock_urlopen, \
+             patch('function_app.upload_to_blob_storage_real') as mock_upload:
+            mock_urlopen.return_value.__enter__.return_value = not_modified
+            current_hashes, _ = process_documents(documents, {"name": "Test Site"}, previous_hashes, result)
+            sent_request = mock_urlopen.call_args[0][0]
+        
+        # Assert
+        self.assertEqual(sent_request.get_header('If-none-match'), '"v1"')
+        self.assertEqual(sent_request.get_header('If-modified-since'), "Mon, 01 Jan 2024 00:00:00 GMT")
+        mock_upload.assert_not_called()
+        self.assertEqual(result["documents_unchanged"], 1)
+        self.assertEqual(current_hashes[url]["hash"], "h1")
+        self.assertEqual(current_hashes[url]["etag"], '"v1"')
+        self.assertEqual(result["revalidation"]["bytes_saved"], 2048)
+        self.assertEqual(result["revalidation"]["not_modified_rate_percent"], 100.0)
+
+
 class TestActivityFunctions(unittest.TestCase):
     """Test Durable Functions activity wrappers"""
     
@@ -296,9 +1887,9 @@ class TestActivityFunctions(unittest.TestCase):
         self.assertEqual(result, mock_result)
         mock_crawl_core.assert_called_once()
     
-    @patch('function_app.store_document_hashes_to_storage')
+    @patch('function_app.merge_document_hashes_to_storage')
     def test_store_document_hashes_activity(self, mock_store_hashes):
-        """Test storing document hashes activity"""
+        """Test storing document hashes activity merges into the manifest"""
         # Arrange
         hashes = {"url1": {"hash": "abc123"}}
         mock_store_hashes.return_value = True
@@ -325,6 +1916,191 @@ class TestActivityFunctions(unittest.TestCase):
         mock_store_history.assert_called_once_with(summary)
 
 
+class TestDocumentBatchFanOut(unittest.TestCase):
+    """Test per-site discovery plus document batch fan-out in the orchestrator"""
+    
+    def _discovery(self, documents):
+        return {
+            "site_name": "Test Site", "site_url": "https://test.example", "status": "discovered",
+            "documents_found": len(documents), "documents": documents, "error": None,
+            "trace": {"discovery.start": {"count": 1, "total_seconds": 0.5, "max_seconds": 0.5}},
+            "hash_delta": {"site_folder": "test-site", "base_version": '"v1"', "crawled_at": "2025-02-01T00:00:00+00:00",
+                           "complete": True, "upserts": {}, "removed": ["https://test.example/gone.pdf"], "retained": 0}
+        }
+    
+    def _batch(self, index, status="success", uploaded=1):
+        return {
+            "batch_index": index, "status": status, "error": None if status == "success" else "timed out",
+            "documents_processed": 2, "documents_new": uploaded, "documents_unchanged": 2 - uploaded,
+            "documents_uploaded": uploaded, "collision_count": 0,
+            "revalidation": {"conditional_requests": 2, "not_modified": 1, "bytes_saved": 100},
+            "trace": {"download": {"count": 2, "total_seconds": 1.0, "max_seconds": 0.6}},
+            "hash_delta": {"upserts": {f"https://test.example/{index}.pdf": {"hash": "h"}},
+                           "removed": [f"https://test.example/failed-{index}.pdf"], "retained": 1}
+        }
+    
+    def test_merge_batches_into_site_result(self):
+        """Test that batch counters, traces and deltas merge into one complete site result"""
+        # Act
+        result = function_app.merge_document_batch_results(self._discovery([{}] * 4), [self._batch(0), self._batch(1)])
+        
+        # Assert
+        self.assertEqual(result["status"], "success")
+        self.assertNotIn("documents", result)
+        self.assertEqual(result["documents_found"], 4)
+        self.assertEqual(result["documents_uploaded"], 2)
+        self.assertEqual(result["revalidation"]["not_modified_rate_percent"], 50.0)
+        self.assertEqual(result["trace"]["download"]["count"], 4)
+        self.assertTrue(result["hash_delta"]["complete"])
+        self.assertEqual(sorted(result["hash_delta"]["upserts"]), ["https://test.example/0.pdf", "https://test.example/1.pdf"])
+        self.assertEqual(result["hash_delta"]["removed"], ["https://test.example/failed-0.pdf", "https://test.example/failed-1.pdf",
+                                                          "https://test.example/gone.pdf"])
+        self.assertEqual(result["hash_delta"]["retained"], 2)
+    
+    def test_failed_batch_keeps_site_delta_incomplete(self):
+        """Test that a failed batch keeps successful upserts but removes nothing"""
+        # Act
+        result = function_app.merge_document_batch_results(self._discovery([{}] * 4), [self._batch(0), self._batch(1, "error")])
+        
+        # Assert
+        self.assertEqual(result["status"], "error")
+        self.assertIn("batch 1: timed out", result["error"])
+        self.assertFalse(result["hash_delta"]["complete"])
+        self.assertEqual(result["hash_delta"]["removed"], [])
+        self.assertEqual(len(result["hash_delta"]["upserts"]), 2)
+    
+    def test_orchestrator_fans_out_document_batches(self):
+        """Test that the orchestrator splits discovered documents into batch activities per site"""
+        # Arrange
+        orchestrator = function_app.web_crawler_orchestrator._function.get_user_function().orchestrator_function
+        context = Mock(instance_id="test", current_utc_datetime=datetime(2025, 2, 1, tzinfo=timezone.utc))
+        context.call_activity.side_effect = lambda name, input_=None: (name, input_)
+        context.call_activity_with_retry.side_effect = lambda name, retry_options, input_=None: (name, input_)
+        context.task_all.side_effect = lambda tasks: list(tasks)
+        sites = [{"name": "Test Site", "url": "https://test.example", "enabled": True, "document_batch_size": 2},
+                 {"name": "Empty Site", "url": "https://empty.example", "enabled": True}]
+        documents = [{"url": f"https://test.example/{i}.pdf"} for i in range(5)]
+        empty = dict(self._discovery([]), site_name="Empty Site", status="no_documents")
+        
+        # Act
+        generator = orchestrator(context)
+        self.assertEqual(generator.send(None)[0], "get_configuration_activity")
+        self.assertEqual(generator.send({"websites": sites})[0], "get_manifest_version_activity")
+        discovery_tasks = generator.send('"v1"')
+        batch_tasks = generator.send([self._discovery(documents), empty])
+        generator.send([self._batch(i) for i in range(len(batch_tasks))])  # -> apply deltas
+        generator.send(True)  # -> validate storage
+        generator.send({"match": True})  # -> store crawl history
+        with self.assertRaises(StopIteration) as done:
+            generator.send(True)
+        summary = done.exception.value
+        
+        # Assert
+        self.assertEqual([name for name, _ in discovery_tasks], ["discover_website_activity"] * 2)
+        self.assertEqual([len(item["documents"]) for _, item in batch_tasks], [2, 2, 1])
+        self.assertEqual([item["batch_index"] for _, item in batch_tasks], [0, 1, 2])
+        self.assertEqual(summary["documents_uploaded"], 3)
+        self.assertEqual(summary["sites_successful"], 1)
+        self.assertEqual([site["batches"] for site in summary["site_summaries"]], [3, 0])
+
+
+class TestCrawlCheckpoints(unittest.TestCase):
+    """Test checkpointed, resumable document processing"""
+    
+    def setUp(self):
+        self.blobs = {}
+        self.etags = {}
+        versions = itertools.count(1)
+        
+        def write_blob(name, content, content_type="application/json", *args, if_match=None, if_none_match=None):
+            check_blob_conditions(self.etags, name, if_match, if_none_match)
+            self.etags[name] = f'"v{next(versions)}"'
+            self.blobs[name] = content
+            return True
+        
+        self.patches = [
+            patch('function_app.read_metadata_blob', side_effect=lambda name, *args: self.blobs.get(name)),
+            patch('function_app.read_metadata_blob_with_etag',
+                  side_effect=lambda name, *args: (self.blobs.get(name), self.etags.get(name))),
+            patch('function_app.write_metadata_blob', side_effect=write_blob),
+            patch('function_app.delete_metadata_blob', side_effect=lambda name, *args: self.blobs.pop(name, None) or True),
+            patch('function_app.get_manifest_version', return_value='"v1"')
+        ]
+        for active in self.patches:
+            active.start()
+    
+    def tearDown(self):
+        for active in self.patches:
+            active.stop()
+    
+    def _process(self, documents, checkpoint):
+        site_config = {"id": "test", "name": "Test Site", "max_concurrent_documents": 2}
+        result = function_app.new_crawl_result({"name": "Test Site", "url": "https://example.com"})
+        
+        def fake_download(url, etag=None, last_modified=None, stream=False):
+            content = url.encode('utf-8')
+            return {"success": True, "body": io.BytesIO(content), "hash": calculate_content_hash(content), "size": len(content)}
+        
+        with patch('function_app.download_document', side_effect=fake_download) as mock_download, \
+             patch('function_app.upload_to_blob_storage_real', return_value={"success": True}):
+            current_hashes, _ = process_documents(documents, site_config, {}, result, checkpoint=checkpoint)
+        return current_hashes, result, mock_download.call_count
+    
+    def test_interrupted_batch_resumes_from_checkpoint(self):
+        """Test that a retried batch skips documents recorded by the interrupted attempt"""
+        # Arrange - the first attempt finished 4 of 6 documents before the worker recycled
+        documents = [{"url": f"https://example.com/doc{i}.pdf", "filename": f"doc{i}.pdf", "extension": "pdf"}
+                     for i in range(6)]
+        first_attempt = function_app.CrawlCheckpoint("test-site", "batch-0", interval=2)
+        first_hashes, _, _ = self._process([dict(doc) for doc in documents[:4]], first_attempt)
+        
+        # Act
+        retry = function_app.open_crawl_checkpoint("test-site", "batch-0")
+        current_hashes, result, downloads = self._process([dict(doc) for doc in documents], retry)
+        
+        # Assert
+        self.assertEqual(first_attempt.recovered["checkpoints_written"], 2)
+        self.assertEqual(downloads, 2)
+        self.assertEqual(result["documents_processed"], 6)
+        self.assertEqual(result["documents_uploaded"], 2)
+        self.assertEqual(result["checkpoint"]["documents_recovered"], 4)
+        self.assertTrue(result["checkpoint"]["resumed"])
+        self.assertEqual(current_hashes["https://example.com/doc1.pdf"], first_hashes["https://example.com/doc1.pdf"])
+    
+    def test_expired_checkpoint_is_ignored(self):
+        """Test that checkpoints older than the TTL are not resumed"""
+        # Arrange
+        saved_at = (datetime.now(timezone.utc) - timedelta(seconds=function_app.CRAWL_CHECKPOINT_TTL + 60)).isoformat()
+        self.blobs[function_app.checkpoint_blob("test-site", "discovery")] = json.dumps(
+            {"saved_at": saved_at, "discovery": {"documents": [{"url": "x"}], "stats": {}}, "records": {}}).encode('utf-8')
+        
+        # Act
+        checkpoint = function_app.open_crawl_checkpoint("test-site", "discovery")
+        
+        # Assert
+        self.assertFalse(checkpoint.recovered["resumed"])
+        self.assertIsNone(checkpoint.discovery)
+    
+    def test_manifest_update_clears_complete_site_checkpoints(self):
+        """Test that checkpoints are deleted only for sites whose crawl completed"""
+        # Arrange
+        for site in ("site-a", "site-b"):
+            for unit in ("discovery", "batch-0"):
+                self.blobs[function_app.checkpoint_blob(site, unit)] = b"{}"
+        deltas = [
+            dict(compute_hash_delta(site, {}, {f"https://{site}.example/1.pdf": {"hash": "h", "unique_filename": f"{site}/1.pdf"}},
+                                    complete=complete), checkpoint_units=["discovery", "batch-0"])
+            for site, complete in (("site-a", True), ("site-b", False))
+        ]
+        
+        # Act
+        self.assertTrue(apply_document_hash_deltas(deltas))
+        
+        # Assert
+        remaining = sorted(name for name in self.blobs if name.startswith(function_app.CHECKPOINT_PREFIX))
+        self.assertEqual(remaining, ["crawl-checkpoints/site-b/batch-0.json", "crawl-checkpoints/site-b/discovery.json"])
+
+
 class TestOrchestratorLogic(unittest.TestCase):
     """Test orchestrator workflow logic (integration style)"""
     
@@ -350,7 +2126,7 @@ class TestOrchestratorLogic(unittest.TestCase):
 class TestErrorHandling(unittest.TestCase):
     """Test error handling scenarios"""
     
-    @patch('function_app.urllib.request.urlopen')
+    @patch('function_app.pooled_urlopen')
     def test_crawl_handles_timeout(self, mock_urlopen):
         """Test handling of network timeout"""
         # Arrange
@@ -372,7 +2148,7 @@ class TestErrorHandling(unittest.TestCase):
         self.assertEqual(result["status"], "error")
         self.assertIsNotNone(result["error"])
     
-    @patch('function_app.urllib.request.urlopen')
+    @patch('function_app.pooled_urlopen')
     def test_crawl_handles_connection_error(self, mock_urlopen):
         """Test handling of connection errors"""
         # Arrange
@@ -286,6 +286,9 @@ def validate_function_app_structure() -> Tuple[bool, List[str]]:
         "get_configuration_activity",
         "get_document_hashes_activity",
         "crawl_single_website_activity",
+        "discover_website_activity",
+        "process_document_batch_activity",
+        "apply_storage_stats_delta_activity",
         "store_document_hashes_activity",
         "store_crawl_history_activity"
     ]